@@ -0,0 +1,81 @@
+"""
+Write-behind tracking of document access times
+"""
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Document
+from .write_behind import BackgroundFlusher
+
+FLUSH_INTERVAL = getattr(settings, 'DOCUMENT_ACCESS_FLUSH_INTERVAL', 30.0)
+FLUSH_MAX_PENDING = getattr(settings, 'DOCUMENT_ACCESS_FLUSH_MAX_PENDING', 5000)
+UPDATE_BATCH_SIZE = 500
+
+
+class AccessTracker:
+    """
+    Remembers when documents were last read and writes the times in batches.
+
+    Reading a document only records the time in memory, so reads stay
+    reads. Every ``FLUSH_INTERVAL`` seconds the latest time per document is
+    written with batched ``UPDATE``s that touch only ``last_accessed``
+    (no model save, no signals, no rewrite of the extracted text). Ordering
+    by ``last_accessed`` can therefore lag by up to one interval.
+    """
+
+    def __init__(self, interval: float = FLUSH_INTERVAL, max_pending: int = FLUSH_MAX_PENDING):
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = BackgroundFlusher(self.flush, interval, 'access-flusher')
+
+    def touch(self, document_id: int) -> datetime:
+        """Record a read of the document now; returns the recorded time"""
+        now = timezone.now()
+        with self._lock:
+            self._pending[document_id] = now
+            pending = len(self._pending)
+        self._flusher.ensure_started()
+        if pending >= self.max_pending:
+            self._flusher.wake()
+        return now
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Write pending access times; returns the number of documents updated"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            try:
+                with transaction.atomic():
+                    # Deleted documents simply match no row
+                    updated = Document.objects.bulk_update(
+                        [Document(id=document_id, last_accessed=accessed) for document_id, accessed in pending.items()],
+                        ['last_accessed'],
+                        batch_size=UPDATE_BATCH_SIZE,
+                    )
+            except Exception:
+                with self._lock:
+                    for document_id, accessed in pending.items():
+                        if self._pending.get(document_id, accessed) <= accessed:
+                            self._pending[document_id] = accessed
+                raise
+            return updated
+
+
+tracker = AccessTracker()
+
+
+def touch_document(document_id: int) -> datetime:
+    """Note that a document was just read (written to the database in the background)"""
+    return tracker.touch(document_id)
@@ -1,5 +1,51 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import ChatRecord, Conversation, Document
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Max, Min, QuerySet
+from django.utils.functional import cached_property
+from .models import (
+    ChatRecord, Conversation, Document, DocumentSummary, DocumentVersion, ReprocessCheckpoint, RevokedToken, TokenUsage,
+    UserMemory,
+)
+from .purge import soft_delete, soft_delete_user
+from .search_index import match_conversation_ids, match_document_ids
+
+ESTIMATED_COUNT_THRESHOLD = getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 10000)
+SEARCH_RESULT_LIMIT = getattr(settings, 'ADMIN_SEARCH_RESULT_LIMIT', 1000)
+
+
+def estimated_count(model):
+    """Cheap row count estimate: planner statistics on PostgreSQL, the primary key range elsewhere"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [model._meta.db_table])
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] >= 0 else None
+    # Two index seeks; overestimates by the number of deleted (and soft-deleted) rows
+    bounds = model._base_manager.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return 0
+    return bounds['high'] - bounds['low'] + 1
+
+
+class EstimatedCountPaginator(Paginator):
+    """Uses an estimated count for unfiltered changelists of large tables instead of COUNT(*)"""
+    
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet) and self._is_unfiltered(self.object_list):
+            estimate = estimated_count(self.object_list.model)
+            if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+    
+    @staticmethod
+    def _is_unfiltered(queryset):
+        # The default manager's own filter (hiding soft-deleted rows) does not count
+        return queryset.query.where == queryset.model._default_manager.all().query.where
 
 
 @admin.register(ChatRecord)
@@ -12,6 +58,8 @@ class ChatRecordAdmin(admin.ModelAdmin):
     search_fields = ['user_message', 'bot_response', 'session_id', 'context_summary']
     readonly_fields = ['timestamp', 'id']
     list_per_page = 25
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Session Information', {
@@ -52,48 +100,67 @@ class ChatRecordAdmin(admin.ModelAdmin):
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
     list_display = [
-        'id', 'title', 'user', 'created_at', 'updated_at', 'message_count'
+        'id', 'title', 'user', 'message_count', 'last_message_preview', 'created_at', 'updated_at'
     ]
-    list_filter = ['created_at', 'updated_at', 'user']
-    search_fields = ['title', 'user__username', 'user__email']
-    readonly_fields = ['created_at', 'updated_at', 'id']
+    list_filter = ['created_at', 'updated_at', 'is_archived']
+    # Message text is searched through the FTS index (see get_search_results)
+    search_fields = ['title', '=user__username', '=user__email']
+    readonly_fields = ['created_at', 'updated_at', 'id', 'message_count', 'last_message_preview']
+    raw_id_fields = ['user']
     list_per_page = 25
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Conversation Information', {
-            'fields': ('id', 'user', 'title', 'created_at', 'updated_at')
+            'fields': ('id', 'user', 'title', 'message_count', 'created_at', 'updated_at')
         }),
         ('Messages', {
-            'fields': ('full_conversation',),
+            'fields': ('last_message_preview', 'full_conversation'),
             'classes': ('wide',)
         }),
     )
     
-    def message_count(self, obj):
-        return obj.get_message_count()
-    message_count.short_description = 'Message Count'
-    message_count.admin_order_field = 'full_conversation'
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        conversation_ids = match_conversation_ids(search_term, SEARCH_RESULT_LIMIT)
+        if conversation_ids:
+            results = results | queryset.filter(id__in=conversation_ids)
+        return results, may_have_duplicates
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user')
+        # The message blob is loaded only by the change form, which reads it on access
+        return super().get_queryset(request).select_related('user').defer('full_conversation')
+    
+    def delete_model(self, request, obj):
+        # Hidden at once and purged in the background (see chatbot.purge)
+        soft_delete(self.model.objects.filter(id=obj.id))
+    
+    def delete_queryset(self, request, queryset):
+        soft_delete(queryset)
 
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
     list_display = [
-        'id', 'title', 'user', 'file_type', 'file_size_mb', 'upload_date', 'last_accessed'
+        'id', 'title', 'user', 'file_type', 'file_size_mb', 'text_preview', 'extraction_status', 'summary_status',
+        'upload_date', 'last_accessed'
     ]
-    list_filter = ['file_type', 'upload_date', 'last_accessed', 'user']
-    search_fields = ['title', 'user__username', 'extracted_text']
-    readonly_fields = ['upload_date', 'last_accessed', 'id', 'file_size']
+    list_filter = ['file_type', 'extraction_status', 'summary_status', 'upload_date', 'last_accessed']
+    # Extracted text is searched through the FTS index (see get_search_results)
+    search_fields = ['title', '=user__username']
+    readonly_fields = ['upload_date', 'last_accessed', 'id', 'file_size', 'text_preview']
+    raw_id_fields = ['user']
     list_per_page = 25
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Document Information', {
             'fields': ('id', 'user', 'title', 'file', 'file_type', 'file_size', 'upload_date', 'last_accessed')
         }),
         ('Content', {
-            'fields': ('extracted_text',),
+            'fields': ('extraction_status', 'extraction_error', 'summary_status', 'text_preview', 'extracted_text'),
             'classes': ('wide',)
         }),
     )
@@ -103,5 +170,115 @@ class DocumentAdmin(admin.ModelAdmin):
     file_size_mb.short_description = 'File Size'
     file_size_mb.admin_order_field = 'file_size'
     
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        document_ids = match_document_ids(search_term, SEARCH_RESULT_LIMIT)
+        if document_ids:
+            results = results | queryset.filter(id__in=document_ids)
+        return results, may_have_duplicates
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user').defer('extracted_text')
+    
+    def delete_model(self, request, obj):
+        # Hidden at once and purged in the background (see chatbot.purge)
+        soft_delete(self.model.objects.filter(id=obj.id))
+    
+    def delete_queryset(self, request, queryset):
+        soft_delete(queryset)
+
+
+@admin.register(DocumentVersion)
+class DocumentVersionAdmin(admin.ModelAdmin):
+    list_display = ['document', 'number', 'file_type', 'extraction_status', 'page_count', 'pages_extracted', 'created_at']
+    list_filter = ['extraction_status', 'file_type']
+    readonly_fields = ['page_count', 'pages_extracted', 'created_at']
+    raw_id_fields = ['document']
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(DocumentSummary)
+class DocumentSummaryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'document', 'level', 'position', 'section', 'summary_preview', 'created_at']
+    list_filter = ['level', 'created_at']
+    search_fields = ['document__title']
+    readonly_fields = ['created_at', 'id']
+    raw_id_fields = ['document']
+    list_per_page = 25
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def summary_preview(self, obj):
+        return obj.summary[:60] + '...' if len(obj.summary) > 60 else obj.summary
+    summary_preview.short_description = 'Summary'
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('document__user').defer('document__extracted_text')
+
+
+@admin.register(TokenUsage)
+class TokenUsageAdmin(admin.ModelAdmin):
+    list_display = ['day', 'user', 'model', 'requests', 'prompt_tokens', 'response_tokens', 'updated_at']
+    list_filter = ['day', 'model']
+    search_fields = ['=user__username']
+    readonly_fields = ['user', 'day', 'model', 'requests', 'prompt_tokens', 'response_tokens', 'updated_at']
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        return False
+    
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user')
+
+
+@admin.register(UserMemory)
+class UserMemoryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'text', 'conversation', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['=user__username', 'text']
+    readonly_fields = ['fingerprint', 'created_at']
+    raw_id_fields = ['user', 'conversation']
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+
+
+@admin.register(ReprocessCheckpoint)
+class ReprocessCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['name', 'mode', 'last_id', 'processed', 'failed', 'updated_at', 'completed_at']
+    readonly_fields = ['mode', 'options', 'last_id', 'processed', 'failed', 'started_at', 'updated_at', 'completed_at']
+
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    # By id: the user may already have been purged
+    list_display = ['user_id', 'jti', 'revoked_at', 'expires_at']
+    search_fields = ['=user_id', '=jti']
+    readonly_fields = ['user_id', 'jti', 'revoked_at', 'expires_at']
+    exclude = ['user']
+    list_per_page = 50
+    
+    def has_add_permission(self, request):
+        return False
+
+
+class SoftDeleteUserAdmin(UserAdmin):
+    """Deleting a user disables the account at once and purges its data in the background"""
+    
+    def delete_model(self, request, obj):
+        soft_delete_user(obj)
+    
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            soft_delete_user(user)
+
+
+admin.site.unregister(User)
+admin.site.register(User, SoftDeleteUserAdmin)
@@ -0,0 +1,234 @@
+"""
+Stateless signed API tokens: api/ requests authenticate without loading a session or a user
+"""
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Optional, Set
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .models import RevokedToken
+from .write_behind import BackgroundFlusher
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+ACCESS_TTL = getattr(settings, 'API_TOKEN_ACCESS_TTL', 900)
+REFRESH_TTL = getattr(settings, 'API_TOKEN_REFRESH_TTL', 7 * 24 * 3600)
+DENYLIST_REFRESH_INTERVAL = getattr(settings, 'API_TOKEN_DENYLIST_REFRESH_INTERVAL', 30.0)
+API_PREFIX = '/api/'
+SALT = 'chatbot.api_tokens'
+
+
+class TokenError(Exception):
+    """A token that cannot be used, with the HTTP status that describes it"""
+
+    def __init__(self, message: str, status: int = 401):
+        super().__init__(message)
+        self.status = status
+
+
+class Denylist:
+    """
+    In-memory copy of the revocations that have not expired yet.
+
+    Checking a token against it costs no query: the copy is loaded on first
+    use and then reloaded every ``DENYLIST_REFRESH_INTERVAL`` seconds on a
+    background thread. Revocations made in this process apply at once;
+    those made in other processes apply within the refresh interval.
+    Revoked tokens stop mattering when they expire, so this copy only holds
+    revocations of the last ``REFRESH_TTL`` seconds.
+    """
+
+    def __init__(self, interval: float = DENYLIST_REFRESH_INTERVAL):
+        self._jtis: Set[str] = set()
+        self._revoked_before: Dict[int, float] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._flusher = BackgroundFlusher(self.reload, interval, 'token-denylist', flush_at_exit=False)
+
+    def reload(self) -> None:
+        # Read-only: expired rows are deleted by ``manage.py purge_revoked_tokens``
+        jtis = set()
+        revoked_before = {}
+        rows = RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('user_id', 'jti', 'revoked_at')
+        for user_id, jti, revoked_at in rows:
+            if jti:
+                jtis.add(jti)
+            else:
+                revoked_before[user_id] = max(revoked_before.get(user_id, 0.0), revoked_at.timestamp())
+        with self._lock:
+            self._jtis = jtis
+            self._revoked_before = revoked_before
+            self._loaded = True
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.reload()
+            self._flusher.ensure_started()
+
+    def is_revoked(self, claims: dict) -> bool:
+        self._ensure_loaded()
+        if claims['jti'] in self._jtis:
+            return True
+        revoked_before = self._revoked_before.get(claims['uid'])
+        return revoked_before is not None and claims['iat'] <= revoked_before
+
+    def add(self, user_id: int, jti: str = '', revoked_at: Optional[float] = None) -> None:
+        with self._lock:
+            if jti:
+                self._jtis.add(jti)
+            else:
+                self._revoked_before[user_id] = max(self._revoked_before.get(user_id, 0.0), revoked_at)
+
+
+denylist = Denylist()
+
+
+def _sign(user: User, kind: str, ttl: int, now: float) -> str:
+    claims = {
+        'uid': user.id, 'usr': user.get_username(), 'typ': kind,
+        'jti': secrets.token_hex(16), 'iat': now, 'exp': now + ttl,
+    }
+    return signing.dumps(claims, salt=SALT, compress=True)
+
+
+def issue_tokens(user: User) -> dict:
+    """A new access and refresh token pair for user, as returned to the client"""
+    # Millisecond precision, so a revocation only covers tokens issued before it
+    now = round(time.time(), 3)
+    return {
+        'access_token': _sign(user, ACCESS, ACCESS_TTL, now),
+        'refresh_token': _sign(user, REFRESH, REFRESH_TTL, now),
+        'token_type': 'Bearer',
+        'expires_in': ACCESS_TTL,
+    }
+
+
+def verify_token(token: str, kind: Optional[str] = ACCESS) -> dict:
+    """
+    The claims of a valid, unexpired, unrevoked token of the given kind (any kind for None).
+
+    Only the signature and the in-memory denylist are checked; nothing is
+    read from the database.
+
+    Raises:
+        TokenError: the token is malformed, forged, expired, revoked or of another kind
+    """
+    try:
+        claims = signing.loads(token, salt=SALT)
+    except signing.BadSignature:
+        raise TokenError('Invalid token')
+    if not isinstance(claims, dict) or claims.get('typ') not in (ACCESS, REFRESH):
+        raise TokenError('Invalid token')
+    if kind is not None and claims['typ'] != kind:
+        raise TokenError(f'Not an {kind} token' if kind == ACCESS else f'Not a {kind} token')
+    if claims['exp'] <= time.time():
+        raise TokenError('Token has expired')
+    if denylist.is_revoked(claims):
+        raise TokenError('Token has been revoked')
+    return claims
+
+
+def token_user(claims: dict) -> User:
+    """
+    An unsaved User standing in for the token's owner.
+
+    It carries only the id and username, which is all the API views use;
+    anything else must be loaded explicitly.
+    """
+    return User(id=claims['uid'], username=claims['usr'], is_active=True)
+
+
+def _expiry(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+
+def revoke_token(claims: dict) -> bool:
+    """Revoke one token until it would have expired; False if it already was"""
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(user_id=claims['uid'], jti=claims['jti'], expires_at=_expiry(claims['exp']))
+    except IntegrityError:
+        return False
+    finally:
+        denylist.add(claims['uid'], claims['jti'])
+    return True
+
+
+def revoke_user_tokens(user_id: int) -> None:
+    """Revoke every token issued to a user so far, e.g. on a password change or account deletion"""
+    now = timezone.now()
+    RevokedToken.objects.create(user_id=user_id, revoked_at=now, expires_at=now + timedelta(seconds=REFRESH_TTL))
+    denylist.add(user_id, revoked_at=now.timestamp())
+
+
+def purge_expired_revocations() -> int:
+    """Delete revocations of tokens that have expired anyway"""
+    deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def refresh_tokens(refresh_token: str) -> dict:
+    """
+    Exchange a refresh token for a new pair; the old refresh token is
+    revoked, so each one can be used only once.
+
+    Raises:
+        TokenError: the refresh token is not valid or its user is no longer active
+    """
+    claims = verify_token(refresh_token, REFRESH)
+    # Not the hot path: a deactivated account must not be able to renew its access
+    user = User.objects.filter(id=claims['uid'], is_active=True).first()
+    if user is None:
+        raise TokenError('User is inactive or no longer exists')
+    if not revoke_token(claims):
+        # Used concurrently, or by someone who copied it: only the first use counts
+        raise TokenError('Token has been revoked')
+    return issue_tokens(user)
+
+
+def bearer_token(request) -> Optional[str]:
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return token.strip()
+
+
+class APITokenMiddleware:
+    """
+    Authenticates api/ requests carrying ``Authorization: Bearer <token>``.
+
+    Must come after AuthenticationMiddleware: it replaces its lazy
+    ``request.user`` before anything evaluates it, so neither the session
+    nor the user row is loaded. Requests without a bearer token keep
+    session authentication; a bad token is rejected with a 401 rather than
+    falling back to the session.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path_info.startswith(API_PREFIX):
+            token = bearer_token(request)
+            if token is not None:
+                try:
+                    claims = verify_token(token)
+                except TokenError as e:
+                    response = JsonResponse({'error': str(e)}, status=e.status)
+                    response['WWW-Authenticate'] = 'Bearer'
+                    return response
+                request.user = token_user(claims)
+                request.auth_token = claims
+                # Not sent by the browser on its own, so there is no cross-site request to forge
+                request._dont_enforce_csrf_checks = True
+        return self.get_response(request)
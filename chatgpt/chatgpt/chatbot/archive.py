@@ -0,0 +1,214 @@
+"""
+Cold storage for idle conversations: compressed, append-only segment files on disk
+"""
+import gzip
+import json
+import os
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .lazy import lazy_import
+from .models import Conversation
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+zstandard = lazy_import('zstandard')
+
+CODEC_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+class ConversationArchive:
+    """
+    Moves idle conversations into compressed segment files and back.
+
+    Each archived conversation is written as one independently compressed
+    blob appended to the current segment; the row keeps its title, counters
+    and timestamps plus a (segment, offset, length) pointer, and its
+    ``full_conversation`` is emptied. Restores read exactly that byte range.
+    """
+
+    def __init__(self, archive_dir: Optional[str] = None, codec: Optional[str] = None,
+                 segment_max_size: Optional[int] = None):
+        self.archive_dir = str(archive_dir or getattr(settings, 'CONVERSATION_ARCHIVE_DIR',
+                                                      os.path.join(settings.BASE_DIR, 'archive')))
+        codec = codec or getattr(settings, 'CONVERSATION_ARCHIVE_CODEC', 'gzip')
+        if codec == 'zstd' and not zstandard:
+            codec = 'gzip'
+        self.codec = codec
+        self.segment_max_size = segment_max_size or getattr(settings, 'CONVERSATION_ARCHIVE_SEGMENT_SIZE',
+                                                            64 * 1024 * 1024)
+
+    # Encoding
+
+    def _compress(self, payload: bytes) -> bytes:
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor(level=10).compress(payload)
+        return gzip.compress(payload, compresslevel=6)
+
+    @staticmethod
+    def _decompress(segment: str, blob: bytes) -> bytes:
+        if segment.endswith(CODEC_EXTENSIONS['zstd']):
+            if not zstandard:
+                raise RuntimeError("zstandard library not installed. Cannot read zstd archive segments.")
+            return zstandard.ZstdDecompressor().decompress(blob)
+        return gzip.decompress(blob)
+
+    # Segments
+
+    def _segment_path(self, segment: str) -> str:
+        return os.path.join(self.archive_dir, segment)
+
+    def _current_segment(self) -> str:
+        """Pick the newest segment for this codec, starting a new one once it is full"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        extension = CODEC_EXTENSIONS[self.codec]
+        segments = sorted(name for name in os.listdir(self.archive_dir)
+                          if name.startswith('segment-') and name.endswith(extension))
+        if segments and os.path.getsize(self._segment_path(segments[-1])) < self.segment_max_size:
+            return segments[-1]
+        return f"segment-{timezone.now().strftime('%Y%m%d%H%M%S%f')}{extension}"
+
+    def _append(self, segment: str, blob: bytes) -> int:
+        """Append a blob to a segment under an exclusive lock and return its offset"""
+        with open(self._segment_path(segment), 'ab') as handle:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                handle.seek(0, os.SEEK_END)
+                offset = handle.tell()
+                handle.write(blob)
+                handle.flush()
+                os.fsync(handle.fileno())
+            finally:
+                if fcntl:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+        return offset
+
+    def read_messages(self, segment: str, offset: int, length: int) -> list:
+        """Read and decode one archived conversation's messages"""
+        with open(self._segment_path(segment), 'rb') as handle:
+            handle.seek(offset)
+            blob = handle.read(length)
+        return json.loads(self._decompress(segment, blob))
+
+    # Tiering
+
+    def archive_conversation(self, conversation: Conversation, segment: Optional[str] = None) -> bool:
+        """
+        Move one conversation's messages to cold storage.
+
+        The stub update is conditional on ``updated_at`` being unchanged, so a
+        conversation that receives a new message while being archived stays hot.
+        """
+        if conversation.is_archived:
+            return False
+
+        payload = json.dumps(conversation.full_conversation or [], ensure_ascii=False).encode('utf-8')
+        blob = self._compress(payload)
+        segment = segment or self._current_segment()
+        offset = self._append(segment, blob)
+
+        updated = Conversation.objects.filter(
+            pk=conversation.pk, is_archived=False, updated_at=conversation.updated_at
+        ).update(
+            full_conversation=[],
+            message_count=len(conversation.full_conversation or []),
+            is_archived=True,
+            archive_segment=segment,
+            archive_offset=offset,
+            archive_length=len(blob),
+        )
+        return bool(updated)
+
+    def archive_idle(self, days: int, batch_size: int = 200, limit: Optional[int] = None) -> int:
+        """Archive conversations that have not been updated for ``days`` days"""
+        cutoff = timezone.now() - timedelta(days=days)
+        candidates = (
+            Conversation.objects.filter(is_archived=False, updated_at__lt=cutoff)
+            .only('id', 'full_conversation', 'updated_at', 'is_archived')
+            .order_by('id')
+        )
+        if limit:
+            candidates = candidates[:limit]
+
+        archived = 0
+        segment = None
+        for conversation in candidates.iterator(chunk_size=batch_size):
+            if segment is None or archived % batch_size == 0:
+                segment = self._current_segment()
+            if self.archive_conversation(conversation, segment=segment):
+                archived += 1
+        return archived
+
+    def restore(self, conversation: Conversation) -> None:
+        """Bring an archived conversation back into the hot table without touching updated_at"""
+        if not conversation.is_archived:
+            return
+
+        messages = self.read_messages(conversation.archive_segment, conversation.archive_offset,
+                                      conversation.archive_length)
+        Conversation.objects.filter(pk=conversation.pk, is_archived=True).update(
+            full_conversation=messages,
+            message_count=len(messages),
+            is_archived=False,
+            archive_segment='',
+            archive_offset=None,
+            archive_length=None,
+        )
+        conversation.full_conversation = messages
+        conversation.message_count = len(messages)
+        conversation.is_archived = False
+        conversation.archive_segment = ''
+        conversation.archive_offset = None
+        conversation.archive_length = None
+
+    # Compaction
+
+    def compact(self, min_live_ratio: float = 0.5) -> dict:
+        """
+        Rewrite segments whose live data has dropped below ``min_live_ratio``.
+
+        Live blobs are copied into the current segment and their rows are
+        repointed; segments with no live blobs left are deleted.
+        """
+        stats = {'segments_removed': 0, 'blobs_moved': 0, 'bytes_reclaimed': 0}
+        if not os.path.isdir(self.archive_dir):
+            return stats
+
+        current = self._current_segment()
+        for segment in sorted(os.listdir(self.archive_dir)):
+            if not segment.startswith('segment-') or segment == current:
+                continue
+
+            path = self._segment_path(segment)
+            size = os.path.getsize(path)
+            live = Conversation.objects.filter(is_archived=True, archive_segment=segment)
+            live_bytes = live.aggregate(total=Sum('archive_length'))['total'] or 0
+            if size and live_bytes / size >= min_live_ratio:
+                continue
+
+            for row in live.values('id', 'archive_offset', 'archive_length').iterator():
+                with open(path, 'rb') as handle:
+                    handle.seek(row['archive_offset'])
+                    blob = handle.read(row['archive_length'])
+                if not segment.endswith(CODEC_EXTENSIONS[self.codec]):
+                    blob = self._compress(self._decompress(segment, blob))
+                target = self._current_segment()
+                offset = self._append(target, blob)
+                Conversation.objects.filter(pk=row['id'], is_archived=True, archive_segment=segment).update(
+                    archive_segment=target, archive_offset=offset, archive_length=len(blob)
+                )
+                stats['blobs_moved'] += 1
+
+            if not Conversation.objects.filter(is_archived=True, archive_segment=segment).exists():
+                os.remove(path)
+                stats['segments_removed'] += 1
+                stats['bytes_reclaimed'] += size - live_bytes
+        return stats
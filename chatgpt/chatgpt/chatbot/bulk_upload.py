@@ -0,0 +1,314 @@
+"""
+Bulk document upload: many files or a single zip/tar archive, extracted in parallel
+"""
+import os
+import tarfile
+import tempfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator, List, Tuple
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .document_processor import DocumentProcessor
+from .models import Document
+from .sandbox import extract_document
+from .search_index import index_document
+from .summarizer import schedule_summaries
+from .sync import record_bulk_changes
+from .versions import record_initial_versions
+
+MAX_FILE_SIZE = 10 * 1024 * 1024
+MAX_WORKERS = getattr(settings, 'BULK_UPLOAD_MAX_WORKERS', 4)
+MAX_FILES = getattr(settings, 'BULK_UPLOAD_MAX_FILES', 500)
+MAX_TOTAL_SIZE = getattr(settings, 'BULK_UPLOAD_MAX_TOTAL_SIZE', 200 * 1024 * 1024)
+SPOOL_MEMORY_SIZE = 1024 * 1024
+COPY_CHUNK_SIZE = 64 * 1024
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+
+class MemberTooLarge(Exception):
+    """Raised when an archive member exceeds the per-file size limit"""
+
+
+class FileLimitReached(Exception):
+    """Stands in for a file past ``MAX_FILES``, which is listed as skipped without being read"""
+
+
+class UploadTooLarge(Exception):
+    """Raised when the files of one bulk upload together exceed the total size budget"""
+
+    def __init__(self, message: str, name: str):
+        super().__init__(message)
+        self.name = name
+
+
+class SizeBudget:
+    """Bytes and files a bulk upload may still spool or store, shared by all of its files"""
+
+    def __init__(self, total: int = MAX_TOTAL_SIZE, max_files: int = MAX_FILES):
+        self.total = total
+        self.remaining = total
+        self.max_files = max_files
+        self.files = 0
+
+    def take_file(self) -> bool:
+        """Count one more file; False once the upload has reached its file limit"""
+        self.files += 1
+        return self.files <= self.max_files
+
+    def file_limit_error(self) -> FileLimitReached:
+        return FileLimitReached(f'Limit of {self.max_files} files reached')
+
+    def check(self, size: int, name: str) -> None:
+        if size > self.remaining:
+            raise UploadTooLarge(
+                f'The upload is larger than {self.total // (1024 * 1024)}MB in total; '
+                f'this and the remaining files were not processed', name
+            )
+
+    def take(self, size: int, name: str) -> None:
+        self.check(size, name)
+        self.remaining -= size
+
+
+def is_archive(file_name: str) -> bool:
+    """Check if a file name looks like a supported archive"""
+    return file_name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _is_ignored_member(name: str) -> bool:
+    """Skip OS metadata entries such as __MACOSX/ and dotfiles"""
+    parts = name.replace('\\', '/').split('/')
+    return any(part.startswith('.') or part == '__MACOSX' for part in parts if part)
+
+
+def _spool(source, name: str, budget: SizeBudget) -> File:
+    """
+    Copy a member stream into a spooled temporary file.
+
+    Small members stay in memory, larger ones spill to disk, so a single
+    archive member never has to be fully buffered in RAM. The bytes are
+    counted against the upload's budget as they are decompressed, since
+    declared member sizes cannot be trusted.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_SIZE)
+    copied = 0
+    try:
+        while True:
+            chunk = source.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            copied += len(chunk)
+            if copied > MAX_FILE_SIZE:
+                raise MemberTooLarge(f'{name} is larger than {MAX_FILE_SIZE // (1024 * 1024)}MB')
+            budget.check(copied, name)
+            spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+    budget.take(copied, name)
+    spool.seek(0)
+    wrapped = File(spool, name=os.path.basename(name))
+    wrapped.size = copied
+    return wrapped
+
+
+def iter_archive_members(archive, budget: SizeBudget) -> Iterator[Tuple[str, object]]:
+    """
+    Yield (member_name, File or Exception) pairs from a zip or tar upload.
+
+    Zip members are opened one at a time from the central directory; tar
+    archives are read in streaming mode so members are visited in order
+    without unpacking the whole archive. Past the upload's file limit, the
+    remaining zip members are only listed, and the rest of a tar archive,
+    which cannot be listed without decompressing it, is not read at all.
+
+    Raises:
+        UploadTooLarge: the members exceed the upload's total size budget
+    """
+    archive.seek(0)
+    if archive.name.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or _is_ignored_member(info.filename):
+                    continue
+                if not budget.take_file():
+                    yield info.filename, budget.file_limit_error()
+                    continue
+                if info.file_size > MAX_FILE_SIZE:
+                    yield info.filename, MemberTooLarge(f'{info.filename} is larger than {MAX_FILE_SIZE // (1024 * 1024)}MB')
+                    continue
+                try:
+                    with zf.open(info) as source:
+                        yield info.filename, _spool(source, info.filename, budget)
+                except (MemberTooLarge, zipfile.BadZipFile, RuntimeError) as e:
+                    yield info.filename, e
+    else:
+        with tarfile.open(fileobj=archive, mode='r|*') as tf:
+            for member in tf:
+                if not member.isfile() or _is_ignored_member(member.name):
+                    continue
+                if not budget.take_file():
+                    yield archive.name, FileLimitReached(
+                        f'Limit of {budget.max_files} files reached; the rest of the archive was not read'
+                    )
+                    return
+                if member.size > MAX_FILE_SIZE:
+                    yield member.name, MemberTooLarge(f'{member.name} is larger than {MAX_FILE_SIZE // (1024 * 1024)}MB')
+                    continue
+                source = tf.extractfile(member)
+                try:
+                    yield member.name, _spool(source, member.name, budget)
+                except MemberTooLarge as e:
+                    yield member.name, e
+
+
+def iter_upload_sources(uploaded_files, budget: SizeBudget) -> Iterator[Tuple[str, object]]:
+    """
+    Flatten plain uploads and archive uploads into (name, File or Exception) pairs.
+
+    Stops, after yielding the error, once the files exceed the upload's total size budget.
+    """
+    try:
+        for uploaded_file in uploaded_files:
+            if is_archive(uploaded_file.name):
+                try:
+                    yield from iter_archive_members(uploaded_file, budget)
+                except (zipfile.BadZipFile, tarfile.TarError) as e:
+                    yield uploaded_file.name, e
+            elif not budget.take_file():
+                yield uploaded_file.name, budget.file_limit_error()
+            elif uploaded_file.size > MAX_FILE_SIZE:
+                yield uploaded_file.name, MemberTooLarge(f'{uploaded_file.name} is larger than {MAX_FILE_SIZE // (1024 * 1024)}MB')
+            else:
+                budget.take(uploaded_file.size, uploaded_file.name)
+                yield uploaded_file.name, uploaded_file
+    except UploadTooLarge as e:
+        yield e.name, e
+
+
+def _process_one(name: str, source: File) -> dict:
+    """Extract text from one file and store it; runs inside a worker thread"""
+    try:
+        if not DocumentProcessor.is_file_type_supported(name):
+            return {'name': name, 'status': 'skipped', 'error': 'Unsupported file type'}
+
+        result = extract_document(source, known_pages=())
+        if result.status == 'unsupported':
+            return {'name': name, 'status': 'skipped', 'error': result.error}
+
+        # Failed extractions are stored too, with their failure class recorded on the Document
+        source.seek(0)
+        stored_name = default_storage.save(f'documents/{os.path.basename(name)}', source)
+        entry = {
+            'name': name,
+            'status': 'success' if result.ok else 'error',
+            'file': stored_name,
+            'file_type': result.file_type,
+            'file_size': source.size,
+            'extracted_text': result.text,
+            'extraction_status': result.status,
+            'result': result,
+        }
+        if not result.ok:
+            entry['error'] = result.error
+        return entry
+    except Exception as e:
+        return {'name': name, 'status': 'error', 'error': str(e)}
+    finally:
+        source.close()
+
+
+def _delete_files(names) -> None:
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except Exception:
+            # Left for purge_deleted --sweep-orphans
+            pass
+
+
+def process_bulk_upload(user, uploaded_files, max_workers: int = MAX_WORKERS) -> List[dict]:
+    """
+    Extract and store many uploads concurrently, then bulk-insert Documents.
+
+    At most ``2 * max_workers`` members are in flight at once so that a large
+    archive is consumed at the pace of the worker pool instead of being
+    spooled all up front. Past ``MAX_TOTAL_SIZE`` bytes in total the rest
+    of the upload is not read; past ``MAX_FILES`` files the rest are listed
+    as skipped without being spooled. If the documents cannot be created, the
+    files already stored are deleted again.
+
+    Returns:
+        Per-file manifest entries in input order
+    """
+    results = {}
+    pending = {}
+    index = 0
+    budget = SizeBudget(MAX_TOTAL_SIZE, MAX_FILES)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for name, source in iter_upload_sources(uploaded_files, budget):
+                if isinstance(source, FileLimitReached):
+                    results[index] = {'name': name, 'status': 'skipped', 'error': str(source)}
+                elif isinstance(source, Exception):
+                    results[index] = {'name': name, 'status': 'error', 'error': str(source)}
+                else:
+                    pending[executor.submit(_process_one, name, source)] = index
+
+                index += 1
+                if len(pending) >= max_workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[pending.pop(future)] = future.result()
+
+            for future, position in list(pending.items()):
+                results[position] = future.result()
+                del pending[future]
+
+        manifest = [results[position] for position in sorted(results)]
+
+        stored = [entry for entry in manifest if 'file' in entry]
+        with transaction.atomic():
+            documents = Document.objects.bulk_create([
+                Document(
+                    user=user,
+                    title=os.path.basename(entry['name']),
+                    file=entry['file'],
+                    file_type=entry['file_type'],
+                    extracted_text=entry['extracted_text'],
+                    text_preview=Document.preview_of(entry['extracted_text']),
+                    file_size=entry['file_size'],
+                    extraction_status=entry['extraction_status'],
+                    extraction_error=entry.get('error', ''),
+                )
+                for entry in stored
+            ])
+            record_initial_versions((document, entry['result']) for entry, document in zip(stored, documents))
+            for document in documents:
+                index_document(document)
+            record_bulk_changes(user.id, 'document', [document.id for document in documents])
+            schedule_summaries(document.id for document in documents if document.extraction_status == 'ok')
+    except BaseException:
+        # The executor has finished by now; files stored by its workers would be orphans
+        for future, position in pending.items():
+            if not future.cancelled() and future.exception() is None:
+                results[position] = future.result()
+        _delete_files(entry['file'] for entry in results.values() if 'file' in entry)
+        raise
+
+    for entry, document in zip(stored, documents):
+        extracted_text = entry.pop('extracted_text')
+        entry.pop('file')
+        entry.pop('result')
+        entry['document_id'] = document.id
+        if entry['status'] == 'success':
+            entry['extracted_text_preview'] = extracted_text[:200] + ('...' if len(extracted_text) > 200 else '')
+
+    return manifest
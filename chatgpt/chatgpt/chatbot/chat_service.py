@@ -0,0 +1,209 @@
+"""
+Chat turn handling shared by the HTTP and WebSocket transports
+"""
+from typing import Iterator, Optional, Tuple
+
+from django.conf import settings
+
+from .lazy import Registry, lazy_import
+from .model_router import CHAT, DOCUMENT, SUMMARY, DeadlineExceeded, RoutedResponse, get_router
+from .models import Conversation, Document
+from .memory import memory_context, schedule_extraction
+from .summarizer import get_summary_context
+from .usage import record_usage
+
+genai = lazy_import('google.generativeai')
+
+MODEL_NAME = 'gemini-2.0-flash-exp'
+EMPTY_RESPONSE = "I'm sorry, I couldn't generate a response."
+DOCUMENT_KEYWORDS = ['document', 'file', 'pdf', 'docx', 'summarize', 'analyze', 'extract']
+SUMMARY_AFTER_MESSAGES = 5
+HISTORY_TURNS = getattr(settings, 'CHAT_HISTORY_TURNS', 6)
+DOCUMENT_CONTEXT_CHARS = getattr(settings, 'DOCUMENT_SUMMARY_CONTEXT_CHARS', 4000)
+
+
+class ChatError(Exception):
+    """A chat request that cannot be served, with the HTTP status that describes it"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def gemini_model(model_name: str = MODEL_NAME):
+    """Configure the Gemini client and return a chat model"""
+    if not settings.GEMINI_API_KEY:
+        raise ChatError('Gemini API key not configured', status=500)
+    genai.configure(api_key=settings.GEMINI_API_KEY)
+    return genai.GenerativeModel(model_name)
+
+
+# Model backends by name; extra ones can be added with CHAT_MODEL_BACKENDS = {name: dotted path}
+MODEL_BACKENDS = Registry('model backend')
+MODEL_BACKENDS.register('gemini', gemini_model, requires=('google.generativeai',))
+MODEL_BACKENDS.register('fake', 'chatbot.fake_models.fake_model')
+for _name, _path in getattr(settings, 'CHAT_MODEL_BACKENDS', {}).items():
+    MODEL_BACKENDS.register(_name, _path)
+
+
+def get_model(model_name: str = MODEL_NAME, backend: Optional[str] = None):
+    """Return a model from a backend (the configured one by default), importing its client library on first use"""
+    backend = backend or getattr(settings, 'CHAT_MODEL_BACKEND', 'gemini')
+    if backend not in MODEL_BACKENDS:
+        raise ChatError(f'Unknown model backend: {backend}', status=500)
+    return MODEL_BACKENDS.get(backend)(model_name)
+
+
+def check_backend() -> None:
+    """Fail before anything is written if the configured backend cannot be used (e.g. no API key)"""
+    get_model()
+
+
+def request_kind(user_message: str) -> str:
+    """Classify a chat message for model routing"""
+    if any(keyword in user_message.lower() for keyword in DOCUMENT_KEYWORDS):
+        return DOCUMENT
+    return CHAT
+
+
+def start_turn(user, user_message: str, conversation_id: Optional[int] = None) -> Tuple[Conversation, bool]:
+    """
+    Load the conversation a message belongs to, or start a new one.
+
+    Returns:
+        Tuple of (conversation, is_new)
+    """
+    if conversation_id:
+        try:
+            return Conversation.objects.get(id=conversation_id, user=user), False
+        except Conversation.DoesNotExist:
+            raise ChatError('Conversation not found', status=404)
+
+    title = user_message[:50] + ('...' if len(user_message) > 50 else '')
+    conversation = Conversation.create_new_conversation(
+        user=user,
+        title=title,
+        first_user_message=user_message,
+        first_bot_response="",  # Will be filled after AI response
+        context_summary=None
+    )
+    return conversation, True
+
+
+def build_prompt(user, conversation: Conversation, user_message: str) -> Tuple[str, str, int]:
+    """
+    Build the model prompt from recalled memories, conversation history and recent documents.
+
+    Only the last HISTORY_TURNS exchanges are sent verbatim; older ones are
+    represented by the conversation's rolling summary, and context from
+    other conversations by the few memories relevant to this message.
+
+    Returns:
+        Tuple of (full_prompt, context_text, message_count)
+    """
+    context_text = ""
+    messages = conversation.get_messages()
+    # A new conversation already holds the current message, still waiting for its response
+    history = messages[:-1] if messages and not messages[-1].get('bot_response') else messages
+    recent = history[-HISTORY_TURNS:] if HISTORY_TURNS else []
+    earlier = len(history) - len(recent)
+    if earlier:
+        summary = next(
+            (msg['context_summary'] for msg in reversed(history[:earlier + 1]) if msg.get('context_summary')), None
+        )
+        if summary:
+            context_text = f"Summary of the earlier conversation: {summary}\n\n"
+    if recent:
+        context_text += "Previous conversation context:\n"
+        for msg in recent:
+            context_text += f"User: {msg['user_message']}\n"
+            context_text += f"Assistant: {msg['bot_response']}\n\n"
+
+    memories = memory_context(user, user_message)
+    memory_text = f"{memories}\n\n" if memories else ""
+
+    # Check if user wants to analyze uploaded documents
+    document_context = ""
+    if request_kind(user_message) == DOCUMENT:
+        recent_docs = Document.objects.filter(user=user).order_by('-last_accessed')[:3]
+        if recent_docs:
+            document_context = "\n\nAvailable Documents:\n"
+            for doc in recent_docs:
+                document_context += f"- {doc.title} ({doc.file_type}, {doc.get_file_size_mb()}MB)\n"
+                # Precomputed summaries cover the whole document; the preview only its start
+                summary = get_summary_context(doc, DOCUMENT_CONTEXT_CHARS) if doc.summary_status == 'ready' else None
+                if summary:
+                    document_context += f"{summary}\n\n"
+                else:
+                    document_context += f"Content preview: {doc.get_text_preview(1000)}\n\n"
+
+    full_prompt = f"{memory_text}{context_text}{document_context}Current user message: {user_message}"
+    return full_prompt, context_text, len(messages)
+
+
+def generate_response(prompt: str, kind: str = CHAT, user_id: Optional[int] = None,
+                      conversation_id: Optional[int] = None) -> RoutedResponse:
+    """Generate a complete response through the model router, counting its tokens against the user"""
+    try:
+        routed = get_router().generate(prompt, kind)
+    except DeadlineExceeded as e:
+        raise ChatError(f'The model did not respond in time: {e}', status=504)
+    record_usage(user_id, conversation_id, routed.model, prompt, routed.text, routed.response)
+    routed.text = routed.text or EMPTY_RESPONSE
+    return routed
+
+
+def stream_response(prompt: str, kind: str = CHAT, user_id: Optional[int] = None,
+                    conversation_id: Optional[int] = None) -> Iterator[str]:
+    """Generate a response, yielding text fragments as the model produces them"""
+    router = get_router()
+    stream = router.stream(prompt, kind)
+    parts = []
+    routed = None
+    try:
+        while True:
+            try:
+                text = next(stream)
+            except StopIteration as done:
+                routed = done.value
+                break
+            parts.append(text)
+            yield text
+    except DeadlineExceeded as e:
+        raise ChatError(f'The model did not respond in time: {e}', status=504)
+    finally:
+        if routed is not None:
+            record_usage(user_id, conversation_id, routed.model, prompt, routed.text, routed.response)
+        elif parts:
+            # Stopped part way: the tokens sent so far were still generated, most likely by the first tier
+            model = router.tiers[router.choose_tier(kind, prompt)]['model']
+            record_usage(user_id, conversation_id, model, prompt, ''.join(parts))
+
+
+def summarize_context(context_text: str, message_count: int, user_id: Optional[int] = None,
+                      conversation_id: Optional[int] = None) -> Optional[str]:
+    """Summarise long conversations so later turns can carry a compact context"""
+    if message_count <= SUMMARY_AFTER_MESSAGES:
+        return None
+    summary_prompt = f"Please provide a brief summary of this conversation context: {context_text}"
+    try:
+        routed = get_router().generate(summary_prompt, SUMMARY)
+    except Exception:
+        return None
+    record_usage(user_id, conversation_id, routed.model, summary_prompt, routed.text, routed.response)
+    return routed.text or None
+
+
+def finish_turn(conversation: Conversation, is_new: bool, user_message: str,
+                bot_response: str, context_summary: Optional[str]) -> None:
+    """Store the completed exchange on the conversation"""
+    if not is_new:
+        conversation.add_message(user_message, bot_response, context_summary)
+    else:
+        # Fill in the bot response of the conversation's first exchange
+        conversation_data = conversation.full_conversation
+        conversation_data[0]['bot_response'] = bot_response
+        conversation_data[0]['context_summary'] = context_summary
+        conversation.full_conversation = conversation_data
+        conversation.save()
+    schedule_extraction(conversation)
@@ -0,0 +1,297 @@
+"""
+Resumable chunked uploads: chunks are streamed straight to a part file on disk
+"""
+import hashlib
+import mmap
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .document_processor import DocumentProcessor
+from .models import Document, UploadSession
+from .sandbox import extract_document
+from .versions import record_initial_versions
+
+DEFAULT_CHUNK_SIZE = 5 * 1024 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_UPLOAD_SIZE = getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 512 * 1024 * 1024)
+SESSION_TTL = timedelta(hours=getattr(settings, 'CHUNKED_UPLOAD_TTL_HOURS', 24))
+MAX_OPEN_SESSIONS = getattr(settings, 'CHUNKED_UPLOAD_MAX_OPEN_SESSIONS', 10)
+MAX_RESERVED_BYTES = getattr(settings, 'CHUNKED_UPLOAD_MAX_RESERVED_BYTES', 2 * 1024 * 1024 * 1024)
+OPEN_STATUSES = ['pending', 'completing']
+READ_BLOCK_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class ChunkedUploadError(Exception):
+    """Raised for invalid chunked upload requests; carries an HTTP status"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def get_upload_dir() -> str:
+    """Directory holding in-progress part files"""
+    path = os.path.join(settings.MEDIA_ROOT, 'uploads', 'partial')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_part_path(session: UploadSession) -> str:
+    """Path of the part file backing an upload session"""
+    return os.path.join(get_upload_dir(), f'{session.id}.part')
+
+
+def init_upload(user, file_name: str, total_size: int, chunk_size: int = None, sha256: str = '') -> UploadSession:
+    """Create an upload session and preallocate its part file"""
+    if not file_name:
+        raise ChunkedUploadError('File name is required')
+    if not DocumentProcessor.is_file_type_supported(file_name):
+        raise ChunkedUploadError(
+            f'Unsupported file type. Supported types: {", ".join(DocumentProcessor.get_supported_file_types())}'
+        )
+    if total_size <= 0:
+        raise ChunkedUploadError('File size must be positive')
+    if total_size > MAX_UPLOAD_SIZE:
+        raise ChunkedUploadError(f'File size too large. Maximum {MAX_UPLOAD_SIZE // (1024 * 1024)}MB allowed.')
+
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    if chunk_size <= 0 or chunk_size > MAX_CHUNK_SIZE:
+        raise ChunkedUploadError(f'Chunk size must be between 1 byte and {MAX_CHUNK_SIZE // (1024 * 1024)}MB')
+
+    with transaction.atomic():
+        # Serialises a user's concurrent inits so the limits below hold
+        User.objects.select_for_update().filter(pk=user.pk).exists()
+        open_sessions = UploadSession.objects.filter(user=user, status__in=OPEN_STATUSES).aggregate(
+            count=Count('id'), reserved=Sum('total_size')
+        )
+        if open_sessions['count'] >= MAX_OPEN_SESSIONS:
+            raise ChunkedUploadError(
+                f'Too many uploads in progress. Complete or abandon one of your {open_sessions["count"]} first.',
+                status=429
+            )
+        if (open_sessions['reserved'] or 0) + total_size > MAX_RESERVED_BYTES:
+            raise ChunkedUploadError(
+                f'Uploads in progress may total at most {MAX_RESERVED_BYTES // (1024 * 1024)}MB.', status=429
+            )
+        session = UploadSession.objects.create(
+            user=user,
+            file_name=os.path.basename(file_name)[:255],
+            total_size=total_size,
+            chunk_size=chunk_size,
+            sha256=(sha256 or '').lower(),
+        )
+    with open(get_part_path(session), 'wb') as part:
+        part.truncate(total_size)
+    return session
+
+
+def parse_content_range(header: str, session: UploadSession) -> int:
+    """Validate a Content-Range header against the session and return the chunk index"""
+    match = CONTENT_RANGE_RE.match((header or '').strip())
+    if not match:
+        raise ChunkedUploadError('Content-Range header must look like "bytes start-end/total"')
+
+    start, end, total = (int(value) for value in match.groups())
+    if total != session.total_size:
+        raise ChunkedUploadError('Content-Range total does not match the upload size')
+    if start % session.chunk_size:
+        raise ChunkedUploadError('Chunk start must be aligned to the chunk size')
+
+    index = start // session.chunk_size
+    if (start, end + 1) != session.get_chunk_bounds(index):
+        raise ChunkedUploadError('Content-Range must cover exactly one chunk')
+    return index
+
+
+def write_chunk(session: UploadSession, index: int, stream, checksum: str) -> str:
+    """
+    Stream one chunk from the request body into the part file.
+
+    The body is read in small blocks and written at the chunk's offset, so
+    the chunk is never buffered in memory. The chunk is only recorded as
+    received once its SHA-256 matches the client-supplied checksum, and only
+    if the session is still pending when the row is locked to record it:
+    a ``complete`` call may have claimed it while the body was streaming.
+
+    Returns:
+        The SHA-256 of the received chunk
+    """
+    if session.status != 'pending':
+        raise ChunkedUploadError(f'Upload is already {session.status}', status=409)
+
+    start, end = session.get_chunk_bounds(index)
+    expected_length = end - start
+    digest = hashlib.sha256()
+    received = 0
+
+    with open(get_part_path(session), 'r+b') as part:
+        part.seek(start)
+        while received < expected_length:
+            block = stream.read(min(READ_BLOCK_SIZE, expected_length - received))
+            if not block:
+                break
+            digest.update(block)
+            part.write(block)
+            received += len(block)
+
+    chunk_sha256 = digest.hexdigest()
+    error = None
+    if received != expected_length or stream.read(1):
+        error = ChunkedUploadError(f'Chunk {index} must be exactly {expected_length} bytes')
+    elif checksum and checksum.lower() != chunk_sha256:
+        error = ChunkedUploadError(f'Checksum mismatch for chunk {index}', status=422)
+
+    # The chunk's bytes on disk were overwritten either way, so a rejected
+    # chunk must also be forgotten and re-sent by the client.
+    with transaction.atomic():
+        locked = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if locked.status != 'pending':
+            session.status = locked.status
+            raise ChunkedUploadError(f'Upload is already {locked.status}', status=409)
+        if error:
+            locked.received_chunks.pop(str(index), None)
+        else:
+            locked.received_chunks[str(index)] = chunk_sha256
+        locked.save(update_fields=['received_chunks', 'updated_at'])
+    session.received_chunks = locked.received_chunks
+
+    if error:
+        raise error
+    return chunk_sha256
+
+
+def _hash_file(mapped) -> str:
+    """Hash a memory-mapped file block by block"""
+    digest = hashlib.sha256()
+    for offset in range(0, len(mapped), READ_BLOCK_SIZE):
+        digest.update(mapped[offset:offset + READ_BLOCK_SIZE])
+    return digest.hexdigest()
+
+
+def _claim(session: UploadSession) -> None:
+    """
+    Move a pending session to completing, so that of two concurrent
+    ``complete`` calls (e.g. a client retry) only one assembles the file.
+    """
+    claimed = UploadSession.objects.filter(pk=session.pk, status='pending').update(
+        status='completing', updated_at=timezone.now()
+    )
+    if not claimed:
+        session.refresh_from_db(fields=['status', 'document'])
+        raise ChunkedUploadError(f'Upload is already {session.status}', status=409)
+    session.status = 'completing'
+
+
+def _set_status(session: UploadSession, status: str) -> None:
+    session.status = status
+    session.save(update_fields=['status', 'updated_at'])
+
+
+def complete_upload(session: UploadSession) -> Document:
+    """
+    Verify an upload, extract its text and create the Document.
+
+    The part file is hashed through a memory map and handed to the
+    extraction sandbox by path, so it is never read into the web worker.
+    The session is claimed first; a concurrent call gets a 409, or the
+    document once the first call has finished.
+    """
+    if session.status == 'complete' and session.document_id:
+        return session.document
+    if session.status != 'pending':
+        raise ChunkedUploadError(f'Upload is already {session.status}', status=409)
+
+    missing = session.get_missing_chunks()
+    if missing:
+        raise ChunkedUploadError(f'Upload is missing {len(missing)} chunk(s)', status=409)
+
+    try:
+        _claim(session)
+    except ChunkedUploadError:
+        if session.status == 'complete' and session.document_id:
+            return session.document
+        raise
+
+    part_path = get_part_path(session)
+    stored_name = None
+    try:
+        with open(part_path, 'rb') as part:
+            with mmap.mmap(part.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                file_sha256 = _hash_file(mapped)
+            if session.sha256 and session.sha256 != file_sha256:
+                _set_status(session, 'failed')
+                raise ChunkedUploadError('Checksum mismatch for the assembled file', status=422)
+
+            # The sandbox reads the part file in place, so nothing is copied
+            result = extract_document(File(part, name=session.file_name), path=part_path, known_pages=())
+            if result.status == 'unsupported':
+                _set_status(session, 'failed')
+                raise ChunkedUploadError(f'Error processing file: {result.error}')
+
+            part.seek(0)
+            stored_name = default_storage.save(f'documents/{session.file_name}', File(part, name=session.file_name))
+
+        with transaction.atomic():
+            # Failed extractions are kept with their failure class so they can be retried
+            document = Document.objects.create(
+                user=session.user,
+                title=session.file_name,
+                file=stored_name,
+                file_type=result.file_type,
+                extracted_text=result.text,
+                file_size=session.total_size,
+                extraction_status=result.status,
+                extraction_error=result.error,
+            )
+            record_initial_versions([(document, result)])
+
+            session.status = 'complete'
+            session.document = document
+            session.save(update_fields=['status', 'document', 'updated_at'])
+    except ChunkedUploadError:
+        raise
+    except Exception:
+        # Unexpected failure: drop the stored copy and let the client retry
+        if stored_name:
+            default_storage.delete(stored_name)
+        _set_status(session, 'pending')
+        raise
+    os.remove(part_path)
+    return document
+
+
+def discard_user_uploads(user_id: int) -> int:
+    """Delete the part files of a user's unfinished uploads; the sessions go with the user"""
+    count = 0
+    for session_id in UploadSession.objects.filter(user_id=user_id).values_list('id', flat=True):
+        part_path = os.path.join(get_upload_dir(), f'{session_id}.part')
+        if os.path.exists(part_path):
+            os.remove(part_path)
+            count += 1
+    return count
+
+
+def purge_stale_uploads() -> int:
+    """Delete unfinished sessions (and their part files) that have not been touched within the TTL"""
+    stale = UploadSession.objects.filter(
+        status__in=OPEN_STATUSES + ['failed'], updated_at__lt=timezone.now() - SESSION_TTL
+    )
+    count = 0
+    for session in stale.iterator():
+        part_path = get_part_path(session)
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        session.delete()
+        count += 1
+    return count
@@ -0,0 +1,52 @@
+"""
+Cheap ETag validators for the polled read endpoints.
+
+Each function runs one small aggregate query instead of the view's full
+query, so a matching If-None-Match can be answered with 304 Not Modified
+before any payload is loaded or serialised.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+
+from .models import Conversation, Document
+
+
+def _make_etag(*parts) -> str:
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def conversations_list_etag(request, *args, **kwargs):
+    """Changes whenever a conversation is added, updated or deleted"""
+    if not request.user.is_authenticated:
+        return None
+    stats = Conversation.objects.filter(user=request.user).aggregate(
+        count=Count('id'), latest=Max('updated_at'), newest_id=Max('id')
+    )
+    return _make_etag('conversations', request.user.id, stats['count'], stats['latest'], stats['newest_id'])
+
+
+def conversation_etag(request, conversation_id, *args, **kwargs):
+    """Changes whenever the conversation's messages or title change"""
+    if not request.user.is_authenticated:
+        return None
+    row = (
+        Conversation.objects.filter(id=conversation_id, user=request.user)
+        .values_list('updated_at', 'message_count', 'title')
+        .first()
+    )
+    if row is None:
+        return None
+    return _make_etag('conversation', request.user.id, conversation_id, *row)
+
+
+def documents_list_etag(request, *args, **kwargs):
+    """Changes whenever a document is added, accessed, updated (new version, re-extraction) or deleted"""
+    if not request.user.is_authenticated:
+        return None
+    stats = Document.objects.filter(user=request.user).aggregate(
+        count=Count('id'), latest_access=Max('last_accessed'), latest_update=Max('updated_at'), newest_id=Max('id')
+    )
+    return _make_etag(
+        'documents', request.user.id, stats['count'], stats['latest_access'], stats['latest_update'], stats['newest_id']
+    )
@@ -0,0 +1,284 @@
+"""
+Streaming NDJSON export and import of a user's conversations and documents
+"""
+import gzip
+import json
+import zlib
+from datetime import datetime, timezone as dt_timezone
+from typing import IO, Iterable, Iterator, List, Optional
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .archive import ConversationArchive
+from .fields import CompressedText
+from .models import Conversation, Document
+from .search_index import index_conversation, index_document
+from .summarizer import schedule_summaries
+from .sync import record_bulk_changes
+
+FORMAT_VERSION = 1
+EXPORT_CHUNK_SIZE = 200
+IMPORT_BATCH_SIZE = 500
+GZIP_MAGIC = b'\x1f\x8b'
+
+CONVERSATION_FIELDS = ('title', 'full_conversation', 'created_at', 'updated_at')
+CONVERSATION_TIMESTAMPS = ('created_at', 'updated_at')
+ARCHIVE_FIELDS = ('is_archived', 'archive_segment', 'archive_offset', 'archive_length')
+DOCUMENT_FIELDS = ('title', 'file', 'file_type', 'extracted_text', 'file_size', 'upload_date')
+DOCUMENT_TIMESTAMPS = ('upload_date',)
+
+
+def _serialize_value(value):
+    """Convert datetimes and compressed text so rows can be dumped as JSON"""
+    if isinstance(value, CompressedText):
+        return value.decompress()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    """An aware datetime from an exported ISO timestamp, or None if it is missing or invalid"""
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def _field(record: dict, name: str, types, default):
+    """record[name], or default if it is missing or empty; raises TypeError if it is of another type"""
+    value = record.get(name)
+    if value is None or value == '':
+        return default
+    if not isinstance(value, types) or isinstance(value, bool):
+        raise TypeError(f'{name} has the wrong type')
+    return value
+
+
+def _is_message(message) -> bool:
+    return (
+        isinstance(message, dict)
+        and isinstance(message.get('user_message'), str)
+        and isinstance(message.get('bot_response'), (str, type(None)))
+    )
+
+
+def _conversation_from_record(user, record: dict) -> Conversation:
+    """An unsaved conversation for an exported record; raises TypeError if the record is malformed"""
+    messages = _field(record, 'full_conversation', list, [])
+    if not all(_is_message(message) for message in messages):
+        raise TypeError('full_conversation must be a list of messages')
+    return Conversation(
+        user=user,
+        title=_field(record, 'title', str, 'Imported conversation')[:200],
+        full_conversation=messages,
+        message_count=len(messages),
+        last_message_preview=Conversation.preview_of(messages),
+    )
+
+
+def _document_from_record(user, record: dict) -> Document:
+    """An unsaved document for an exported record; raises TypeError if the record is malformed"""
+    text = _field(record, 'extracted_text', str, '')
+    file_size = _field(record, 'file_size', int, 0)
+    if file_size < 0:
+        raise TypeError('file_size must not be negative')
+    # The exported storage path is not trusted: it could name another user's file.
+    # Imported documents keep their text and metadata but no file.
+    return Document(
+        user=user,
+        title=_field(record, 'title', str, 'Imported document')[:255],
+        file='',
+        file_type=_field(record, 'file_type', str, 'text')[:50],
+        extracted_text=text,
+        text_preview=Document.preview_of(text),
+        file_size=file_size,
+    )
+
+
+def _restore_timestamps(model, objects: List, timestamps: List[dict], batch_size: int) -> None:
+    """
+    Put back the exported timestamps that auto_now(_add) replaced on insert.
+
+    bulk_update writes the attributes as they are, without the fields'
+    pre_save, so the values survive this second write.
+    """
+    restored = []
+    fields = set()
+    for obj, values in zip(objects, timestamps):
+        if values:
+            for name, value in values.items():
+                setattr(obj, name, value)
+            fields.update(values)
+            restored.append(obj)
+    if restored:
+        model.objects.bulk_update(restored, sorted(fields), batch_size=batch_size)
+
+
+def iter_export_records(user) -> Iterator[dict]:
+    """
+    Yield one record per conversation and document owned by the user.
+
+    Rows are read through QuerySet.iterator() so that only one chunk of
+    large columns is held in memory at a time (server-side cursors are used
+    on backends that support them).
+    """
+    yield {'type': 'header', 'version': FORMAT_VERSION, 'username': user.username}
+
+    archive = ConversationArchive()
+    conversations = (
+        Conversation.objects.filter(user=user)
+        .order_by('id')
+        .values_list(*CONVERSATION_FIELDS, *ARCHIVE_FIELDS)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for row in conversations:
+        record = {'type': 'conversation'}
+        record.update({name: _serialize_value(value) for name, value in zip(CONVERSATION_FIELDS, row)})
+        is_archived, segment, offset, length = row[len(CONVERSATION_FIELDS):]
+        if is_archived:
+            # Read cold conversations straight from their segment without restoring them
+            record['full_conversation'] = archive.read_messages(segment, offset, length)
+        yield record
+
+    documents = (
+        Document.objects.filter(user=user)
+        .order_by('id')
+        .values_list(*DOCUMENT_FIELDS)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for row in documents:
+        record = {'type': 'document'}
+        record.update({name: _serialize_value(value) for name, value in zip(DOCUMENT_FIELDS, row)})
+        yield record
+
+
+def iter_ndjson(records: Iterable[dict], compress: bool = False) -> Iterator[bytes]:
+    """
+    Encode records as NDJSON byte chunks, optionally as a gzip stream.
+
+    Compression is done incrementally with a zlib compressor in gzip mode,
+    so the output never has to be buffered as a whole.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+
+    for record in records:
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        if compressor:
+            chunk = compressor.compress(line)
+            if chunk:
+                yield chunk
+        else:
+            yield line
+
+    if compressor:
+        yield compressor.flush()
+
+
+def open_ndjson(stream: IO[bytes]) -> IO[bytes]:
+    """Return a binary line reader, transparently un-gzipping the stream if needed"""
+    head = stream.read(2)
+    stream.seek(0)
+    if head == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    return stream
+
+
+def import_ndjson(user, stream: IO[bytes], batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """
+    Import an NDJSON export for the given user.
+
+    The stream is consumed line by line and rows are written with
+    bulk_create in batches of ``batch_size``, so memory use is bounded by
+    the batch size rather than by the size of the export.
+
+    Lines that are not valid JSON, not a record of a known type, or whose
+    fields have the wrong types are counted as skipped.
+
+    Returns:
+        Dict with counts of imported conversations, documents and skipped lines
+    """
+    counts = {'conversations': 0, 'documents': 0, 'skipped': 0}
+    conversations = []
+    conversation_timestamps = []
+    documents = []
+    document_timestamps = []
+
+    def timestamps_of(record: dict, names) -> dict:
+        parsed = {name: _parse_timestamp(record.get(name)) for name in names}
+        return {name: value for name, value in parsed.items() if value is not None}
+
+    def flush_conversations():
+        if conversations:
+            created = Conversation.objects.bulk_create(conversations, batch_size=batch_size)
+            _restore_timestamps(Conversation, created, conversation_timestamps, batch_size)
+            for conversation in created:
+                index_conversation(conversation)
+            record_bulk_changes(user.id, 'conversation', [conversation.id for conversation in created])
+            counts['conversations'] += len(conversations)
+            conversations.clear()
+            conversation_timestamps.clear()
+
+    def flush_documents():
+        if documents:
+            created = Document.objects.bulk_create(documents, batch_size=batch_size)
+            _restore_timestamps(Document, created, document_timestamps, batch_size)
+            for document in created:
+                index_document(document)
+            record_bulk_changes(user.id, 'document', [document.id for document in created])
+            schedule_summaries(document.id for document in created)
+            counts['documents'] += len(documents)
+            documents.clear()
+            document_timestamps.clear()
+
+    for raw_line in open_ndjson(stream):
+        raw_line = raw_line.strip()
+        if not raw_line:
+            continue
+
+        try:
+            record = json.loads(raw_line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            counts['skipped'] += 1
+            continue
+
+        if not isinstance(record, dict):
+            counts['skipped'] += 1
+            continue
+
+        record_type = record.get('type')
+        if record_type == 'header':
+            if record.get('version') != FORMAT_VERSION:
+                raise ValueError(f"Unsupported export version: {record.get('version')}")
+        elif record_type == 'conversation':
+            try:
+                conversation = _conversation_from_record(user, record)
+            except TypeError:
+                counts['skipped'] += 1
+                continue
+            conversations.append(conversation)
+            conversation_timestamps.append(timestamps_of(record, CONVERSATION_TIMESTAMPS))
+            if len(conversations) >= batch_size:
+                flush_conversations()
+        elif record_type == 'document':
+            try:
+                document = _document_from_record(user, record)
+            except TypeError:
+                counts['skipped'] += 1
+                continue
+            documents.append(document)
+            document_timestamps.append(timestamps_of(record, DOCUMENT_TIMESTAMPS))
+            if len(documents) >= batch_size:
+                flush_documents()
+        else:
+            counts['skipped'] += 1
+
+    flush_conversations()
+    flush_documents()
+    return counts
@@ -1,32 +1,32 @@
 """
 Document processing utilities for extracting text from various file formats
 """
+import hashlib
 import os
-import io
-from typing import Optional, Tuple
+from typing import Collection, List, Optional, Tuple
 from django.core.files.uploadedfile import UploadedFile
 
-try:
-    import PyPDF2
-except ImportError:
-    PyPDF2 = None
+from .lazy import Registry, RegistryEntry, lazy_import
+from .spreadsheet_extractor import SpreadsheetExtractor
+from .ocr_pipeline import OCRPipeline
 
-try:
-    from docx import Document as DocxDocument
-except ImportError:
-    DocxDocument = None
+# Heavy optional libraries are only imported when a file of their type arrives
+PyPDF2 = lazy_import('PyPDF2')
+docx = lazy_import('docx')
+openpyxl = lazy_import('openpyxl')
+Image = lazy_import('PIL.Image')
+pytesseract = lazy_import('pytesseract')
 
-try:
-    import openpyxl
-except ImportError:
-    openpyxl = None
+# Extractors by file type; each entry lists the extensions it handles
+EXTRACTORS = Registry('extractor')
 
-try:
-    from PIL import Image
-    import pytesseract
-except ImportError:
-    Image = None
-    pytesseract = None
+
+class ExtractionError(Exception):
+    """An extractor could not read a file; the original exception is its __cause__"""
+
+
+class ExtractorUnavailable(ExtractionError):
+    """The library an extractor needs is not installed; the file itself may be fine"""
 
 
 class DocumentProcessor:
@@ -46,27 +46,30 @@ class DocumentProcessor:
         file_name = uploaded_file.name.lower()
         file_extension = os.path.splitext(file_name)[1].lower()
         
+        extractor = DocumentProcessor.get_extractor(file_extension)
+        if extractor is None:
+            return f"Unsupported file type: {file_extension}", 'unsupported'
+        
         try:
-            if file_extension == '.pdf':
-                return DocumentProcessor._extract_from_pdf(uploaded_file), 'pdf'
-            elif file_extension in ['.docx', '.doc']:
-                return DocumentProcessor._extract_from_docx(uploaded_file), 'docx'
-            elif file_extension in ['.xlsx', '.xls']:
-                return DocumentProcessor._extract_from_excel(uploaded_file), 'excel'
-            elif file_extension in ['.txt', '.md']:
-                return DocumentProcessor._extract_from_text(uploaded_file), 'text'
-            elif file_extension in ['.jpg', '.jpeg', '.png', '.gif', '.bmp']:
-                return DocumentProcessor._extract_from_image(uploaded_file), 'image'
-            else:
-                return f"Unsupported file type: {file_extension}", 'unsupported'
+            return extractor.load()(uploaded_file), extractor.name
+        except ExtractionError as e:
+            return str(e), 'error'
         except Exception as e:
             return f"Error processing file: {str(e)}", 'error'
     
+    @staticmethod
+    def get_extractor(file_extension: str) -> Optional[RegistryEntry]:
+        """Find the extractor registered for a file extension"""
+        for entry in EXTRACTORS.entries():
+            if file_extension in entry.options['extensions']:
+                return entry
+        return None
+    
     @staticmethod
     def _extract_from_pdf(uploaded_file: UploadedFile) -> str:
         """Extract text from PDF file"""
         if not PyPDF2:
-            return "PyPDF2 library not installed. Cannot process PDF files."
+            raise ExtractorUnavailable("PyPDF2 library not installed. Cannot process PDF files.")
         
         try:
             uploaded_file.seek(0)
@@ -79,17 +82,70 @@ class DocumentProcessor:
             
             return text.strip()
         except Exception as e:
-            return f"Error reading PDF: {str(e)}"
+            raise ExtractionError(f"Error reading PDF: {str(e)}") from e
+    
+    @staticmethod
+    def _extract_pdf_pages(uploaded_file: UploadedFile, known_hashes: Collection[str]) -> List[dict]:
+        """
+        Hash every page of a PDF and extract the text of pages not in known_hashes.
+        
+        Returns:
+            One dict per page with its ``hash``, plus its ``text`` unless the hash was known
+        """
+        if not PyPDF2:
+            raise ExtractorUnavailable("PyPDF2 library not installed. Cannot process PDF files.")
+        
+        try:
+            uploaded_file.seek(0)
+            pdf_reader = PyPDF2.PdfReader(uploaded_file)
+            pages = []
+            
+            for page in pdf_reader.pages:
+                page_hash = DocumentProcessor._pdf_page_hash(page)
+                if page_hash in known_hashes:
+                    pages.append({'hash': page_hash})
+                else:
+                    pages.append({'hash': page_hash, 'text': page.extract_text()})
+            
+            return pages
+        except Exception as e:
+            raise ExtractionError(f"Error reading PDF: {str(e)}") from e
+    
+    @staticmethod
+    def _pdf_page_hash(page) -> str:
+        """Hash of what a PDF page draws: its content stream and the images and forms it references"""
+        digest = hashlib.sha256(repr([float(value) for value in page.mediabox]).encode('utf-8'))
+        contents = page.get_contents()
+        if contents is not None:
+            digest.update(contents.get_data())
+        DocumentProcessor._hash_xobjects(page.get('/Resources'), digest, depth=0)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _hash_xobjects(resources, digest, depth: int) -> None:
+        # Scanned pages share a content stream ("draw /Im0") and differ only in the image itself
+        if resources is None or depth > 8:
+            return
+        xobjects = resources.get_object().get('/XObject')
+        if xobjects is None:
+            return
+        for name, reference in sorted(xobjects.get_object().items()):
+            xobject = reference.get_object()
+            digest.update(str(name).encode('utf-8'))
+            # The raw (still encoded) stream bytes are enough to tell images apart
+            digest.update(getattr(xobject, '_data', b'') or b'')
+            if xobject.get('/Subtype') == '/Form':
+                DocumentProcessor._hash_xobjects(xobject.get('/Resources'), digest, depth + 1)
     
     @staticmethod
     def _extract_from_docx(uploaded_file: UploadedFile) -> str:
         """Extract text from DOCX file"""
-        if not DocxDocument:
-            return "python-docx library not installed. Cannot process DOCX files."
+        if not docx:
+            raise ExtractorUnavailable("python-docx library not installed. Cannot process DOCX files.")
         
         try:
             uploaded_file.seek(0)
-            doc = DocxDocument(uploaded_file)
+            doc = docx.Document(uploaded_file)
             text = ""
             
             for paragraph in doc.paragraphs:
@@ -97,32 +153,26 @@ class DocumentProcessor:
             
             return text.strip()
         except Exception as e:
-            return f"Error reading DOCX: {str(e)}"
+            raise ExtractionError(f"Error reading DOCX: {str(e)}") from e
     
     @staticmethod
     def _extract_from_excel(uploaded_file: UploadedFile) -> str:
-        """Extract text from Excel file"""
+        """Extract text from Excel file, streaming rows in read-only mode"""
         if not openpyxl:
-            return "openpyxl library not installed. Cannot process Excel files."
+            raise ExtractorUnavailable("openpyxl library not installed. Cannot process Excel files.")
         
         try:
-            uploaded_file.seek(0)
-            workbook = openpyxl.load_workbook(uploaded_file, data_only=True)
-            text = ""
-            
-            for sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                text += f"Sheet: {sheet_name}\n"
-                
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = "\t".join([str(cell) if cell is not None else "" for cell in row])
-                    if row_text.strip():
-                        text += row_text + "\n"
-                text += "\n"
-            
-            return text.strip()
+            return SpreadsheetExtractor().extract_text(uploaded_file)
+        except Exception as e:
+            raise ExtractionError(f"Error reading Excel: {str(e)}") from e
+    
+    @staticmethod
+    def _extract_from_delimited(uploaded_file: UploadedFile) -> str:
+        """Extract text from CSV or TSV file"""
+        try:
+            return SpreadsheetExtractor().extract_text(uploaded_file)
         except Exception as e:
-            return f"Error reading Excel: {str(e)}"
+            raise ExtractionError(f"Error reading CSV: {str(e)}") from e
     
     @staticmethod
     def _extract_from_text(uploaded_file: UploadedFile) -> str:
@@ -145,44 +195,25 @@ class DocumentProcessor:
             content = uploaded_file.read().decode('utf-8', errors='replace')
             return content.strip()
         except Exception as e:
-            return f"Error reading text file: {str(e)}"
+            raise ExtractionError(f"Error reading text file: {str(e)}") from e
     
     @staticmethod
     def _extract_from_image(uploaded_file: UploadedFile) -> str:
         """Extract text from image using OCR"""
         if not Image or not pytesseract:
-            return "PIL and pytesseract libraries not installed. Cannot process images with OCR."
+            raise ExtractorUnavailable("PIL and pytesseract libraries not installed. Cannot process images with OCR.")
         
         try:
-            uploaded_file.seek(0)
-            image = Image.open(uploaded_file)
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Extract text using OCR
-            text = pytesseract.image_to_string(image)
-            return text.strip()
+            return OCRPipeline().extract_text(uploaded_file)
         except Exception as e:
-            return f"Error processing image with OCR: {str(e)}"
+            raise ExtractionError(f"Error processing image with OCR: {str(e)}") from e
     
     @staticmethod
     def get_supported_file_types() -> list:
         """Get list of supported file types"""
-        supported_types = ['.txt', '.md']
-        
-        if PyPDF2:
-            supported_types.append('.pdf')
-        
-        if DocxDocument:
-            supported_types.extend(['.docx', '.doc'])
-        
-        if openpyxl:
-            supported_types.extend(['.xlsx', '.xls'])
-        
-        if Image and pytesseract:
-            supported_types.extend(['.jpg', '.jpeg', '.png', '.gif', '.bmp'])
+        supported_types = []
+        for entry in EXTRACTORS.entries(available_only=True):
+            supported_types.extend(entry.options['extensions'])
         
         return supported_types
     
@@ -191,3 +222,24 @@ class DocumentProcessor:
         """Check if file type is supported"""
         file_extension = os.path.splitext(file_name.lower())[1]
         return file_extension in DocumentProcessor.get_supported_file_types()
+
+
+# Parsers of complex binary formats run in a resource-limited subprocess (see chatbot.sandbox);
+# those with a ``pages`` extractor can re-extract only the changed pages of a new version (see chatbot.versions);
+# a ``result_cache`` is consulted before a worker is started for the file
+EXTRACTORS.register('text', DocumentProcessor._extract_from_text, extensions=('.txt', '.md'))
+EXTRACTORS.register('csv', DocumentProcessor._extract_from_delimited, extensions=('.csv', '.tsv'))
+EXTRACTORS.register(
+    'pdf', DocumentProcessor._extract_from_pdf, requires=('PyPDF2',), extensions=('.pdf',), sandbox=True,
+    pages=DocumentProcessor._extract_pdf_pages
+)
+EXTRACTORS.register(
+    'docx', DocumentProcessor._extract_from_docx, requires=('docx',), extensions=('.docx', '.doc'), sandbox=True
+)
+EXTRACTORS.register(
+    'excel', DocumentProcessor._extract_from_excel, requires=('openpyxl',), extensions=('.xlsx', '.xls'), sandbox=True
+)
+EXTRACTORS.register(
+    'image', DocumentProcessor._extract_from_image, requires=('PIL', 'pytesseract'),
+    extensions=('.jpg', '.jpeg', '.png', '.gif', '.bmp'), sandbox=True, result_cache=OCRPipeline
+)
@@ -0,0 +1,51 @@
+"""
+Entry point of the sandboxed extraction subprocess (see chatbot.sandbox)
+
+Usage: python -m chatbot.extraction_worker <path> <file name> <memory MB> <CPU seconds> <max chars> [--pages]
+
+With --pages the worker reads a JSON list of known page hashes from stdin and returns paged results.
+"""
+import json
+import os
+import sys
+
+
+def apply_limits(memory_mb: int, cpu_seconds: int) -> None:
+    """Cap address space and CPU time of this process and anything it starts"""
+    try:
+        import resource
+    except ImportError:
+        return
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+
+def main(argv) -> int:
+    path, file_name, memory_mb, cpu_seconds, max_chars = argv[1:6]
+    known_pages = json.load(sys.stdin) if '--pages' in argv[6:] else None
+
+    # Keep the result stream clean of anything the libraries print
+    output = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    import django
+    django.setup()
+
+    from django.core.files import File
+    from chatbot.sandbox import run_extractor
+
+    apply_limits(int(memory_mb), int(cpu_seconds))
+    with open(path, 'rb') as source:
+        result = run_extractor(File(source, name=file_name), int(max_chars), known_pages)
+
+    json.dump(result, output)
+    output.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
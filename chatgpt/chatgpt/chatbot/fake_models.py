@@ -0,0 +1,78 @@
+"""
+Local fake model backend with injected latency and failures, for development and routing simulations
+"""
+import random
+import time
+from typing import Iterator, Optional
+
+from django.conf import settings
+
+DEFAULT_PROFILE = {
+    'latency': 0.3,        # typical seconds per call
+    'jitter': 0.1,         # standard deviation around it
+    'tail_rate': 0.05,     # share of calls that hit a slow path
+    'tail_latency': 3.0,   # extra seconds on the slow path
+    'failure_rate': 0.0,   # share of calls that raise
+}
+STREAM_CHUNK_WORDS = 4
+STREAM_CHUNK_DELAY = 0.02
+
+
+class FakeModelError(Exception):
+    """Injected backend failure"""
+
+
+class FakeResponse:
+    """Mimics the ``text`` attribute of a Gemini response"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """Answers by echoing the prompt after a randomised delay, sometimes failing"""
+
+    def __init__(self, model_name: str, latency: float = 0.3, jitter: float = 0.1, tail_rate: float = 0.05,
+                 tail_latency: float = 3.0, failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.model_name = model_name
+        self.latency = latency
+        self.jitter = jitter
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+
+    def sample_delay(self) -> float:
+        delay = max(0.0, self.random.gauss(self.latency, self.jitter))
+        if self.random.random() < self.tail_rate:
+            delay += self.tail_latency
+        return delay
+
+    def _answer(self, prompt: str) -> str:
+        tail = prompt.rsplit('Current user message:', 1)[-1].strip()
+        return f'[{self.model_name}] You said: {tail[:200]}'
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        if stream:
+            return self._stream(prompt)
+        time.sleep(self.sample_delay())
+        if self.random.random() < self.failure_rate:
+            raise FakeModelError(f'{self.model_name} failed (injected)')
+        return FakeResponse(self._answer(prompt))
+
+    def _stream(self, prompt: str) -> Iterator[FakeResponse]:
+        time.sleep(self.sample_delay())
+        if self.random.random() < self.failure_rate:
+            raise FakeModelError(f'{self.model_name} failed (injected)')
+        words = self._answer(prompt).split(' ')
+        for start in range(0, len(words), STREAM_CHUNK_WORDS):
+            if start:
+                time.sleep(STREAM_CHUNK_DELAY)
+            yield FakeResponse(' '.join(words[start:start + STREAM_CHUNK_WORDS]) + ' ')
+
+
+def fake_model(model_name: str) -> FakeModel:
+    """Backend factory; per-model behaviour comes from FAKE_MODEL_PROFILES"""
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(getattr(settings, 'FAKE_MODEL_PROFILES', {}).get(model_name, {}))
+    return FakeModel(model_name, **profile)
@@ -0,0 +1,154 @@
+"""
+Custom model fields
+"""
+import zlib
+
+from django import forms
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+RAW_MARKER = b'r'
+ZLIB_MARKER = b'z'
+
+
+class CompressedText:
+    """Compressed bytes as read from the database, decompressed only when needed"""
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = bytes(data)
+
+    def decompress(self) -> str:
+        """Decode the full text"""
+        marker, payload = self.data[:1], self.data[1:]
+        if marker == ZLIB_MARKER:
+            payload = zlib.decompress(payload)
+        return payload.decode('utf-8')
+
+    def preview(self, length: int) -> str:
+        """Decode roughly the first ``length`` characters without inflating the whole value"""
+        marker, payload = self.data[:1], self.data[1:]
+        # UTF-8 needs at most 4 bytes per character
+        max_bytes = length * 4
+        if marker == ZLIB_MARKER:
+            payload = zlib.decompressobj().decompress(payload, max_bytes)
+        return payload[:max_bytes].decode('utf-8', errors='ignore')[:length]
+
+    def __str__(self):
+        return self.decompress()
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """
+    Field descriptor that inflates CompressedText on first attribute access.
+
+    The compressed value is remembered next to the decoded text so that
+    saving an instance whose text was read but not changed does not have to
+    compress it again.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedText):
+            text = value.decompress()
+            instance.__dict__[self.field.attname] = text
+            instance.__dict__[self.field.get_cache_name()] = (text, value)
+            return text
+        return value
+
+    def __set__(self, instance, value):
+        # Defining __set__ makes this a data descriptor, so __get__ runs even
+        # once the value is in the instance __dict__.
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    Text field stored zlib-compressed in a binary column.
+
+    Values shorter than ``min_length`` bytes are stored uncompressed. Rows
+    written before the column was compressed (plain text) are still read
+    correctly.
+    """
+    descriptor_class = CompressedTextDescriptor
+
+    def __init__(self, *args, min_length=256, level=6, **kwargs):
+        self.min_length = min_length
+        self.level = level
+        kwargs.setdefault('editable', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get('editable') is True:
+            del kwargs['editable']
+        if self.min_length != 256:
+            kwargs['min_length'] = self.min_length
+        if self.level != 6:
+            kwargs['level'] = self.level
+        return name, path, args, kwargs
+
+    def get_cache_name(self):
+        return f'_{self.attname}_compressed'
+
+    def compress(self, text: str) -> CompressedText:
+        """Encode text, compressing it if it is long enough to benefit"""
+        raw = text.encode('utf-8')
+        if len(raw) < self.min_length:
+            return CompressedText(RAW_MARKER + raw)
+        return CompressedText(ZLIB_MARKER + zlib.compress(raw, self.level))
+
+    def from_db_value(self, value, expression, connection):
+        if value is None or isinstance(value, str):
+            return value
+        return CompressedText(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        if isinstance(value, CompressedText):
+            return value.decompress()
+        return CompressedText(value).decompress()
+
+    def pre_save(self, model_instance, add):
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, CompressedText):
+            return value
+        cached = model_instance.__dict__.get(self.get_cache_name())
+        if cached and cached[0] is value:
+            return cached[1]
+        return getattr(model_instance, self.attname)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = self.compress(value)
+        if isinstance(value, CompressedText):
+            return value.data
+        return value
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        return super().get_db_prep_value(value, connection, prepared=True)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj) or ''
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{'form_class': forms.CharField, 'widget': forms.Textarea, **kwargs})
+
+
+def get_text_preview(instance, field_name: str, length: int) -> str:
+    """
+    Get the first ``length`` characters of a compressed text field.
+
+    If the value has not been decoded yet only its prefix is inflated.
+    """
+    value = instance.__dict__.get(field_name)
+    if isinstance(value, CompressedText):
+        return value.preview(length)
+    return (getattr(instance, field_name) or '')[:length]
@@ -0,0 +1,191 @@
+"""
+Idempotency-Key support: retried requests attach to the original run or get its response replayed
+"""
+import hashlib
+import time
+import uuid
+from datetime import timedelta
+from functools import wraps
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+KEY_TTL = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 3600))
+WAIT_SECONDS = getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 5)
+LOCK_TIMEOUT = timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 300))
+POLL_INTERVAL = 0.25
+MAX_KEY_LENGTH = 255
+
+# Outcomes that say "try again" rather than describe the result of the request
+RETRYABLE_STATUSES = {408, 409, 425, 429}
+
+
+def request_fingerprint(request) -> str:
+    """SHA-256 of what makes a request the same request: method, path, form fields and file contents"""
+    digest = hashlib.sha256(f'{request.method} {request.get_full_path()}\n'.encode('utf-8'))
+    if request.content_type == 'multipart/form-data':
+        # Reading request.body here would load the whole upload into memory a second time
+        for name, values in sorted(request.POST.lists()):
+            digest.update(repr((name, values)).encode('utf-8'))
+        for name, files in sorted(request.FILES.lists()):
+            for uploaded_file in files:
+                digest.update(repr((name, uploaded_file.name, uploaded_file.size)).encode('utf-8'))
+                for chunk in uploaded_file.chunks():
+                    digest.update(chunk)
+                uploaded_file.seek(0)
+    else:
+        digest.update(request.body)
+    return digest.hexdigest()
+
+
+def claim(user, key: str, request_hash: str, owner: str) -> Tuple[IdempotencyKey, bool]:
+    """
+    The entry for user and key, and whether this request now owns it.
+
+    An expired entry is replaced, and one left processing for longer than
+    LOCK_TIMEOUT (its request died) is taken over by a retry of the same
+    request.
+    """
+    while True:
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                entry = IdempotencyKey.objects.create(
+                    user=user, key=key, request_hash=request_hash, owner=owner,
+                    locked_at=now, expires_at=now + KEY_TTL,
+                )
+            return entry, True
+        except IntegrityError:
+            pass
+
+        entry = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if entry is None:
+            # Released by a failed request in the meantime
+            continue
+        if entry.expires_at <= now:
+            IdempotencyKey.objects.filter(id=entry.id, expires_at=entry.expires_at).delete()
+            continue
+        if (entry.status == 'processing' and entry.request_hash == request_hash
+                and entry.locked_at <= now - LOCK_TIMEOUT):
+            taken = IdempotencyKey.objects.filter(
+                id=entry.id, status='processing', owner=entry.owner
+            ).update(owner=owner, locked_at=now)
+            if taken:
+                entry.owner = owner
+                return entry, True
+            continue
+        return entry, False
+
+
+def wait_for_completion(entry: IdempotencyKey, timeout: float = WAIT_SECONDS) -> Optional[IdempotencyKey]:
+    """
+    Block until the request running under entry finishes.
+
+    Returns the completed entry, None if that request failed and released
+    the key, or the entry still processing if the timeout expired.
+    """
+    deadline = time.monotonic() + timeout
+    while entry.status == 'processing':
+        if time.monotonic() >= deadline:
+            return entry
+        time.sleep(POLL_INTERVAL)
+        entry = IdempotencyKey.objects.filter(id=entry.id).first()
+        if entry is None:
+            return None
+    return entry
+
+
+def store_response(entry: IdempotencyKey, response) -> bool:
+    """Record the response for replay if it is final; otherwise release the key for a retry"""
+    owned = IdempotencyKey.objects.filter(id=entry.id, owner=entry.owner, status='processing')
+    status = response.status_code
+    if response.streaming or status >= 500 or status in RETRYABLE_STATUSES:
+        owned.delete()
+        return False
+    return bool(owned.update(
+        status='complete',
+        response_status=status,
+        response_content_type=response.get('Content-Type', ''),
+        response_body=response.content,
+    ))
+
+
+def release(entry: IdempotencyKey) -> None:
+    IdempotencyKey.objects.filter(id=entry.id, owner=entry.owner, status='processing').delete()
+
+
+def replay(entry: IdempotencyKey) -> HttpResponse:
+    response = HttpResponse(
+        bytes(entry.response_body), status=entry.response_status, content_type=entry.response_content_type or None
+    )
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Make a POST view safe to retry with an Idempotency-Key header.
+
+    The first request with a key runs the view. A retry that arrives while
+    it is still running waits up to WAIT_SECONDS for it (the wait holds a
+    worker) and gets the same response, or a 409 with Retry-After if it is
+    still running by then. One that arrives later gets the stored response
+    replayed with ``Idempotent-Replayed: true``, without running the view
+    again. Reusing a key for a different request is rejected with 422.
+    Server errors and "try again" statuses are not stored, so a retry after
+    one runs afresh. Requests without the header, or from anonymous users,
+    are unaffected.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({'error': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'}, status=400)
+
+        request_hash = request_fingerprint(request)
+        owner = uuid.uuid4().hex
+        while True:
+            entry, owned = claim(request.user, key, request_hash, owner)
+            if owned:
+                break
+            if entry.request_hash != request_hash:
+                return JsonResponse(
+                    {'error': f'{HEADER} was already used for a different request'}, status=422
+                )
+            entry = wait_for_completion(entry)
+            if entry is None:
+                # The original request failed; run this one in its place
+                continue
+            if entry.status == 'processing':
+                response = JsonResponse(
+                    {'error': f'A request with this {HEADER} is still in progress'}, status=409
+                )
+                response['Retry-After'] = '1'
+                return response
+            return replay(entry)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            release(entry)
+            raise
+        store_response(entry, response)
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys() -> int:
+    """Delete keys past their TTL"""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
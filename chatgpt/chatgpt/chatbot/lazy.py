@@ -0,0 +1,107 @@
+"""
+Deferred imports for heavy optional dependencies, and registries of lazily loaded implementations
+"""
+import importlib
+import importlib.util
+from functools import lru_cache
+from typing import Callable, Iterable, List, Optional, Union
+
+from django.utils.module_loading import import_string
+
+
+@lru_cache(maxsize=None)
+def module_available(name: str) -> bool:
+    """Check whether a module is installed without importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Truthiness reports whether the module is installed, so the
+    ``if not module:`` checks used for optional dependencies keep working
+    without paying for the import.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __bool__(self):
+        return module_available(self._name)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<lazy module {self._name!r} ({state})>'
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Reference a module that is only imported when it is first used"""
+    return LazyModule(name)
+
+
+class RegistryEntry:
+    """A named implementation, given as a callable or a dotted import path"""
+
+    def __init__(self, name: str, target: Union[str, Callable], requires: Iterable[str] = (), **options):
+        self.name = name
+        self.target = target
+        self.requires = tuple(requires)
+        self.options = options
+
+    def is_available(self) -> bool:
+        """All modules the implementation needs are installed"""
+        return all(module_available(module) for module in self.requires)
+
+    def load(self) -> Callable:
+        """Resolve the implementation, importing it the first time"""
+        if isinstance(self.target, str):
+            self.target = import_string(self.target)
+        return self.target
+
+
+class Registry:
+    """
+    Named implementations whose modules are imported on first use.
+
+    Registering only records a dotted path (or a callable that imports its
+    dependencies itself), so listing what is supported never loads the
+    heavy libraries behind each entry.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._entries = {}
+
+    def register(self, name: str, target: Union[str, Callable], requires: Iterable[str] = (), **options) -> None:
+        """Add or replace an implementation"""
+        self._entries[name] = RegistryEntry(name, target, requires, **options)
+
+    def entry(self, name: str) -> Optional[RegistryEntry]:
+        return self._entries.get(name)
+
+    def entries(self, available_only: bool = False) -> List[RegistryEntry]:
+        """Entries in registration order"""
+        return [entry for entry in self._entries.values() if entry.is_available() or not available_only]
+
+    def get(self, name: str) -> Callable:
+        """Load the implementation registered under ``name``"""
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f'Unknown {self.kind}: {name}')
+        return entry.load()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chatbot.archive import ConversationArchive
+
+
+class Command(BaseCommand):
+    help = 'Move idle conversations into compressed cold storage and compact archive segments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'CONVERSATION_ARCHIVE_IDLE_DAYS', 30),
+                            help='Archive conversations not updated for this many days')
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows fetched per batch')
+        parser.add_argument('--limit', type=int, default=None, help='Maximum conversations to archive in this run')
+        parser.add_argument('--compact', action='store_true', help='Also rewrite mostly-dead archive segments')
+        parser.add_argument('--min-live-ratio', type=float, default=0.5,
+                            help='Compact segments whose live data is below this fraction')
+
+    def handle(self, *args, **options):
+        archive = ConversationArchive()
+        archived = archive.archive_idle(options['days'], batch_size=options['batch_size'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} conversation(s) idle for more than {options['days']} days"
+        ))
+
+        if options['compact']:
+            stats = archive.compact(min_live_ratio=options['min_live_ratio'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Compaction moved {stats['blobs_moved']} blob(s), removed {stats['segments_removed']} "
+                f"segment(s) and reclaimed {stats['bytes_reclaimed']} bytes"
+            ))
@@ -0,0 +1,131 @@
+import difflib
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.ocr_pipeline import OCRPipeline, Image, pytesseract
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp')
+
+SAMPLE_TEXT = (
+    "Quarterly revenue grew by 12 percent compared to last year.\n"
+    "The board approved the budget for the new data centre.\n"
+    "Invoices must be submitted before the 15th of each month.\n"
+    "Contact support at extension 4410 for access requests."
+)
+
+
+def _render_page(text, scale=1, skew=0.0, low_contrast=False):
+    """Render sample text onto a white page, optionally scaled up, rotated and faded"""
+    from PIL import ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.load_default(size=28 * scale)
+    except TypeError:
+        font = ImageFont.load_default()
+
+    width, height = 1400 * scale, 500 * scale
+    page = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(page)
+    ink = (110, 110, 110) if low_contrast else (0, 0, 0)
+    draw.multiline_text((60 * scale, 60 * scale), text, fill=ink, font=font, spacing=20 * scale)
+
+    if skew:
+        page = page.rotate(skew, resample=Image.BICUBIC, expand=True, fillcolor='white')
+    if low_contrast:
+        page = page.point(lambda value: min(255, value + 40))
+    return page
+
+
+def build_synthetic_corpus():
+    """Return (name, PIL image, ground truth) cases covering the common phone-photo problems"""
+    return [
+        ('clean', _render_page(SAMPLE_TEXT), SAMPLE_TEXT),
+        ('12mp_photo', _render_page(SAMPLE_TEXT, scale=3), SAMPLE_TEXT),
+        ('skewed_3deg', _render_page(SAMPLE_TEXT, scale=2, skew=3.0), SAMPLE_TEXT),
+        ('low_contrast', _render_page(SAMPLE_TEXT, scale=2, low_contrast=True), SAMPLE_TEXT),
+    ]
+
+
+def load_corpus(directory):
+    """Load images with a sibling .txt ground-truth file from a directory"""
+    cases = []
+    for file_name in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(file_name)
+        truth_path = os.path.join(directory, stem + '.txt')
+        if extension.lower() not in IMAGE_EXTENSIONS or not os.path.exists(truth_path):
+            continue
+        with open(truth_path, encoding='utf-8') as truth_file:
+            truth = truth_file.read()
+        image = Image.open(os.path.join(directory, file_name))
+        image.load()
+        cases.append((stem, image, truth))
+    return cases
+
+
+def accuracy(expected, actual):
+    """Character-level similarity between whitespace-normalised texts"""
+    return difflib.SequenceMatcher(None, ' '.join(expected.split()), ' '.join(actual.split())).ratio()
+
+
+class Command(BaseCommand):
+    help = 'Compare OCR speed and accuracy with and without the preprocessing pipeline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', help='Directory of images with matching .txt ground truth files '
+                                             '(default: a generated synthetic corpus)')
+        parser.add_argument('--save-corpus', help='Write the generated synthetic corpus to this directory')
+        parser.add_argument('--binarize', action='store_true', help='Also enable binarisation in the pipeline')
+        parser.add_argument('--repeat', type=int, default=1, help='Runs per image, timings are averaged')
+
+    def handle(self, *args, **options):
+        if not OCRPipeline.is_available():
+            raise CommandError('PIL and pytesseract libraries not installed. Cannot benchmark OCR.')
+
+        if options['corpus']:
+            cases = load_corpus(options['corpus'])
+            if not cases:
+                raise CommandError(f"No images with ground truth found in {options['corpus']}")
+        else:
+            cases = build_synthetic_corpus()
+
+        if options['save_corpus']:
+            os.makedirs(options['save_corpus'], exist_ok=True)
+            for name, image, truth in cases:
+                image.save(os.path.join(options['save_corpus'], f'{name}.png'))
+                with open(os.path.join(options['save_corpus'], f'{name}.txt'), 'w', encoding='utf-8') as truth_file:
+                    truth_file.write(truth)
+
+        pipeline = OCRPipeline(binarize=options['binarize'] or None, use_cache=False)
+        repeat = max(1, options['repeat'])
+
+        self.stdout.write(f"{'image':<16}{'size':>12}{'raw s':>9}{'raw acc':>9}{'pipe s':>9}{'pipe acc':>10}")
+        totals = {'raw_time': 0.0, 'raw_acc': 0.0, 'pipe_time': 0.0, 'pipe_acc': 0.0}
+
+        for name, image, truth in cases:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                raw_text = pytesseract.image_to_string(image.convert('RGB'))
+            raw_time = (time.perf_counter() - started) / repeat
+
+            started = time.perf_counter()
+            for _ in range(repeat):
+                pipe_text = pipeline.run_ocr(pipeline.preprocess(image))
+            pipe_time = (time.perf_counter() - started) / repeat
+
+            raw_acc, pipe_acc = accuracy(truth, raw_text), accuracy(truth, pipe_text)
+            totals['raw_time'] += raw_time
+            totals['raw_acc'] += raw_acc
+            totals['pipe_time'] += pipe_time
+            totals['pipe_acc'] += pipe_acc
+
+            size = f"{image.width}x{image.height}"
+            self.stdout.write(f"{name:<16}{size:>12}{raw_time:>9.2f}{raw_acc:>9.1%}{pipe_time:>9.2f}{pipe_acc:>10.1%}")
+
+        count = len(cases)
+        self.stdout.write(self.style.SUCCESS(
+            f"Average: raw {totals['raw_time'] / count:.2f}s at {totals['raw_acc'] / count:.1%}, "
+            f"pipeline {totals['pipe_time'] / count:.2f}s at {totals['pipe_acc'] / count:.1%} "
+            f"({pipeline.get_signature()})"
+        ))
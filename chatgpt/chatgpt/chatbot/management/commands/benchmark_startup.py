@@ -0,0 +1,99 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Libraries that must only be imported when a request actually needs them
+HEAVY_MODULES = ('google.generativeai', 'PyPDF2', 'docx', 'openpyxl', 'PIL', 'pytesseract', 'zstandard')
+
+# Runs in a fresh interpreter: what a worker does before serving its first request
+STARTUP_SCRIPT = '''
+import json, resource, sys
+import django
+django.setup()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+import importlib
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    rss //= 1024
+print(json.dumps({'rss_kb': rss, 'modules': sorted(sys.modules)}))
+'''
+
+
+def parse_importtime(stderr: str):
+    """
+    Parse ``-X importtime`` output.
+
+    Returns:
+        Tuple of (total_us, {module: cumulative_us}) where the total sums the
+        top-level imports only, so nested imports are not counted twice
+    """
+    total = 0
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(cumulative_us)
+        # Nested imports are indented by two extra spaces per level
+        if not name.startswith('  '):
+            total += int(cumulative_us)
+    return total, cumulative
+
+
+class Command(BaseCommand):
+    help = 'Measure cold-start import time and memory of a web worker and check them against the startup budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters to start, the median is reported')
+        parser.add_argument('--top', type=int, default=15, help='Show the slowest imports')
+        parser.add_argument('--module', action='append', default=['chatgpt_project.urls'],
+                            help='Extra modules a worker imports at startup (default: the URLconf)')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'chatgpt_project.settings'))
+        runs = []
+        for _ in range(max(1, options['repeat'])):
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT, *options['module']],
+                capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+            )
+            if result.returncode != 0:
+                raise CommandError(f'Startup failed:\n{result.stderr[-2000:]}')
+            total_us, cumulative = parse_importtime(result.stderr)
+            report = json.loads(result.stdout.strip().splitlines()[-1])
+            runs.append((total_us, report['rss_kb'], cumulative, report['modules']))
+
+        runs.sort(key=lambda run: run[0])
+        total_us, rss_kb, cumulative, modules = runs[len(runs) // 2]
+        import_ms = total_us / 1000
+        rss_mb = statistics.median(run[1] for run in runs) / 1024
+
+        self.stdout.write(f"{'module':<60}{'cumulative ms':>15}")
+        for name, value in sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:options['top']]:
+            self.stdout.write(f'{name:<60}{value / 1000:>15.1f}')
+
+        loaded_heavy = [name for name in HEAVY_MODULES if name in modules]
+        import_budget = getattr(settings, 'STARTUP_IMPORT_BUDGET_MS', 500)
+        rss_budget = getattr(settings, 'STARTUP_RSS_BUDGET_MB', 80)
+
+        self.stdout.write(f'Import time: {import_ms:.0f}ms (budget {import_budget}ms), '
+                          f'peak RSS: {rss_mb:.1f}MB (budget {rss_budget}MB), {len(modules)} modules')
+
+        problems = []
+        if import_ms > import_budget:
+            problems.append(f'import time {import_ms:.0f}ms is over budget')
+        if rss_mb > rss_budget:
+            problems.append(f'RSS {rss_mb:.1f}MB is over budget')
+        if loaded_heavy:
+            problems.append(f"heavy modules imported at startup: {', '.join(loaded_heavy)}")
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('Startup is within budget'))
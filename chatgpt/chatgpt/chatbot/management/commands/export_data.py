@@ -0,0 +1,35 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.data_transfer import iter_export_records, iter_ndjson
+
+
+class Command(BaseCommand):
+    help = "Stream a user's conversations and documents to an NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User whose data should be exported')
+        parser.add_argument('--output', '-o', default='-', help='Output path (default: stdout)')
+        parser.add_argument('--gzip', action='store_true', help='Gzip-compress the output')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist")
+
+        chunks = iter_ndjson(iter_export_records(user), compress=options['gzip'])
+
+        if options['output'] == '-':
+            out = sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
+            return
+
+        with open(options['output'], 'wb') as out:
+            for chunk in chunks:
+                out.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Exported data for {user.username} to {options['output']}"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from chatbot.memory import extract_memories
+from chatbot.models import Conversation
+
+
+class Command(BaseCommand):
+    help = 'Extract long-term memories from conversation turns that have not been mined yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, default=None, help='Only mine this user id\'s conversations')
+        parser.add_argument('--min-turns', type=int, default=1,
+                            help='Skip conversations with fewer new turns than this')
+        parser.add_argument('--limit', type=int, default=None, help='Maximum conversations to mine in this run')
+
+    def handle(self, *args, **options):
+        conversations = Conversation.objects.order_by('id')
+        if options['user'] is not None:
+            conversations = conversations.filter(user_id=options['user'])
+        conversation_ids = list(conversations.values_list('id', flat=True)[:options['limit']])
+
+        created = failed = 0
+        for conversation_id in conversation_ids:
+            try:
+                count = extract_memories(conversation_id, min_turns=options['min_turns'])
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Conversation {conversation_id}: failed ({e})')
+                continue
+            if count:
+                self.stdout.write(f'Conversation {conversation_id}: {count} new memories')
+            created += count
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Mined {len(conversation_ids)} conversation(s): {created} new memories, {failed} failed'
+        ))
@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from chatbot.data_transfer import IMPORT_BATCH_SIZE, import_ndjson
+
+
+class Command(BaseCommand):
+    help = "Import an NDJSON (optionally gzipped) export into a user's account"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User who will own the imported data')
+        parser.add_argument('input', help='Path to the .ndjson or .ndjson.gz file')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help='Rows per bulk_create batch')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist")
+
+        try:
+            with open(options['input'], 'rb') as stream, transaction.atomic():
+                counts = import_ndjson(user, stream, batch_size=options['batch_size'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {counts['conversations']} conversations and {counts['documents']} documents "
+            f"for {user.username} ({counts['skipped']} lines skipped)"
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from chatbot.sync import prune_changes
+
+
+class Command(BaseCommand):
+    help = 'Delete old sync change-log entries; clients with older cursors will be asked to refetch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Keep entries newer than this many days')
+
+    def handle(self, *args, **options):
+        deleted = prune_changes(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} change-log entries'))
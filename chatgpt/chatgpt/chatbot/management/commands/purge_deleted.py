@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from chatbot.purge import BATCH_SIZE, ORPHAN_GRACE, purge_once, sweep_orphan_files
+
+
+class Command(BaseCommand):
+    help = 'Purge soft-deleted conversations, documents and users in batches, optionally sweeping orphaned files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows removed per batch and kind')
+        parser.add_argument('--sweep-orphans', action='store_true',
+                            help='Also delete stored files no document or version refers to')
+        parser.add_argument('--grace-hours', type=float, default=ORPHAN_GRACE.total_seconds() / 3600,
+                            help='Keep unreferenced files younger than this many hours')
+        parser.add_argument('--dry-run', action='store_true', help='List orphaned files without deleting them')
+
+    def handle(self, *args, **options):
+        totals = {}
+        while True:
+            counts = purge_once(options['batch_size'])
+            for kind, count in counts.items():
+                totals[kind] = totals.get(kind, 0) + count
+            if not any(counts.values()):
+                break
+        summary = ', '.join(f'{count} {kind}' for kind, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(f'Purged {summary}'))
+
+        if options['sweep_orphans']:
+            orphans = sweep_orphan_files(timedelta(hours=options['grace_hours']), dry_run=options['dry_run'])
+            for name in orphans:
+                self.stdout.write(f'  {name}')
+            verb = 'Found' if options['dry_run'] else 'Deleted'
+            self.stdout.write(self.style.SUCCESS(f'{verb} {len(orphans)} orphaned file(s)'))
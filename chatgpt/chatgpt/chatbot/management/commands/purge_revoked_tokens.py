@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from chatbot.api_tokens import purge_expired_revocations
+
+
+class Command(BaseCommand):
+    help = 'Delete API token revocations whose tokens have expired anyway'
+
+    def handle(self, *args, **options):
+        count = purge_expired_revocations()
+        self.stdout.write(self.style.SUCCESS(f'Purged {count} expired token revocation(s)'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from chatbot.chunked_upload import purge_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned chunked upload sessions and their part files'
+
+    def handle(self, *args, **options):
+        count = purge_stale_uploads()
+        self.stdout.write(self.style.SUCCESS(f'Purged {count} stale upload session(s)'))
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from chatbot.archive import ConversationArchive
+from chatbot.models import Conversation, Document
+from chatbot.search_index import index_conversation, index_document, is_supported
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search indexes of conversation turns and documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only reindex conversations of this username')
+        parser.add_argument('--batch-size', type=int, default=200, help='Conversations per transaction')
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            raise CommandError('Full-text search requires the SQLite backend')
+
+        conversations = Conversation.objects.order_by('id')
+        if options['user']:
+            conversations = conversations.filter(user__username=options['user'])
+
+        archive = ConversationArchive()
+        batch_size = options['batch_size']
+        conversation_count = 0
+        turn_count = 0
+        last_id = 0
+
+        while True:
+            batch = list(conversations.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                for conversation in batch:
+                    messages = conversation.full_conversation
+                    if conversation.is_archived:
+                        # Index cold conversations without restoring them
+                        messages = archive.read_messages(conversation.archive_segment, conversation.archive_offset,
+                                                         conversation.archive_length)
+                    turn_count += index_conversation(conversation, messages)
+            conversation_count += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {turn_count} turns from {conversation_count} conversations'))
+
+        documents = Document.objects.order_by('id').only('id', 'user_id', 'title', 'file_type', 'extracted_text')
+        if options['user']:
+            documents = documents.filter(user__username=options['user'])
+
+        document_count = 0
+        last_id = 0
+        while True:
+            batch = list(documents.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                for document in batch:
+                    index_document(document)
+            document_count += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {document_count} documents'))
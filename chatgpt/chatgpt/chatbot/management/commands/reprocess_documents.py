@@ -0,0 +1,115 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.reprocess import (
+    BATCH_SIZE, EXTRACT, MODES, WORKERS, document_queryset, finish, get_checkpoint, process_batch
+)
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f'{seconds // 3600}h{seconds % 3600 // 60:02d}m'
+    if seconds >= 60:
+        return f'{seconds // 60}m{seconds % 60:02d}s'
+    return f'{seconds}s'
+
+
+class Command(BaseCommand):
+    help = ('Re-extract or re-index stored documents in keyset-ordered batches, checkpointing after each batch '
+            'so an interrupted run resumes where it stopped')
+
+    def add_arguments(self, parser):
+        parser.add_argument('mode', choices=MODES,
+                            help='extract: run the current extractors on the stored files again; '
+                                 'index: rebuild the full-text index entries')
+        parser.add_argument('--name', help='Checkpoint name (defaults to the mode); reuse it to resume')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from the beginning')
+        parser.add_argument('--user', help='Only reprocess documents of this username')
+        parser.add_argument('--file-type', action='append', dest='file_types',
+                            help='Only reprocess documents of this file type (repeatable)')
+        parser.add_argument('--status', action='append', dest='statuses',
+                            help='Only reprocess documents with this extraction status, e.g. timeout (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Documents per batch and checkpoint')
+        parser.add_argument('--workers', type=int, default=WORKERS, help='Files extracted in parallel')
+        parser.add_argument('--max-rate', type=float, default=getattr(settings, 'REPROCESS_MAX_RATE', None),
+                            help='Maximum documents per second')
+        parser.add_argument('--pause', type=float, default=getattr(settings, 'REPROCESS_BATCH_PAUSE', 0.0),
+                            help='Seconds to sleep between batches')
+        parser.add_argument('--nice', type=int, default=getattr(settings, 'REPROCESS_NICE', 10),
+                            help='Lower the CPU priority of this process and its extractors by this much')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many documents')
+
+    def handle(self, *args, **options):
+        mode = options['mode']
+        filters = {key: options[key] for key in ('user', 'file_types', 'statuses') if options[key]}
+        try:
+            checkpoint, resumed = get_checkpoint(options['name'] or mode, mode, filters, options['restart'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if resumed:
+            self.stdout.write(
+                f'Resuming "{checkpoint.name}" after document {checkpoint.last_id} '
+                f'({checkpoint.processed} done, {checkpoint.failed} failed)'
+            )
+        if options['nice'] and hasattr(os, 'nice'):
+            # Extraction subprocesses inherit the lower priority
+            os.nice(options['nice'])
+
+        documents = document_queryset(filters)
+        remaining = documents.filter(id__gt=checkpoint.last_id).count()
+        if options['limit'] is not None:
+            remaining = min(remaining, options['limit'])
+        self.stdout.write(f'{remaining} document(s) to {mode}')
+
+        batch_size = options['batch_size']
+        max_rate = options['max_rate']
+        done = changed = failed = 0
+        started = time.monotonic()
+
+        executor = ThreadPoolExecutor(max_workers=options['workers']) if mode == EXTRACT else None
+        try:
+            while done < remaining:
+                batch = list(documents.filter(id__gt=checkpoint.last_id)[:min(batch_size, remaining - done)])
+                if not batch:
+                    break
+                batch_changed, batch_failed = process_batch(checkpoint, batch, executor)
+                done += len(batch)
+                changed += batch_changed
+                failed += batch_failed
+
+                elapsed = time.monotonic() - started
+                rate = done / elapsed if elapsed else 0.0
+                eta = format_duration((remaining - done) / rate) if rate else '?'
+                self.stdout.write(
+                    f'{done}/{remaining} ({100 * done / remaining:.1f}%) up to id {checkpoint.last_id}: '
+                    f'{rate:.1f} docs/s, {changed} changed, {failed} failed, ETA {eta}'
+                )
+
+                # Throttle so a long run leaves capacity for live traffic
+                delay = options['pause']
+                if max_rate:
+                    delay = max(delay, done / max_rate - elapsed)
+                if delay > 0 and done < remaining:
+                    time.sleep(delay)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING(
+                f'Interrupted after document {checkpoint.last_id}; rerun with --name {checkpoint.name} to resume'
+            ))
+            return
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        if not documents.filter(id__gt=checkpoint.last_id).exists():
+            finish(checkpoint)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {done} document(s) in {format_duration(elapsed)}: {changed} changed, {failed} failed'
+        ))
+        if mode == EXTRACT and changed:
+            self.stdout.write('Run `manage.py summarize_documents` to rebuild the summaries of changed documents')
@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from chatbot.fake_models import FakeModel
+from chatbot.model_router import CHAT, DOCUMENT, SUMMARY, LatencyTracker, ModelRouter
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Simulate chat traffic against fake model backends to compare single attempts with hedged, routed requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--kind', choices=[CHAT, DOCUMENT, SUMMARY], default=CHAT)
+        parser.add_argument('--prompt-chars', type=int, default=500)
+        parser.add_argument('--latency', type=float, default=0.05, help='Typical backend latency in seconds')
+        parser.add_argument('--jitter', type=float, default=0.01)
+        parser.add_argument('--tail-rate', type=float, default=0.05, help='Share of calls that are slow')
+        parser.add_argument('--tail-latency', type=float, default=1.0, help='Extra seconds for slow calls')
+        parser.add_argument('--failure-rate', type=float, default=0.02)
+        parser.add_argument('--deadline', type=float, default=3.0)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        profile = {
+            'latency': options['latency'],
+            'jitter': options['jitter'],
+            'tail_rate': options['tail_rate'],
+            'tail_latency': options['tail_latency'],
+            'failure_rate': options['failure_rate'],
+        }
+        models = {}
+
+        def factory(model_name, backend=None):
+            if model_name not in models:
+                models[model_name] = FakeModel(model_name, seed=options['seed'] + len(models), **profile)
+            return models[model_name]
+
+        tiers = {
+            'fast': {'model': 'fake-fast', 'fallback': None},
+            'standard': {'model': 'fake-standard', 'fallback': 'fast'},
+            'long': {'model': 'fake-long', 'fallback': 'standard'},
+        }
+        single = {name: dict(config, fallback=None) for name, config in tiers.items()}
+        prompt = 'x' * options['prompt_chars']
+
+        scenarios = [
+            ('single attempt', single, False),
+            ('hedged + fallback', tiers, True),
+        ]
+        self.stdout.write(f"{'scenario':<20}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+                          f"{'errors':>8}{'hedged':>8}{'fallback':>10}")
+
+        for label, scenario_tiers, hedging in scenarios:
+            models.clear()
+            router = ModelRouter(scenario_tiers, factory, deadline=options['deadline'], hedging=hedging,
+                                 hedge_delay=options['latency'] * 4, tracker=LatencyTracker())
+
+            def one(_):
+                started = time.monotonic()
+                try:
+                    routed = router.generate(prompt, options['kind'])
+                    return time.monotonic() - started, None, routed.hedged, routed.fallbacks
+                except Exception as e:
+                    return time.monotonic() - started, e, False, 0
+
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                results = list(pool.map(one, range(options['requests'])))
+            router.executor.shutdown(wait=True)
+
+            latencies = [elapsed * 1000 for elapsed, error, _, _ in results if error is None]
+            errors = sum(1 for _, error, _, _ in results if error is not None)
+            hedged = sum(1 for _, _, was_hedged, _ in results if was_hedged)
+            fallbacks = sum(1 for _, _, _, count in results if count)
+            self.stdout.write(
+                f'{label:<20}{percentile(latencies, 0.5):>9.0f}{percentile(latencies, 0.95):>9.0f}'
+                f'{percentile(latencies, 0.99):>9.0f}{max(latencies or [0]):>9.0f}'
+                f'{errors:>8}{hedged:>8}{fallbacks:>10}'
+            )
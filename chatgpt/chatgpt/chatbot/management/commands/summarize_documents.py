@@ -0,0 +1,31 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from chatbot.models import Document
+from chatbot.summarizer import claimable, summarize_document
+
+
+class Command(BaseCommand):
+    help = ('Build map-reduce summaries for documents that are pending, failed, stuck running past their lease '
+            'or (with --force) all documents')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild summaries that already exist')
+        parser.add_argument('--user', type=int, default=None, help='Only summarise this user id\'s documents')
+        parser.add_argument('--limit', type=int, default=None, help='Maximum documents to summarise in this run')
+
+    def handle(self, *args, **options):
+        documents = Document.objects.filter(claimable(options['force'])).order_by('id')
+        if options['user'] is not None:
+            documents = documents.filter(user_id=options['user'])
+        document_ids = list(documents.values_list('id', flat=True)[:options['limit']])
+
+        statuses = Counter()
+        for document_id in document_ids:
+            status = summarize_document(document_id, force=options['force'])
+            statuses[status] += 1
+            self.stdout.write(f'Document {document_id}: {status}')
+
+        summary = ', '.join(f'{count} {status}' for status, count in sorted(statuses.items())) or 'nothing to do'
+        self.stdout.write(self.style.SUCCESS(f'Summarised {len(document_ids)} document(s): {summary}'))
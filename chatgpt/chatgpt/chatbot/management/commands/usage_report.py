@@ -0,0 +1,55 @@
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from chatbot.usage import buffer, usage_between
+
+
+class Command(BaseCommand):
+    help = 'Report prompt and response tokens by user, day and/or model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Report the last N days (including today)')
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (YYYY-MM-DD); overrides --days')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day (YYYY-MM-DD), default today')
+        parser.add_argument('--by', default='user,model',
+                            help='Comma-separated grouping: any of user, day, model')
+        parser.add_argument('--user', help='Only this username')
+        parser.add_argument('--top', type=int, default=None, help='Show only the N largest rows')
+
+    def handle(self, *args, **options):
+        group_by = [field.strip() for field in options['by'].split(',') if field.strip()]
+        if not group_by or set(group_by) - {'user', 'day', 'model'}:
+            raise CommandError('--by takes a comma-separated list of: user, day, model')
+
+        end = options['end'] or timezone.localdate()
+        start = options['start'] or end - timedelta(days=options['days'] - 1)
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"No such user: {options['user']}")
+
+        # Include whatever this process has buffered (normally nothing for a management command)
+        buffer.flush()
+        rows = usage_between(start, end, user=user, group_by=group_by)
+        if options['top']:
+            rows = rows[:options['top']]
+
+        columns = group_by
+        widths = {column: max([len(column)] + [len(str(row[column])) for row in rows]) for column in columns}
+        header = ''.join(f'{column:<{widths[column] + 2}}' for column in columns)
+        self.stdout.write(f"{header}{'requests':>10}{'prompt':>14}{'response':>14}{'total':>14}")
+        for row in rows:
+            labels = ''.join(f'{str(row[column]):<{widths[column] + 2}}' for column in columns)
+            self.stdout.write(
+                f"{labels}{row['requests']:>10}{row['prompt_tokens']:>14}{row['response_tokens']:>14}"
+                f"{row['total_tokens']:>14}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(rows)} row(s) from {start} to {end}; "
+            f"{sum(row['total_tokens'] for row in rows)} tokens in {sum(row['requests'] for row in rows)} requests"
+        ))
@@ -0,0 +1,184 @@
+"""
+Long-term memory: durable facts about a user, extracted from past conversations and recalled into new prompts
+"""
+import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+
+from .model_router import SUMMARY, get_router
+from .models import Conversation, ConversationMemoryState, UserMemory
+from .search_index import recall_memory_ids
+from .usage import estimate_tokens, record_usage
+
+ENABLED = getattr(settings, 'MEMORY_ENABLED', True)
+EXTRACT_EVERY_TURNS = getattr(settings, 'MEMORY_EXTRACT_EVERY_TURNS', 4)
+TOP_K = getattr(settings, 'MEMORY_TOP_K', 5)
+TOKEN_BUDGET = getattr(settings, 'MEMORY_TOKEN_BUDGET', 300)
+BACKGROUND_WORKERS = getattr(settings, 'MEMORY_BACKGROUND_WORKERS', 1)
+MAX_FACTS_PER_BATCH = 8
+MAX_TURN_CHARS = 1500
+MIN_FACT_CHARS = 8
+MAX_FACT_CHARS = 300
+
+EXTRACTION_PROMPT = (
+    "Below are turns from a conversation between a user and an assistant. List the durable facts about the "
+    "user that would help in future, unrelated conversations: their background, preferences, goals, ongoing "
+    "projects and decisions. Skip small talk and anything only relevant to this exchange. Write one short, "
+    "self-contained fact per line, each starting with \"- \". If there is nothing worth remembering, reply NONE."
+)
+
+BULLET_RE = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s+(.*\S)\s*$')
+SPACE_RE = re.compile(r'\s+')
+
+_background = None
+
+
+def fingerprint(text: str) -> str:
+    """Identity of a fact regardless of case, spacing and trailing punctuation"""
+    normalised = SPACE_RE.sub(' ', text.lower()).strip().rstrip('.!')
+    return hashlib.sha256(normalised.encode('utf-8')).hexdigest()
+
+
+def parse_facts(text: str) -> List[str]:
+    """Bulleted lines of a model reply, de-duplicated and length-limited"""
+    facts = []
+    seen = set()
+    for line in (text or '').splitlines():
+        match = BULLET_RE.match(line)
+        if not match:
+            continue
+        fact = match.group(1).strip()
+        key = fingerprint(fact)
+        if MIN_FACT_CHARS <= len(fact) <= MAX_FACT_CHARS and key not in seen:
+            seen.add(key)
+            facts.append(fact)
+    return facts[:MAX_FACTS_PER_BATCH]
+
+
+def _extraction_prompt(turns: List[dict]) -> str:
+    lines = [EXTRACTION_PROMPT, '']
+    for turn in turns:
+        lines.append(f"User: {(turn.get('user_message') or '')[:MAX_TURN_CHARS]}")
+        lines.append(f"Assistant: {(turn.get('bot_response') or '')[:MAX_TURN_CHARS]}")
+    return '\n'.join(lines)
+
+
+def _read_messages(conversation: Conversation) -> list:
+    """A conversation's turns, read from cold storage without restoring it"""
+    if conversation.is_archived:
+        from .archive import ConversationArchive
+        return ConversationArchive().read_messages(
+            conversation.archive_segment, conversation.archive_offset, conversation.archive_length
+        )
+    return conversation.full_conversation or []
+
+
+def extract_memories(conversation_id: int, min_turns: int = 1) -> int:
+    """
+    Mine the turns of a conversation not yet looked at for facts about its user.
+
+    The turn watermark is advanced with a conditional update before the
+    model is called, so concurrent workers never mine the same turns, and
+    put back if the call fails.
+
+    Returns:
+        Number of new memories stored
+    """
+    conversation = Conversation.objects.filter(id=conversation_id).first()
+    if conversation is None:
+        return 0
+    state, _ = ConversationMemoryState.objects.get_or_create(conversation=conversation)
+    messages = _read_messages(conversation)
+    start = state.extracted_turns
+    if len(messages) - start < min_turns:
+        return 0
+    claimed = ConversationMemoryState.objects.filter(
+        conversation=conversation, extracted_turns=start
+    ).update(extracted_turns=len(messages))
+    if not claimed:
+        return 0
+
+    prompt = _extraction_prompt(messages[start:])
+    try:
+        routed = get_router().generate(prompt, SUMMARY)
+    except Exception:
+        ConversationMemoryState.objects.filter(
+            conversation=conversation, extracted_turns=len(messages)
+        ).update(extracted_turns=start)
+        raise
+    record_usage(conversation.user_id, conversation.id, routed.model, prompt, routed.text, routed.response)
+
+    created = 0
+    for fact in parse_facts(routed.text):
+        try:
+            with transaction.atomic():
+                _, was_created = UserMemory.objects.get_or_create(
+                    user_id=conversation.user_id, fingerprint=fingerprint(fact),
+                    defaults={'text': fact, 'conversation': conversation},
+                )
+        except IntegrityError:
+            # The same fact was stored concurrently from another conversation
+            continue
+        created += was_created
+    return created
+
+
+def _run_in_background(conversation_id: int) -> None:
+    close_old_connections()
+    try:
+        extract_memories(conversation_id, min_turns=EXTRACT_EVERY_TURNS)
+    except Exception:
+        # Left for the next batch of turns or `manage.py extract_memories`
+        pass
+    finally:
+        close_old_connections()
+
+
+def schedule_extraction(conversation: Conversation) -> None:
+    """Mine a conversation in the background every EXTRACT_EVERY_TURNS turns"""
+    global _background
+    if not ENABLED or not conversation.message_count or conversation.message_count % EXTRACT_EVERY_TURNS:
+        return
+    if _background is None:
+        _background = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='memory')
+    conversation_id = conversation.id
+    transaction.on_commit(lambda: _background.submit(_run_in_background, conversation_id))
+
+
+def recall(user, query: str, top_k: int = TOP_K, token_budget: int = TOKEN_BUDGET) -> List[str]:
+    """
+    The user's memories most relevant to the query, best first, as many of
+    the top ``top_k`` as fit in ``token_budget`` estimated tokens.
+    """
+    if not ENABLED:
+        return []
+    memory_ids = recall_memory_ids(user.id, query, top_k)
+    if memory_ids is None:
+        # No FTS: fall back to the newest memories
+        memories = list(UserMemory.objects.filter(user=user).values_list('text', flat=True)[:top_k])
+    else:
+        texts = dict(UserMemory.objects.filter(id__in=memory_ids, user=user).values_list('id', 'text'))
+        memories = [texts[memory_id] for memory_id in memory_ids if memory_id in texts]
+
+    recalled = []
+    used = 0
+    for text in memories:
+        cost = estimate_tokens(text) + 2
+        if used + cost > token_budget:
+            continue
+        recalled.append(text)
+        used += cost
+    return recalled
+
+
+def memory_context(user, query: str) -> Optional[str]:
+    """Prompt section listing the recalled memories, or None if there are none"""
+    memories = recall(user, query)
+    if not memories:
+        return None
+    lines = '\n'.join(f'- {text}' for text in memories)
+    return f"What you remember about the user from earlier conversations:\n{lines}"
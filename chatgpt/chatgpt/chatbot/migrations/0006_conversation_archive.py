@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:24
+
+from django.db import migrations, models
+
+
+def backfill_message_count(apps, schema_editor):
+    Conversation = apps.get_model('chatbot', 'Conversation')
+    batch = []
+    for conversation in Conversation.objects.only('id', 'full_conversation').iterator(chunk_size=500):
+        conversation.message_count = len(conversation.full_conversation or [])
+        batch.append(conversation)
+        if len(batch) >= 500:
+            Conversation.objects.bulk_update(batch, ['message_count'])
+            batch = []
+    if batch:
+        Conversation.objects.bulk_update(batch, ['message_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0005_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='archive_length',
+            field=models.IntegerField(blank=True, help_text='Compressed length in bytes', null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='archive_offset',
+            field=models.BigIntegerField(blank=True, help_text='Byte offset within the segment', null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='archive_segment',
+            field=models.CharField(blank=True, help_text='Archive segment holding the messages', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='is_archived',
+            field=models.BooleanField(db_index=True, default=False, help_text='Messages moved to cold storage'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of message exchanges'),
+        ),
+        migrations.RunPython(backfill_message_count, migrations.RunPython.noop),
+    ]
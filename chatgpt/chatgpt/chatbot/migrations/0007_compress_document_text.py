@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:26
+
+import chatbot.fields
+from django.db import migrations
+
+
+BATCH_SIZE = 200
+
+
+def compress_existing_text(apps, schema_editor):
+    """Rewrite plain-text rows in keyset-ordered batches so they are stored compressed"""
+    Document = apps.get_model('chatbot', 'Document')
+    last_id = 0
+    while True:
+        batch = list(Document.objects.filter(id__gt=last_id).order_by('id').only('id', 'extracted_text')[:BATCH_SIZE])
+        if not batch:
+            break
+        legacy = [document for document in batch if isinstance(document.__dict__.get('extracted_text'), str)]
+        if legacy:
+            Document.objects.bulk_update(legacy, ['extracted_text'])
+        last_id = batch[-1].id
+
+
+def decompress_text(apps, schema_editor):
+    """Nothing to do: the field reads both compressed and plain rows"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0006_conversation_archive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='extracted_text',
+            field=chatbot.fields.CompressedTextField(help_text='Extracted text content from the document (stored compressed)'),
+        ),
+        migrations.RunPython(compress_existing_text, decompress_text),
+    ]
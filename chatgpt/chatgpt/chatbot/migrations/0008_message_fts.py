@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS chatbot_message_fts USING fts5("
+        "owner, user_message, bot_response, "
+        "conversation_id UNINDEXED, turn_index UNINDEXED, timestamp UNINDEXED, "
+        "tokenize = 'porter unicode61')"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS chatbot_message_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0007_compress_document_text'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
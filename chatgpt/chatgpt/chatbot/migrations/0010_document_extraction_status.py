@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0009_changelog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='extraction_error',
+            field=models.TextField(blank=True, default='', help_text='Why extraction failed, if it did'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='extraction_status',
+            field=models.CharField(choices=[('ok', 'OK'), ('timeout', 'Timed out'), ('oom', 'Out of memory'), ('corrupt', 'Corrupt or unreadable'), ('error', 'Extraction error')], default='ok', help_text='Outcome of text extraction', max_length=12),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0010_document_extraction_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='summary_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('ready', 'Ready'), ('skipped', 'Skipped (short or not extracted)'), ('failed', 'Failed')], db_index=True, default='pending', help_text='State of the precomputed summary hierarchy', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='DocumentSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('chunk', 'Chunk'), ('section', 'Section'), ('document', 'Document')], max_length=10)),
+                ('position', models.IntegerField(help_text='Order within its level')),
+                ('section', models.IntegerField(blank=True, help_text='Section a chunk belongs to', null=True)),
+                ('start_offset', models.IntegerField(help_text='First character of the extracted text covered')),
+                ('end_offset', models.IntegerField(help_text='End (exclusive) of the extracted text covered')),
+                ('summary', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='chatbot.document')),
+            ],
+            options={
+                'verbose_name': 'Document Summary',
+                'verbose_name_plural': 'Document Summaries',
+                'ordering': ['document', 'level', 'position'],
+                'indexes': [models.Index(fields=['document', 'level', 'position'], name='chatbot_docsummary_level')],
+            },
+        ),
+    ]
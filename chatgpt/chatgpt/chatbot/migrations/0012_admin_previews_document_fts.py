@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:44
+
+from django.db import migrations, models
+
+from chatbot.fields import get_text_preview
+
+BATCH_SIZE = 500
+
+
+def backfill_previews(apps, schema_editor):
+    Conversation = apps.get_model('chatbot', 'Conversation')
+    batch = []
+    for conversation in Conversation.objects.only('id', 'full_conversation').iterator(chunk_size=BATCH_SIZE):
+        messages = conversation.full_conversation or []
+        conversation.last_message_preview = (messages[-1].get('user_message') or '')[:200] if messages else ''
+        batch.append(conversation)
+        if len(batch) >= BATCH_SIZE:
+            Conversation.objects.bulk_update(batch, ['last_message_preview'])
+            batch = []
+    if batch:
+        Conversation.objects.bulk_update(batch, ['last_message_preview'])
+
+    Document = apps.get_model('chatbot', 'Document')
+    batch = []
+    for document in Document.objects.only('id', 'extracted_text').iterator(chunk_size=BATCH_SIZE):
+        document.text_preview = get_text_preview(document, 'extracted_text', 200)
+        batch.append(document)
+        if len(batch) >= BATCH_SIZE:
+            Document.objects.bulk_update(batch, ['text_preview'])
+            batch = []
+    if batch:
+        Document.objects.bulk_update(batch, ['text_preview'])
+
+
+def create_fts_table(apps, schema_editor):
+    # Filled for existing documents by `manage.py rebuild_search_index`
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS chatbot_document_fts USING fts5("
+        "owner, title, body, tokenize = 'porter unicode61')"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS chatbot_document_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0011_document_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', help_text='Start of the latest user message', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='text_preview',
+            field=models.CharField(blank=True, default='', help_text='Start of the extracted text', max_length=200),
+        ),
+        migrations.RunPython(backfill_previews, migrations.RunPython.noop),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
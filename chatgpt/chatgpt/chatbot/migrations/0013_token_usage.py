@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chatbot', '0012_admin_previews_document_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationUsage',
+            fields=[
+                ('conversation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='usage', serialize=False, to='chatbot.conversation')),
+                ('requests', models.PositiveIntegerField(default=0)),
+                ('prompt_tokens', models.PositiveBigIntegerField(default=0)),
+                ('response_tokens', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Conversation Usage',
+                'verbose_name_plural': 'Conversation Usage',
+            },
+        ),
+        migrations.CreateModel(
+            name='TokenUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('model', models.CharField(help_text='Model that answered', max_length=100)),
+                ('requests', models.PositiveIntegerField(default=0)),
+                ('prompt_tokens', models.PositiveBigIntegerField(default=0)),
+                ('response_tokens', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='token_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Token Usage',
+                'verbose_name_plural': 'Token Usage',
+                'ordering': ['-day', 'user', 'model'],
+                'indexes': [models.Index(fields=['day'], name='chatbot_tokenusage_day')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='tokenusage',
+            constraint=models.UniqueConstraint(fields=('user', 'day', 'model'), name='chatbot_tokenusage_user_day_model'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:50
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0013_token_usage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='last_accessed',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, help_text='Last read; written in batches by chatbot.access_tracking'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['user', '-last_accessed'], name='chatbot_document_user_access'),
+        ),
+    ]
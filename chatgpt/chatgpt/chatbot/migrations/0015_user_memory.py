@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS chatbot_memory_fts USING fts5("
+        "owner, text, tokenize = 'porter unicode61')"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS chatbot_memory_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chatbot', '0014_document_access_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationMemoryState',
+            fields=[
+                ('conversation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='memory_state', serialize=False, to='chatbot.conversation')),
+                ('extracted_turns', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserMemory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField()),
+                ('fingerprint', models.CharField(help_text='SHA-256 of the normalised text, for de-duplication', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(blank=True, help_text='Conversation the fact was extracted from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='memories', to='chatbot.conversation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memories', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Memory',
+                'verbose_name_plural': 'User Memories',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='usermemory',
+            constraint=models.UniqueConstraint(fields=('user', 'fingerprint'), name='chatbot_usermemory_user_fingerprint'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0016_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReprocessCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Run name; rerunning with it resumes from here', max_length=100, unique=True)),
+                ('mode', models.CharField(help_text='What the run does to each document', max_length=20)),
+                ('options', models.JSONField(default=dict, help_text='Filters the run was started with')),
+                ('last_id', models.IntegerField(default=0, help_text='Highest document id processed so far')),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Reprocess Checkpoint',
+                'verbose_name_plural': 'Reprocess Checkpoints',
+                'ordering': ['-updated_at'],
+            },
+        ),
+    ]
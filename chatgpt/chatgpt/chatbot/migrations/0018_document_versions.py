@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:00
+
+import chatbot.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0017_reprocess_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='version',
+            field=models.PositiveIntegerField(default=1, help_text='Number of the current version'),
+        ),
+        migrations.CreateModel(
+            name='DocumentVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('file', models.FileField(help_text='File uploaded for this version', upload_to='documents/')),
+                ('file_type', models.CharField(max_length=50)),
+                ('file_size', models.IntegerField(help_text='File size in bytes')),
+                ('extraction_status', models.CharField(choices=[('ok', 'OK'), ('timeout', 'Timed out'), ('oom', 'Out of memory'), ('corrupt', 'Corrupt or unreadable'), ('error', 'Extraction error')], default='ok', max_length=12)),
+                ('extraction_error', models.TextField(blank=True, default='')),
+                ('page_count', models.PositiveIntegerField(default=0, help_text='Pages stored (0 if extraction failed)')),
+                ('pages_extracted', models.PositiveIntegerField(default=0, help_text='Pages extracted rather than reused')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='chatbot.document')),
+            ],
+            options={
+                'verbose_name': 'Document Version',
+                'verbose_name_plural': 'Document Versions',
+                'ordering': ['document', '-number'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DocumentPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(help_text='Page index, from 0')),
+                ('content_hash', models.CharField(blank=True, help_text='SHA-256 of what the page draws or of the whole file; empty if unknown', max_length=64)),
+                ('text', chatbot.fields.CompressedTextField(blank=True, help_text='Extracted text of the page (stored compressed)')),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='chatbot.documentversion')),
+            ],
+            options={
+                'verbose_name': 'Document Page',
+                'verbose_name_plural': 'Document Pages',
+                'ordering': ['version', 'number'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='documentversion',
+            constraint=models.UniqueConstraint(fields=('document', 'number'), name='chatbot_documentversion_document_number'),
+        ),
+        migrations.AddConstraint(
+            model_name='documentpage',
+            constraint=models.UniqueConstraint(fields=('version', 'number'), name='chatbot_documentpage_version_number'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chatbot', '0019_soft_delete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(blank=True, help_text='Id of the revoked token; empty for all of them', max_length=32)),
+                ('revoked_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField(db_index=True, help_text='When the revoked tokens expire on their own')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revoked_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Revoked Token',
+                'verbose_name_plural': 'Revoked Tokens',
+                'ordering': ['-revoked_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='revokedtoken',
+            constraint=models.UniqueConstraint(condition=models.Q(('jti', ''), _negated=True), fields=('jti',), name='chatbot_revokedtoken_jti'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0021_document_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='summary_claimed_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When a worker claimed the summary; a run older than the lease is taken over', null=True),
+        ),
+    ]
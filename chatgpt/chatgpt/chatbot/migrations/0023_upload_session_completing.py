@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0022_document_summary_claim'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('completing', 'Completing'), ('complete', 'Complete'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
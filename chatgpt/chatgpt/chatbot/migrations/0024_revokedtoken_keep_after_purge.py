@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chatbot', '0023_upload_session_completing'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='revokedtoken',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, help_text='Owner of the revoked tokens; may already be purged', on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
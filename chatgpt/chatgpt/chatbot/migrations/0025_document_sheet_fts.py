@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:02
+
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    # Filled for existing spreadsheets by `manage.py rebuild_search_index`
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS chatbot_document_sheet_fts USING fts5("
+        "owner, body, document_id UNINDEXED, sheet UNINDEXED, chunk_index UNINDEXED, "
+        "tokenize = 'porter unicode61')"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS chatbot_document_sheet_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0024_revokedtoken_keep_after_purge'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,272 @@
+"""
+Latency-aware model routing: tier selection, end-to-end deadlines, hedged requests and fallback
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Generator, List, Optional
+
+from django.conf import settings
+
+DEFAULT_TIERS = {
+    'fast': {'model': 'gemini-2.0-flash-lite', 'fallback': None},
+    'standard': {'model': 'gemini-2.0-flash-exp', 'fallback': 'fast'},
+    'long': {'model': 'gemini-1.5-pro', 'fallback': 'standard'},
+}
+
+DEADLINE_SECONDS = getattr(settings, 'CHAT_DEADLINE_SECONDS', 30)
+HEDGING = getattr(settings, 'CHAT_HEDGING', True)
+HEDGE_DELAY = getattr(settings, 'CHAT_HEDGE_DELAY', 3.0)
+HEDGE_MIN_SAMPLES = getattr(settings, 'CHAT_HEDGE_MIN_SAMPLES', 20)
+SHORT_PROMPT_CHARS = getattr(settings, 'CHAT_SHORT_PROMPT_CHARS', 1500)
+LONG_PROMPT_CHARS = getattr(settings, 'CHAT_LONG_PROMPT_CHARS', 20000)
+MAX_WORKERS = getattr(settings, 'CHAT_ROUTER_MAX_WORKERS', 32)
+LATENCY_WINDOW = 200
+END_OF_STREAM = object()
+
+# Request kinds the router knows how to place
+CHAT = 'chat'
+DOCUMENT = 'document'
+SUMMARY = 'summary'
+
+
+class DeadlineExceeded(Exception):
+    """No model answered before the request's deadline"""
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies per tier"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, tier: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(tier, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, tier: str, fraction: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(tier, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+    def hedge_delay(self, tier: str, default: float = HEDGE_DELAY, min_samples: int = HEDGE_MIN_SAMPLES) -> float:
+        """How long to wait before hedging: the tier's p95 once there are enough samples"""
+        with self._lock:
+            count = len(self._samples.get(tier, ()))
+        if count < min_samples:
+            return default
+        return self.percentile(tier, 0.95)
+
+
+class RoutedResponse:
+    """A model answer and how it was obtained"""
+
+    def __init__(self, text: str, tier: str, model: str, response=None, hedged: bool = False,
+                 fallbacks: int = 0, elapsed: float = 0.0):
+        self.text = text
+        self.tier = tier
+        self.model = model
+        self.response = response
+        self.hedged = hedged
+        self.fallbacks = fallbacks
+        self.elapsed = elapsed
+
+
+class ModelRouter:
+    """
+    Sends each request to a model tier chosen by request kind and prompt size.
+
+    Every request has an end-to-end deadline. If the first attempt on a tier
+    is still running after that tier's p95 latency, a duplicate (hedged)
+    request is sent and whichever answers first wins. Errors move the
+    request down the tier's fallback chain to a cheaper model while time is
+    left.
+
+    Python threads cannot be cancelled, so a call that loses a hedge or
+    overruns the deadline finishes in the background and is discarded.
+    """
+
+    def __init__(self, tiers: Dict[str, dict], model_factory: Callable, deadline: float = DEADLINE_SECONDS,
+                 hedging: bool = HEDGING, hedge_delay: float = HEDGE_DELAY, max_workers: int = MAX_WORKERS,
+                 tracker: Optional[LatencyTracker] = None):
+        self.tiers = tiers
+        self.model_factory = model_factory
+        self.deadline = deadline
+        self.hedging = hedging
+        self.hedge_delay = hedge_delay
+        self.tracker = tracker or LatencyTracker()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='model-router')
+
+    def choose_tier(self, kind: str, prompt: str) -> str:
+        """
+        Pick the tier for a request.
+
+        Only the prompt's size earns the long-context tier: document
+        questions are answered from precomputed summaries and previews, so
+        their prompts are small. They skip the fast tier, though.
+        """
+        if kind == SUMMARY:
+            return 'fast'
+        if len(prompt) >= LONG_PROMPT_CHARS:
+            return 'long'
+        if len(prompt) <= SHORT_PROMPT_CHARS and kind != DOCUMENT:
+            return 'fast'
+        return 'standard'
+
+    def fallback_chain(self, tier: str) -> List[str]:
+        """The tier followed by its fallbacks, cheapest last"""
+        chain = []
+        while tier and tier not in chain and tier in self.tiers:
+            chain.append(tier)
+            tier = self.tiers[tier].get('fallback')
+        return chain
+
+    def _model(self, tier: str):
+        config = self.tiers[tier]
+        return self.model_factory(config['model'], config.get('backend'))
+
+    def _call(self, tier: str, model, prompt: str):
+        started = time.monotonic()
+        response = model.generate_content(prompt)
+        self.tracker.record(tier, time.monotonic() - started)
+        return response
+
+    def _before_deadline(self, tier: str, deadline: float, function: Callable, *args):
+        """Run a blocking call on the executor, giving up on it at the deadline"""
+        future = self.executor.submit(function, *args)
+        done, _ = wait([future], timeout=max(0.0, deadline - time.monotonic()))
+        if not done:
+            raise DeadlineExceeded(f'{tier} tier did not finish within the deadline')
+        return future.result()
+
+    def _call_hedged(self, tier: str, prompt: str, deadline: float):
+        """Run one tier, hedging once if the first attempt is slow; returns (response, hedged)"""
+        model = self._model(tier)
+        pending = {self.executor.submit(self._call, tier, model, prompt)}
+        hedged = False
+        error = None
+
+        if self.hedging:
+            hedge_at = time.monotonic() + self.tracker.hedge_delay(tier, default=self.hedge_delay)
+            done, _ = wait(pending, timeout=max(0.0, min(hedge_at, deadline) - time.monotonic()))
+            if not done and time.monotonic() < deadline:
+                pending.add(self.executor.submit(self._call, tier, model, prompt))
+                hedged = True
+
+        while pending:
+            done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f'{tier} tier did not answer within the deadline')
+            for future in done:
+                pending.discard(future)
+                if future.exception() is None:
+                    return future.result(), hedged
+                error = future.exception()
+        raise error
+
+    def generate(self, prompt: str, kind: str = CHAT) -> RoutedResponse:
+        """Get a complete answer within the deadline"""
+        started = time.monotonic()
+        deadline = started + self.deadline
+        chain = self.fallback_chain(self.choose_tier(kind, prompt))
+        last_error = None
+
+        for fallbacks, tier in enumerate(chain):
+            if time.monotonic() >= deadline:
+                break
+            try:
+                response, hedged = self._call_hedged(tier, prompt, deadline)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                last_error = e
+                continue
+            return RoutedResponse(
+                text=getattr(response, 'text', '') or '',
+                tier=tier,
+                model=self.tiers[tier]['model'],
+                response=response,
+                hedged=hedged,
+                fallbacks=fallbacks,
+                elapsed=time.monotonic() - started,
+            )
+
+        if last_error is not None:
+            raise last_error
+        raise DeadlineExceeded('No model tier answered within the deadline')
+
+    def stream(self, prompt: str, kind: str = CHAT) -> Generator[str, None, RoutedResponse]:
+        """
+        Stream an answer, falling back to the next tier if a stream fails before its first token.
+
+        Streams are not hedged: duplicating one would mean discarding tokens
+        already sent to the client. Each read runs on the executor, so a
+        stream that stalls is cut off at the deadline rather than after its
+        next chunk. The generator's return value (the value of ``yield
+        from``) is a RoutedResponse with the full text.
+        """
+        started = time.monotonic()
+        deadline = started + self.deadline
+        last_error = None
+
+        for fallbacks, tier in enumerate(self.fallback_chain(self.choose_tier(kind, prompt))):
+            tier_started = time.monotonic()
+            parts = []
+            chunk = None
+            try:
+                model = self._model(tier)
+                chunks = self._before_deadline(
+                    tier, deadline, lambda: iter(model.generate_content(prompt, stream=True))
+                )
+                while True:
+                    received = self._before_deadline(tier, deadline, next, chunks, END_OF_STREAM)
+                    if received is END_OF_STREAM:
+                        break
+                    chunk = received
+                    text = getattr(chunk, 'text', '')
+                    if text:
+                        if not parts:
+                            # Time to first token is tracked apart from full-response latency
+                            self.tracker.record(f'{tier}:first_token', time.monotonic() - tier_started)
+                        parts.append(text)
+                        yield text
+                return RoutedResponse(
+                    text=''.join(parts),
+                    tier=tier,
+                    model=self.tiers[tier]['model'],
+                    response=chunk,
+                    fallbacks=fallbacks,
+                    elapsed=time.monotonic() - started,
+                )
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                if parts:
+                    raise
+                last_error = e
+            if time.monotonic() >= deadline:
+                break
+
+        if last_error is not None:
+            raise last_error
+        raise DeadlineExceeded('No model tier answered within the deadline')
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    """The process-wide router, configured from CHAT_MODEL_TIERS"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                from .chat_service import get_model
+                _router = ModelRouter(getattr(settings, 'CHAT_MODEL_TIERS', DEFAULT_TIERS), get_model)
+    return _router
@@ -1,10 +1,20 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.core.files.storage import default_storage
+from django.utils import timezone
+from .fields import CompressedTextField, get_text_preview
 import uuid
 import json
 import os
 
+PREVIEW_LENGTH = 200
+
+
+class LiveManager(models.Manager):
+    """Default manager that hides soft-deleted rows; ``all_objects`` still sees them"""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 
 class Conversation(models.Model):
     """Model to store complete chat conversations"""
@@ -12,8 +22,22 @@ class Conversation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
     title = models.CharField(max_length=200, help_text="Title of the conversation")
     full_conversation = models.JSONField(help_text="Complete conversation history as JSON")
+    message_count = models.PositiveIntegerField(default=0, help_text="Number of message exchanges")
+    last_message_preview = models.CharField(
+        max_length=PREVIEW_LENGTH, blank=True, default='', help_text="Start of the latest user message"
+    )
+    is_archived = models.BooleanField(default=False, db_index=True, help_text="Messages moved to cold storage")
+    archive_segment = models.CharField(max_length=100, blank=True, help_text="Archive segment holding the messages")
+    archive_offset = models.BigIntegerField(null=True, blank=True, help_text="Byte offset within the segment")
+    archive_length = models.IntegerField(null=True, blank=True, help_text="Compressed length in bytes")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(
+        null=True, blank=True, db_index=True, help_text="Soft-deleted; the row is purged in the background"
+    )
+    
+    objects = LiveManager()
+    all_objects = models.Manager()
     
     class Meta:
         ordering = ['-updated_at']
@@ -23,10 +47,30 @@ class Conversation(models.Model):
     def __str__(self):
         return f"{self.title} - {self.user.username} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
     
+    def save(self, *args, **kwargs):
+        """Keep the message counter, preview and search index in sync with the stored messages"""
+        from .search_index import index_turn
+        
+        if not self.is_archived:
+            self.message_count = len(self.full_conversation or [])
+            self.last_message_preview = self.preview_of(self.full_conversation)
+        super().save(*args, **kwargs)
+        
+        # Only the newest turn can change through the chat flow
+        if not self.is_archived and self.full_conversation:
+            index_turn(self, len(self.full_conversation) - 1)
+    
+    def ensure_hot(self):
+        """Restore the messages from cold storage if the conversation was archived"""
+        if self.is_archived:
+            from .archive import ConversationArchive
+            ConversationArchive().restore(self)
+    
     def add_message(self, user_message, bot_response, context_summary=None):
         """Add a new message exchange to the conversation"""
         from django.utils import timezone
         
+        self.ensure_hot()
         conversation_data = self.full_conversation or []
         
         message_exchange = {
@@ -41,12 +85,20 @@ class Conversation(models.Model):
         self.save()
     
     def get_messages(self):
-        """Get all messages in the conversation"""
+        """Get all messages in the conversation, restoring them from the archive if needed"""
+        self.ensure_hot()
         return self.full_conversation or []
     
     def get_message_count(self):
         """Get the number of message exchanges in the conversation"""
-        return len(self.full_conversation or [])
+        return self.message_count
+    
+    @staticmethod
+    def preview_of(messages):
+        """Preview text for a message list: the start of its latest user message"""
+        if not messages:
+            return ''
+        return (messages[-1].get('user_message') or '')[:PREVIEW_LENGTH]
     
     @classmethod
     def create_new_conversation(cls, user, title, first_user_message, first_bot_response, context_summary=None):
@@ -116,24 +168,81 @@ class ChatRecord(models.Model):
 
 class Document(models.Model):
     """Model to store uploaded documents and their extracted content"""
+    EXTRACTION_STATUS_CHOICES = [
+        ('ok', 'OK'),
+        ('timeout', 'Timed out'),
+        ('oom', 'Out of memory'),
+        ('corrupt', 'Corrupt or unreadable'),
+        ('error', 'Extraction error'),
+    ]
+    SUMMARY_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('ready', 'Ready'),
+        ('skipped', 'Skipped (short or not extracted)'),
+        ('failed', 'Failed'),
+    ]
+    
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='documents')
     title = models.CharField(max_length=255, help_text="Document title")
     file = models.FileField(upload_to='documents/', help_text="Uploaded file")
     file_type = models.CharField(max_length=50, help_text="File type (pdf, docx, txt, etc.)")
-    extracted_text = models.TextField(help_text="Extracted text content from the document")
+    extracted_text = CompressedTextField(help_text="Extracted text content from the document (stored compressed)")
+    text_preview = models.CharField(
+        max_length=PREVIEW_LENGTH, blank=True, default='', help_text="Start of the extracted text"
+    )
     file_size = models.IntegerField(help_text="File size in bytes")
     upload_date = models.DateTimeField(auto_now_add=True)
-    last_accessed = models.DateTimeField(auto_now=True)
+    last_accessed = models.DateTimeField(
+        default=timezone.now, editable=False,
+        help_text="Last read; written in batches by chatbot.access_tracking"
+    )
+    extraction_status = models.CharField(
+        max_length=12, choices=EXTRACTION_STATUS_CHOICES, default='ok',
+        help_text="Outcome of text extraction"
+    )
+    extraction_error = models.TextField(blank=True, default='', help_text="Why extraction failed, if it did")
+    summary_status = models.CharField(
+        max_length=10, choices=SUMMARY_STATUS_CHOICES, default='pending', db_index=True,
+        help_text="State of the precomputed summary hierarchy"
+    )
+    summary_claimed_at = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        help_text="When a worker claimed the summary; a run older than the lease is taken over"
+    )
+    version = models.PositiveIntegerField(default=1, help_text="Number of the current version")
+    updated_at = models.DateTimeField(
+        auto_now=True, help_text="Last change to the document; bulk updates must set it themselves"
+    )
+    deleted_at = models.DateTimeField(
+        null=True, blank=True, db_index=True, help_text="Soft-deleted; the row and its files are purged in the background"
+    )
+    
+    objects = LiveManager()
+    all_objects = models.Manager()
     
     class Meta:
         ordering = ['-upload_date']
         verbose_name = "Document"
         verbose_name_plural = "Documents"
+        indexes = [models.Index(fields=['user', '-last_accessed'], name='chatbot_document_user_access')]
     
     def __str__(self):
         return f"{self.title} - {self.user.username} - {self.upload_date.strftime('%Y-%m-%d %H:%M')}"
     
+    def save(self, *args, **kwargs):
+        """Refresh the preview when the extracted text has been set or loaded"""
+        text = self.__dict__.get('extracted_text')
+        if isinstance(text, str):
+            self.text_preview = self.preview_of(text)
+        super().save(*args, **kwargs)
+    
+    @staticmethod
+    def preview_of(text):
+        """Preview of extracted text, for rows written with bulk_create"""
+        return (text or '')[:PREVIEW_LENGTH]
+    
     def get_file_extension(self):
         """Get file extension from filename"""
         return os.path.splitext(self.file.name)[1].lower()
@@ -142,6 +251,11 @@ class Document(models.Model):
         """Get file size in MB"""
         return round(self.file_size / (1024 * 1024), 2)
     
+    def get_text_preview(self, length=200):
+        """Get the start of the extracted text, inflating only as much as needed"""
+        preview = get_text_preview(self, 'extracted_text', length + 1)
+        return preview[:length] + ('...' if len(preview) > length else '')
+    
     def is_pdf(self):
         """Check if file is PDF"""
         return self.get_file_extension() == '.pdf'
@@ -154,6 +268,10 @@ class Document(models.Model):
         """Check if file is Excel"""
         return self.get_file_extension() in ['.xlsx', '.xls']
     
+    def is_delimited(self):
+        """Check if file is CSV or TSV"""
+        return self.get_file_extension() in ['.csv', '.tsv']
+    
     def is_text(self):
         """Check if file is text"""
         return self.get_file_extension() in ['.txt', '.md']
@@ -161,10 +279,328 @@ class Document(models.Model):
     def is_image(self):
         """Check if file is image"""
         return self.get_file_extension() in ['.jpg', '.jpeg', '.png', '.gif', '.bmp']
+
+
+class DocumentSummary(models.Model):
+    """One node of a document's summary hierarchy: a chunk, a section or the whole document"""
+    LEVEL_CHOICES = [
+        ('chunk', 'Chunk'),
+        ('section', 'Section'),
+        ('document', 'Document'),
+    ]
+    
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='summaries')
+    level = models.CharField(max_length=10, choices=LEVEL_CHOICES)
+    position = models.IntegerField(help_text="Order within its level")
+    section = models.IntegerField(null=True, blank=True, help_text="Section a chunk belongs to")
+    start_offset = models.IntegerField(help_text="First character of the extracted text covered")
+    end_offset = models.IntegerField(help_text="End (exclusive) of the extracted text covered")
+    summary = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['document', 'level', 'position']
+        verbose_name = "Document Summary"
+        verbose_name_plural = "Document Summaries"
+        indexes = [models.Index(fields=['document', 'level', 'position'], name='chatbot_docsummary_level')]
+    
+    def __str__(self):
+        return f"{self.document_id} {self.level} {self.position}"
+
+
+class DocumentVersion(models.Model):
+    """One uploaded revision of a document; earlier revisions stay readable after a new one is ingested"""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='versions')
+    number = models.PositiveIntegerField()
+    file = models.FileField(upload_to='documents/', help_text="File uploaded for this version")
+    file_type = models.CharField(max_length=50)
+    file_size = models.IntegerField(help_text="File size in bytes")
+    extraction_status = models.CharField(max_length=12, choices=Document.EXTRACTION_STATUS_CHOICES, default='ok')
+    extraction_error = models.TextField(blank=True, default='')
+    page_count = models.PositiveIntegerField(default=0, help_text="Pages stored (0 if extraction failed)")
+    pages_extracted = models.PositiveIntegerField(default=0, help_text="Pages extracted rather than reused")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['document', '-number']
+        verbose_name = "Document Version"
+        verbose_name_plural = "Document Versions"
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'number'], name='chatbot_documentversion_document_number'),
+        ]
+    
+    def __str__(self):
+        return f"{self.document_id} v{self.number}"
+    
+    def get_text(self):
+        """Full text of this version, joined from its pages"""
+        texts = self.pages.order_by('number').values_list('text', flat=True)
+        return '\n'.join(str(text) for text in texts).strip()
+
+
+class DocumentPage(models.Model):
+    """Text of one page of a document version, keyed by a hash of the page's content"""
+    version = models.ForeignKey(DocumentVersion, on_delete=models.CASCADE, related_name='pages')
+    number = models.PositiveIntegerField(help_text="Page index, from 0")
+    content_hash = models.CharField(
+        max_length=64, blank=True, help_text="SHA-256 of what the page draws or of the whole file; empty if unknown"
+    )
+    text = CompressedTextField(blank=True, help_text="Extracted text of the page (stored compressed)")
+    
+    class Meta:
+        ordering = ['version', 'number']
+        verbose_name = "Document Page"
+        verbose_name_plural = "Document Pages"
+        constraints = [
+            models.UniqueConstraint(fields=['version', 'number'], name='chatbot_documentpage_version_number'),
+        ]
+    
+    def __str__(self):
+        return f"{self.version} page {self.number}"
+
+
+class UploadSession(models.Model):
+    """Model to track a resumable, chunked document upload"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('completing', 'Completing'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    file_name = models.CharField(max_length=255, help_text="Original file name")
+    total_size = models.BigIntegerField(help_text="Expected total size in bytes")
+    chunk_size = models.IntegerField(help_text="Size of each chunk in bytes (the last may be shorter)")
+    sha256 = models.CharField(max_length=64, blank=True, help_text="Optional expected SHA-256 of the whole file")
+    received_chunks = models.JSONField(default=dict, help_text="Map of chunk index to its SHA-256")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    document = models.ForeignKey('Document', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Upload Session"
+        verbose_name_plural = "Upload Sessions"
+    
+    def __str__(self):
+        return f"{self.file_name} - {self.user.username} - {self.status}"
+    
+    def get_total_chunks(self):
+        """Get the number of chunks needed to cover the whole file"""
+        return max(1, -(-self.total_size // self.chunk_size))
+    
+    def get_chunk_bounds(self, index):
+        """Get the (start, end) byte offsets of a chunk, end exclusive"""
+        start = index * self.chunk_size
+        return start, min(start + self.chunk_size, self.total_size)
+    
+    def get_missing_chunks(self):
+        """Get indices of chunks that have not been received yet"""
+        return [i for i in range(self.get_total_chunks()) if str(i) not in self.received_chunks]
+
+
+class ChangeLog(models.Model):
+    """Append-only feed of changes to a user's conversations and documents, used for incremental sync"""
+    KIND_CHOICES = [
+        ('conversation', 'Conversation'),
+        ('document', 'Document'),
+    ]
+    ACTION_CHOICES = [
+        ('upsert', 'Created or updated'),
+        ('delete', 'Deleted'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True, help_text="Monotonic version; clients sync from the last one they saw")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='changes')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     
-    def delete(self, *args, **kwargs):
-        """Override delete to also remove the file from storage"""
-        if self.file:
-            if default_storage.exists(self.file.name):
-                default_storage.delete(self.file.name)
-        super().delete(*args, **kwargs)
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['user', 'id'], name='chatbot_changelog_user_id')]
+        verbose_name = "Change Log Entry"
+        verbose_name_plural = "Change Log"
+    
+    def __str__(self):
+        return f"v{self.id} {self.action} {self.kind} {self.object_id} - {self.user.username}"
+
+
+class TokenUsage(models.Model):
+    """Tokens consumed by one user on one day with one model, aggregated from buffered counters"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='token_usage')
+    day = models.DateField()
+    model = models.CharField(max_length=100, help_text="Model that answered")
+    requests = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveBigIntegerField(default=0)
+    response_tokens = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-day', 'user', 'model']
+        verbose_name = "Token Usage"
+        verbose_name_plural = "Token Usage"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'model'], name='chatbot_tokenusage_user_day_model'),
+        ]
+        indexes = [models.Index(fields=['day'], name='chatbot_tokenusage_day')]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.day} {self.model}: {self.prompt_tokens}+{self.response_tokens}"
+    
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.response_tokens
+
+
+class ConversationUsage(models.Model):
+    """Running token totals of one conversation"""
+    conversation = models.OneToOneField(
+        Conversation, on_delete=models.CASCADE, primary_key=True, related_name='usage'
+    )
+    requests = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveBigIntegerField(default=0)
+    response_tokens = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Conversation Usage"
+        verbose_name_plural = "Conversation Usage"
+    
+    def __str__(self):
+        return f"Conversation {self.conversation_id}: {self.prompt_tokens}+{self.response_tokens}"
+
+
+class UserMemory(models.Model):
+    """A durable fact about a user, extracted from past conversations and recalled into new prompts"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='memories')
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.SET_NULL, null=True, blank=True, related_name='memories',
+        help_text="Conversation the fact was extracted from"
+    )
+    text = models.TextField()
+    fingerprint = models.CharField(max_length=64, help_text="SHA-256 of the normalised text, for de-duplication")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "User Memory"
+        verbose_name_plural = "User Memories"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'fingerprint'], name='chatbot_usermemory_user_fingerprint'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.text[:60]}"
+
+
+class ConversationMemoryState(models.Model):
+    """How many turns of a conversation have been mined for memories"""
+    conversation = models.OneToOneField(
+        Conversation, on_delete=models.CASCADE, primary_key=True, related_name='memory_state'
+    )
+    extracted_turns = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Conversation {self.conversation_id}: {self.extracted_turns} turns extracted"
+
+
+class IdempotencyKey(models.Model):
+    """A client's Idempotency-Key and the response of the request that first used it"""
+    STATUS_CHOICES = [
+        ('processing', 'Processing'),
+        ('complete', 'Complete'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64, help_text="SHA-256 of the method, path and body of the request")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='processing')
+    owner = models.CharField(max_length=32, help_text="Token of the request currently running under this key")
+    locked_at = models.DateTimeField(help_text="When the running request claimed the key")
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_content_type = models.CharField(max_length=100, blank=True)
+    response_body = models.BinaryField(blank=True, default=b'')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Keys"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='chatbot_idempotencykey_user_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.key} - {self.status}"
+
+
+class ReprocessCheckpoint(models.Model):
+    """Progress of a resumable bulk reprocessing run over the Document table"""
+    name = models.CharField(max_length=100, unique=True, help_text="Run name; rerunning with it resumes from here")
+    mode = models.CharField(max_length=20, help_text="What the run does to each document")
+    options = models.JSONField(default=dict, help_text="Filters the run was started with")
+    last_id = models.IntegerField(default=0, help_text="Highest document id processed so far")
+    processed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-updated_at']
+        verbose_name = "Reprocess Checkpoint"
+        verbose_name_plural = "Reprocess Checkpoints"
+    
+    def __str__(self):
+        state = 'complete' if self.completed_at else f'at document {self.last_id}'
+        return f"{self.name} ({self.mode}) - {state}"
+
+
+class UserDeletion(models.Model):
+    """A deleted account; the user's data is purged in batches and then the user row itself"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='deletion')
+    requested_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['requested_at']
+        verbose_name = "User Deletion"
+        verbose_name_plural = "User Deletions"
+    
+    def __str__(self):
+        return f"{self.user_id} - requested {self.requested_at:%Y-%m-%d %H:%M}"
+
+
+class RevokedToken(models.Model):
+    """
+    A revoked API token, or (with an empty jti) every token of the user
+    issued before revoked_at; kept only until those tokens would expire anyway.
+
+    The user is referenced without a constraint: purging a deleted account
+    must not take its revocations with it while its tokens are still valid.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+        help_text="Owner of the revoked tokens; may already be purged"
+    )
+    jti = models.CharField(max_length=32, blank=True, help_text="Id of the revoked token; empty for all of them")
+    revoked_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True, help_text="When the revoked tokens expire on their own")
+    
+    class Meta:
+        ordering = ['-revoked_at']
+        constraints = [
+            # A refresh token is revoked when it is used, so a second use of it fails here
+            models.UniqueConstraint(fields=['jti'], condition=~models.Q(jti=''), name='chatbot_revokedtoken_jti'),
+        ]
+        verbose_name = "Revoked Token"
+        verbose_name_plural = "Revoked Tokens"
+    
+    def __str__(self):
+        return f"{self.user_id} {self.jti or 'all'} - revoked {self.revoked_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,182 @@
+"""
+OCR preprocessing pipeline: normalise images before Tesseract and cache the results
+"""
+import hashlib
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .lazy import lazy_import
+
+Image = lazy_import('PIL.Image')
+ImageOps = lazy_import('PIL.ImageOps')
+pytesseract = lazy_import('pytesseract')
+
+HASH_BLOCK_SIZE = 64 * 1024
+DESKEW_PREVIEW_SIDE = 800
+
+
+class OCRPipeline:
+    """
+    Prepares an image for Tesseract and runs OCR on it.
+
+    Stages, in order: EXIF orientation, grayscale conversion, DPI
+    normalisation with a cap on the longest side, optional deskew and
+    optional Otsu binarisation. Results are cached by a hash of the image
+    bytes plus the pipeline configuration, so re-uploading the same image
+    does not run Tesseract again. The cache (``OCR_CACHE_ALIAS``) must be
+    shared between processes: the sandbox looks results up before it starts
+    a worker, and each worker is a fresh process.
+    """
+
+    def __init__(self, target_dpi: Optional[int] = None, max_side: Optional[int] = None,
+                 deskew: Optional[bool] = None, binarize: Optional[bool] = None,
+                 psm: Optional[int] = None, oem: Optional[int] = None, lang: Optional[str] = None,
+                 use_cache: bool = True):
+        self.target_dpi = target_dpi or getattr(settings, 'OCR_TARGET_DPI', 300)
+        self.max_side = max_side or getattr(settings, 'OCR_MAX_SIDE', 2500)
+        self.deskew = getattr(settings, 'OCR_DESKEW', True) if deskew is None else deskew
+        self.binarize = getattr(settings, 'OCR_BINARIZE', False) if binarize is None else binarize
+        self.psm = psm or getattr(settings, 'OCR_PSM', 3)
+        self.oem = getattr(settings, 'OCR_OEM', 3) if oem is None else oem
+        self.lang = lang or getattr(settings, 'OCR_LANG', 'eng')
+        self.use_cache = use_cache
+        self.cache_timeout = getattr(settings, 'OCR_CACHE_TIMEOUT', 7 * 24 * 3600)
+        self.cache_alias = getattr(settings, 'OCR_CACHE_ALIAS', 'default')
+
+    @staticmethod
+    def is_available() -> bool:
+        """Check if PIL and pytesseract are installed"""
+        return bool(Image and pytesseract)
+
+    def get_tesseract_config(self) -> str:
+        """Build the Tesseract command-line config for this pipeline"""
+        return f"--psm {self.psm} --oem {self.oem}"
+
+    def get_signature(self) -> str:
+        """Describe the settings that affect OCR output, for use in cache keys"""
+        return (f"dpi={self.target_dpi};side={self.max_side};deskew={int(self.deskew)};"
+                f"bin={int(self.binarize)};psm={self.psm};oem={self.oem};lang={self.lang}")
+
+    def get_cache_key(self, image_file) -> str:
+        """Hash the image bytes together with the pipeline signature"""
+        digest = hashlib.sha256(self.get_signature().encode('utf-8'))
+        image_file.seek(0)
+        while True:
+            block = image_file.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+        image_file.seek(0)
+        return f"ocr:{digest.hexdigest()}"
+
+    def _normalise_size(self, image):
+        """Scale towards the target DPI and cap the longest side"""
+        scale = 1.0
+        dpi = image.info.get('dpi')
+        if dpi and dpi[0] and dpi[0] > self.target_dpi:
+            scale = self.target_dpi / float(dpi[0])
+
+        longest = max(image.size) * scale
+        if longest > self.max_side:
+            scale *= self.max_side / longest
+
+        if scale < 1.0:
+            new_size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+            image = image.resize(new_size, Image.LANCZOS)
+        return image
+
+    @staticmethod
+    def _row_profile_score(image) -> float:
+        """Variance of row darkness; highest when text lines are horizontal"""
+        column = image.resize((1, image.height), Image.BOX)
+        values = list(column.getdata())
+        mean = sum(values) / len(values)
+        return sum((value - mean) ** 2 for value in values) / len(values)
+
+    def _deskew(self, image):
+        """Estimate skew on a small preview with a projection profile and rotate to correct it"""
+        preview = image.copy()
+        preview.thumbnail((DESKEW_PREVIEW_SIDE, DESKEW_PREVIEW_SIDE))
+        preview = ImageOps.invert(preview)
+
+        best_angle, best_score = 0.0, self._row_profile_score(preview)
+        for step in range(-10, 11):
+            angle = step * 0.5
+            if angle == 0:
+                continue
+            score = self._row_profile_score(preview.rotate(angle, resample=Image.BILINEAR, expand=False))
+            if score > best_score:
+                best_angle, best_score = angle, score
+
+        if best_angle:
+            image = image.rotate(best_angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+        return image
+
+    @staticmethod
+    def _otsu_threshold(image) -> int:
+        """Compute an Otsu threshold from the grayscale histogram"""
+        histogram = image.histogram()[:256]
+        total = sum(histogram)
+        weighted_total = sum(level * count for level, count in enumerate(histogram))
+
+        background_weight = 0
+        background_sum = 0
+        best_threshold, best_variance = 127, 0.0
+        for level, count in enumerate(histogram):
+            background_weight += count
+            if background_weight == 0:
+                continue
+            foreground_weight = total - background_weight
+            if foreground_weight == 0:
+                break
+            background_sum += level * count
+            background_mean = background_sum / background_weight
+            foreground_mean = (weighted_total - background_sum) / foreground_weight
+            variance = background_weight * foreground_weight * (background_mean - foreground_mean) ** 2
+            if variance > best_variance:
+                best_threshold, best_variance = level, variance
+        return best_threshold
+
+    def preprocess(self, image):
+        """Run the preprocessing stages and return a grayscale (or binary) image"""
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'L':
+            image = image.convert('L')
+        image = self._normalise_size(image)
+        if self.deskew:
+            image = self._deskew(image)
+        if self.binarize:
+            threshold = self._otsu_threshold(image)
+            image = image.point(lambda value: 255 if value > threshold else 0)
+        return image
+
+    def run_ocr(self, image) -> str:
+        """Run Tesseract on an already preprocessed image"""
+        text = pytesseract.image_to_string(image, lang=self.lang, config=self.get_tesseract_config())
+        return text.strip()
+
+    def get_cached_text(self, image_file) -> Tuple[Optional[str], Optional[str]]:
+        """The cache key of an image file and its cached text (None if not cached or caching is off)"""
+        if not self.use_cache:
+            return None, None
+        cache_key = self.get_cache_key(image_file)
+        return cache_key, caches[self.cache_alias].get(cache_key)
+
+    def cache_text(self, cache_key: str, text: str) -> None:
+        caches[self.cache_alias].set(cache_key, text, self.cache_timeout)
+
+    def extract_text(self, image_file) -> str:
+        """Preprocess an image file, OCR it and cache the result by image hash"""
+        cache_key, cached = self.get_cached_text(image_file)
+        if cached is not None:
+            return cached
+
+        image_file.seek(0)
+        with Image.open(image_file) as image:
+            text = self.run_ocr(self.preprocess(image))
+
+        if cache_key:
+            self.cache_text(cache_key, text)
+        return text
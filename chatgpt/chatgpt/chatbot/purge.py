@@ -0,0 +1,228 @@
+"""
+Soft deletion and the background purger: deleted rows are hidden at once, then removed in batches with their files
+"""
+import os
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Iterable, Iterator, List
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    ChangeLog, Conversation, Document, DocumentPage, DocumentSummary, DocumentVersion, TokenUsage, UserDeletion,
+    UserMemory,
+)
+from .api_tokens import ACCESS_TTL, REFRESH_TTL, revoke_user_tokens
+from .chunked_upload import discard_user_uploads
+from .search_index import remove_conversation, remove_document
+from .sync import record_bulk_changes
+from .write_behind import BackgroundFlusher
+
+BATCH_SIZE = getattr(settings, 'PURGE_BATCH_SIZE', 500)
+INTERVAL = getattr(settings, 'PURGE_INTERVAL', 5.0)
+ORPHAN_GRACE = timedelta(seconds=getattr(settings, 'ORPHAN_FILE_GRACE_SECONDS', 3600))
+STORAGE_DIRECTORIES = ('documents',)
+# A deleted user is kept until every token issued to them has expired
+USER_GRACE = timedelta(seconds=max(ACCESS_TTL, REFRESH_TTL))
+
+KINDS = {Conversation: 'conversation', Document: 'document'}
+UNINDEX = {Conversation: remove_conversation, Document: remove_document}
+
+
+class Purger:
+    """
+    Removes soft-deleted rows in the background, one batch per kind every
+    ``INTERVAL`` seconds until none are left.
+
+    It only runs after a deletion in this process asks for it;
+    ``manage.py purge_deleted`` drains whatever is left from cron.
+    """
+
+    def __init__(self, interval: float = INTERVAL, batch_size: int = BATCH_SIZE):
+        self.batch_size = batch_size
+        self._requested = threading.Event()
+        self._flusher = BackgroundFlusher(self.run, interval, 'purger', flush_at_exit=False)
+
+    def request(self) -> None:
+        self._requested.set()
+        self._flusher.ensure_started()
+        self._flusher.wake()
+
+    def run(self) -> int:
+        if not self._requested.is_set():
+            return 0
+        self._requested.clear()
+        try:
+            purged = sum(purge_once(self.batch_size).values())
+        except Exception:
+            self._requested.set()
+            raise
+        if purged:
+            # There may be more; carry on at the next tick
+            self._requested.set()
+        return purged
+
+
+purger = Purger()
+
+
+def soft_delete(queryset, unindex: bool = True) -> int:
+    """
+    Mark the conversations or documents in queryset deleted and hide them.
+
+    Their sync feed entries are written (and, with ``unindex``, their search
+    entries removed) now; rows, files and cascades go in the background.
+
+    Returns:
+        Number of rows deleted
+    """
+    model = queryset.model
+    rows = list(queryset.filter(deleted_at__isnull=True).values_list('id', 'user_id'))
+    if not rows:
+        return 0
+    ids = [row_id for row_id, _ in rows]
+    with transaction.atomic():
+        deleted = model.all_objects.filter(id__in=ids, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        by_user = defaultdict(list)
+        for row_id, user_id in rows:
+            by_user[user_id].append(row_id)
+        for user_id, object_ids in by_user.items():
+            record_bulk_changes(user_id, KINDS[model], object_ids, 'delete')
+        if unindex:
+            for row_id in ids:
+                UNINDEX[model](row_id)
+        transaction.on_commit(purger.request)
+    return deleted
+
+
+def soft_delete_user(user: User) -> None:
+    """
+    Delete an account: it can no longer log in and its data disappears at
+    once, with a couple of UPDATEs however much data there is. The purger
+    removes the rows, and the user once its API tokens have expired.
+    """
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        UserDeletion.objects.get_or_create(user=user)
+        # Its API tokens would otherwise keep working until they expire
+        revoke_user_tokens(user.id)
+        now = timezone.now()
+        # Search entries are left to the purge: only their owner could match them
+        Conversation.objects.filter(user=user).update(deleted_at=now)
+        Document.objects.filter(user=user).update(deleted_at=now)
+        transaction.on_commit(purger.request)
+
+
+def _delete_files(names: Iterable[str]) -> None:
+    for name in names:
+        try:
+            # Storage backends ignore names that are already gone
+            default_storage.delete(name)
+        except Exception:
+            # Left for the orphan sweep
+            pass
+
+
+def purge_documents(batch_size: int = BATCH_SIZE) -> int:
+    """Remove a batch of soft-deleted documents, their versions and their files"""
+    rows = list(
+        Document.all_objects.filter(deleted_at__isnull=False).order_by('id').values_list('id', 'file')[:batch_size]
+    )
+    if not rows:
+        return 0
+    ids = [document_id for document_id, _ in rows]
+    names = {name for _, name in rows if name}
+    names.update(DocumentVersion.objects.filter(document_id__in=ids).exclude(file='').values_list('file', flat=True))
+    with transaction.atomic():
+        # Children first, as single DELETEs instead of loading them for the cascade
+        DocumentPage.objects.filter(version__document_id__in=ids).delete()
+        DocumentVersion.objects.filter(document_id__in=ids).delete()
+        DocumentSummary.objects.filter(document_id__in=ids).delete()
+        Document.all_objects.filter(id__in=ids).only('id', 'user_id', 'deleted_at').delete()
+        transaction.on_commit(lambda: _delete_files(names))
+    return len(ids)
+
+
+def purge_conversations(batch_size: int = BATCH_SIZE) -> int:
+    """Remove a batch of soft-deleted conversations"""
+    deleted = Conversation.all_objects.filter(deleted_at__isnull=False).order_by('id')
+    ids = list(deleted.values_list('id', flat=True)[:batch_size])
+    if ids:
+        with transaction.atomic():
+            Conversation.all_objects.filter(id__in=ids).only('id', 'user_id', 'deleted_at').delete()
+    return len(ids)
+
+
+def purge_users(batch_size: int = BATCH_SIZE) -> int:
+    """
+    Remove deleted users whose conversations and documents have all been
+    purged and whose API tokens have all expired, with their unfinished uploads
+    """
+    purged = 0
+    due = UserDeletion.objects.filter(requested_at__lte=timezone.now() - USER_GRACE)
+    for user_id in due.values_list('user_id', flat=True)[:batch_size]:
+        if (Conversation.all_objects.filter(user_id=user_id).exists()
+                or Document.all_objects.filter(user_id=user_id).exists()):
+            continue
+        discard_user_uploads(user_id)
+        with transaction.atomic():
+            for model in (ChangeLog, TokenUsage, UserMemory):
+                model.objects.filter(user_id=user_id).delete()
+            User.objects.filter(id=user_id).delete()
+        purged += 1
+    return purged
+
+
+def purge_once(batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    """One batch of each kind; returns how many of each were removed"""
+    return {
+        'documents': purge_documents(batch_size),
+        'conversations': purge_conversations(batch_size),
+        'users': purge_users(batch_size),
+    }
+
+
+def _walk(directory: str) -> Iterator[str]:
+    try:
+        directories, files = default_storage.listdir(directory)
+    except (FileNotFoundError, NotImplementedError):
+        return
+    for name in files:
+        yield os.path.join(directory, name).replace(os.sep, '/')
+    for name in directories:
+        yield from _walk(os.path.join(directory, name))
+
+
+def sweep_orphan_files(grace: timedelta = ORPHAN_GRACE, dry_run: bool = False) -> List[str]:
+    """
+    Delete stored files no document or document version refers to.
+
+    Files younger than ``grace`` are kept: uploads store their file just
+    before the row that refers to it is committed.
+
+    Returns:
+        Names of the files deleted (or, with dry_run, that would be)
+    """
+    referenced = set(Document.all_objects.exclude(file='').values_list('file', flat=True).iterator())
+    referenced.update(DocumentVersion.objects.exclude(file='').values_list('file', flat=True).iterator())
+    cutoff = timezone.now() - grace
+    orphans = []
+    for directory in STORAGE_DIRECTORIES:
+        for name in _walk(directory):
+            if name in referenced:
+                continue
+            try:
+                if default_storage.get_modified_time(name) > cutoff:
+                    continue
+            except (NotImplementedError, OSError):
+                continue
+            orphans.append(name)
+    if not dry_run:
+        _delete_files(orphans)
+    return orphans
@@ -0,0 +1,165 @@
+"""
+Bulk reprocessing of stored documents (re-extraction, re-indexing) in checkpointed keyset batches
+"""
+from collections import defaultdict
+from concurrent.futures import Executor
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Document, ReprocessCheckpoint
+from .sandbox import ExtractionResult, extract_document
+from .search_index import index_document
+from .sync import record_bulk_changes
+
+EXTRACT = 'extract'
+INDEX = 'index'
+MODES = (EXTRACT, INDEX)
+
+WORKERS = getattr(settings, 'REPROCESS_WORKERS', 4)
+BATCH_SIZE = getattr(settings, 'REPROCESS_BATCH_SIZE', 100)
+UPDATE_BATCH_SIZE = 500
+
+EXTRACTED_FIELDS = ['file_type', 'extracted_text', 'text_preview', 'extraction_status', 'extraction_error',
+                    'summary_status', 'updated_at']
+
+
+def document_queryset(options: dict):
+    """Documents a run with these filters covers, in keyset (id) order"""
+    documents = Document.objects.order_by('id').only(
+        'id', 'user_id', 'title', 'file', 'file_type', 'extracted_text', 'extraction_status', 'summary_status'
+    )
+    if options.get('user'):
+        documents = documents.filter(user__username=options['user'])
+    if options.get('file_types'):
+        documents = documents.filter(file_type__in=options['file_types'])
+    if options.get('statuses'):
+        documents = documents.filter(extraction_status__in=options['statuses'])
+    return documents
+
+
+def get_checkpoint(name: str, mode: str, options: dict, restart: bool = False) -> Tuple[ReprocessCheckpoint, bool]:
+    """
+    The checkpoint to run under, and whether it resumes earlier progress.
+
+    A finished run, or ``restart``, starts again from the first document.
+    Resuming with different filters would skip documents, so it raises
+    ValueError instead.
+    """
+    checkpoint, created = ReprocessCheckpoint.objects.get_or_create(
+        name=name, defaults={'mode': mode, 'options': options}
+    )
+    if created:
+        return checkpoint, False
+    if restart or checkpoint.completed_at is not None:
+        checkpoint.mode = mode
+        checkpoint.options = options
+        checkpoint.last_id = 0
+        checkpoint.processed = 0
+        checkpoint.failed = 0
+        checkpoint.started_at = timezone.now()
+        checkpoint.completed_at = None
+        checkpoint.save()
+        return checkpoint, False
+    if checkpoint.mode != mode or checkpoint.options != options:
+        raise ValueError(
+            f'Run "{name}" was started as {checkpoint.mode} with {checkpoint.options}; '
+            f'resume it with the same options or pass --restart'
+        )
+    return checkpoint, checkpoint.last_id > 0
+
+
+def _extract_one(document: Document) -> Optional[ExtractionResult]:
+    """Extract the stored file of a document again; None if the file is gone"""
+    if not document.file:
+        # Imported documents have text but no file
+        return None
+    try:
+        path = document.file.path
+    except NotImplementedError:
+        # Remote storage: extract_document spools the file locally
+        path = None
+    try:
+        document.file.open('rb')
+    except (FileNotFoundError, OSError):
+        return None
+    try:
+        return extract_document(File(document.file.file, name=document.file.name), path)
+    finally:
+        document.file.close()
+
+
+def _reextract(documents: List[Document], executor: Executor) -> Tuple[List[Document], int]:
+    """Documents whose extraction changed, and how many files failed to extract"""
+    changed = []
+    failed = 0
+    # Sandboxed parsers run in their own processes, so the pool's threads mostly wait on them
+    for document, result in zip(documents, executor.map(_extract_one, documents)):
+        if result is None or result.status == 'unsupported':
+            failed += 1
+            continue
+        if not result.ok:
+            failed += 1
+            if document.extraction_status == 'ok':
+                # Keep the text a previous extractor produced rather than replace it with a failure
+                continue
+        if (result.status, result.text, result.file_type) == (
+                document.extraction_status, document.extracted_text, document.file_type):
+            continue
+        if result.text != document.extracted_text:
+            # Summaries of the old text are stale; summarize_documents rebuilds pending ones
+            document.summary_status = 'pending'
+        document.file_type = result.file_type
+        document.extracted_text = result.text
+        document.text_preview = Document.preview_of(result.text)
+        document.extraction_status = result.status
+        document.extraction_error = result.error
+        changed.append(document)
+    return changed, failed
+
+
+def process_batch(checkpoint: ReprocessCheckpoint, documents: List[Document],
+                  executor: Optional[Executor] = None) -> Tuple[int, int]:
+    """
+    Reprocess one batch and advance the checkpoint past it.
+
+    The batch's writes and the checkpoint update commit together, so an
+    interrupted run resumes exactly after the last committed batch.
+
+    Returns:
+        Tuple of (documents changed, documents that failed)
+    """
+    failed = 0
+    if checkpoint.mode == EXTRACT:
+        changed, failed = _reextract(documents, executor)
+    else:
+        changed = documents
+
+    with transaction.atomic():
+        if checkpoint.mode == EXTRACT and changed:
+            # bulk_update skips auto_now and the save signals, so updated_at, the index and the sync feed are set here
+            now = timezone.now()
+            for document in changed:
+                document.updated_at = now
+            Document.objects.bulk_update(changed, EXTRACTED_FIELDS, batch_size=UPDATE_BATCH_SIZE)
+            by_user = defaultdict(list)
+            for document in changed:
+                by_user[document.user_id].append(document.id)
+            for user_id, document_ids in by_user.items():
+                record_bulk_changes(user_id, 'document', document_ids)
+        for document in changed:
+            index_document(document)
+
+        checkpoint.last_id = documents[-1].id
+        checkpoint.processed += len(documents)
+        checkpoint.failed += failed
+        checkpoint.save(update_fields=['last_id', 'processed', 'failed', 'updated_at'])
+    return len(changed), failed
+
+
+def finish(checkpoint: ReprocessCheckpoint) -> None:
+    checkpoint.completed_at = timezone.now()
+    checkpoint.save(update_fields=['completed_at', 'updated_at'])
@@ -0,0 +1,267 @@
+"""
+Sandboxed text extraction: document parsers run in subprocesses with time, memory and output limits
+"""
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from typing import Collection, Optional
+
+from django.conf import settings
+from django.core.files import File
+
+from .document_processor import DocumentProcessor, ExtractionError, ExtractorUnavailable
+
+SANDBOX_ENABLED = getattr(settings, 'EXTRACTION_SANDBOX', True)
+TIMEOUT = getattr(settings, 'EXTRACTION_TIMEOUT', 60)
+MEMORY_LIMIT_MB = getattr(settings, 'EXTRACTION_MEMORY_LIMIT_MB', 1024)
+MAX_OUTPUT_CHARS = getattr(settings, 'EXTRACTION_MAX_OUTPUT_CHARS', 5 * 1024 * 1024)
+COPY_CHUNK_SIZE = 64 * 1024
+OUT_OF_MEMORY_ERROR = f'Ran out of memory while extracting (limit {MEMORY_LIMIT_MB}MB)'
+
+# Signals that mean the worker hit a limit rather than crashed on its input
+CPU_LIMIT_SIGNALS = {getattr(signal, 'SIGXCPU', None)} - {None}
+KILL_SIGNALS = {getattr(signal, 'SIGKILL', None)} - {None}
+
+
+class ExtractionResult:
+    """
+    Outcome of extracting one file.
+
+    ``status`` is ``ok`` or a failure class: ``timeout``, ``oom``,
+    ``corrupt``, ``error`` (the sandbox itself failed) or ``unsupported``.
+    ``pages`` is only set for paged extraction: one ``{'hash', 'text'}``
+    dict per page, without ``text`` for pages whose hash was already known
+    (``text`` then only joins the pages that were extracted).
+    """
+
+    def __init__(self, status: str, file_type: str, text: str = '', error: str = '', truncated: bool = False,
+                 pages: Optional[list] = None):
+        self.status = status
+        self.file_type = file_type
+        self.text = text
+        self.error = error
+        self.truncated = truncated
+        self.pages = pages
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 'ok'
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ExtractionResult':
+        return cls(
+            status=data['status'],
+            file_type=data['file_type'],
+            text=data.get('text', ''),
+            error=data.get('error', ''),
+            truncated=data.get('truncated', False),
+            pages=data.get('pages'),
+        )
+
+
+def file_hash(uploaded_file) -> str:
+    """SHA-256 of a whole file, the single "page" of formats without paged extraction"""
+    digest = hashlib.sha256()
+    uploaded_file.seek(0)
+    while True:
+        chunk = uploaded_file.read(COPY_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def _extract_pages(extractor, uploaded_file, known_pages: Collection[str]) -> list:
+    paged = extractor.options.get('pages')
+    if paged is not None:
+        return paged(uploaded_file, known_pages)
+    page_hash = file_hash(uploaded_file)
+    if page_hash in known_pages:
+        # Same file as before: nothing to extract
+        return [{'hash': page_hash}]
+    return [{'hash': page_hash, 'text': extractor.load()(uploaded_file)}]
+
+
+def _truncate_pages(pages: list, max_chars: int) -> bool:
+    """Cut the extracted page texts down to max_chars in total; returns whether anything was cut"""
+    remaining = max_chars
+    truncated = False
+    for page in pages:
+        if 'text' not in page:
+            continue
+        if len(page['text']) > remaining:
+            page['text'] = page['text'][:remaining]
+            truncated = True
+        remaining -= len(page['text'])
+    return truncated
+
+
+def run_extractor(uploaded_file, max_chars: int = MAX_OUTPUT_CHARS,
+                  known_pages: Optional[Collection[str]] = None) -> dict:
+    """
+    Extract one file in the current process and classify any failure.
+
+    This is what the worker subprocess runs; it is also used directly for
+    extractors that are cheap and safe enough to run in the web worker.
+    With ``known_pages`` (a collection of page hashes) the result is paged,
+    and pages with a known hash are hashed but not extracted.
+    """
+    extension = os.path.splitext(uploaded_file.name.lower())[1]
+    extractor = DocumentProcessor.get_extractor(extension)
+    if extractor is None:
+        return {'status': 'unsupported', 'file_type': 'unsupported', 'error': f'Unsupported file type: {extension}'}
+
+    try:
+        if known_pages is not None:
+            pages = _extract_pages(extractor, uploaded_file, set(known_pages))
+            truncated = _truncate_pages(pages, max_chars)
+            text = '\n'.join(page['text'] for page in pages if 'text' in page).strip()
+            return {'status': 'ok', 'file_type': extractor.name, 'text': text, 'truncated': truncated, 'pages': pages}
+        text = extractor.load()(uploaded_file)
+    except MemoryError:
+        return {'status': 'oom', 'file_type': extractor.name, 'error': OUT_OF_MEMORY_ERROR}
+    except ExtractorUnavailable as e:
+        # Not the file's fault: retry with ``reprocess_documents extract --status error`` once installed
+        return {'status': 'error', 'file_type': extractor.name, 'error': str(e)}
+    except ExtractionError as e:
+        if isinstance(e.__cause__, MemoryError):
+            return {'status': 'oom', 'file_type': extractor.name, 'error': OUT_OF_MEMORY_ERROR}
+        return {'status': 'corrupt', 'file_type': extractor.name, 'error': str(e)}
+    except Exception as e:
+        return {'status': 'corrupt', 'file_type': extractor.name, 'error': str(e)}
+
+    truncated = len(text) > max_chars
+    if truncated:
+        text = text[:max_chars] + f'\n[Output truncated at {max_chars} characters]'
+    return {'status': 'ok', 'file_type': extractor.name, 'text': text, 'truncated': truncated}
+
+
+@contextmanager
+def _local_path(uploaded_file, path: Optional[str]):
+    """Yield a filesystem path for the upload, spooling in-memory uploads to a temporary file"""
+    if path:
+        yield path
+        return
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        yield uploaded_file.temporary_file_path()
+        return
+
+    suffix = os.path.splitext(uploaded_file.name)[1]
+    handle, temp_path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(handle, 'wb') as temp_file:
+            uploaded_file.seek(0)
+            while True:
+                chunk = uploaded_file.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                temp_file.write(chunk)
+        yield temp_path
+    finally:
+        os.remove(temp_path)
+
+
+def _kill(process: subprocess.Popen) -> None:
+    """Kill the worker together with anything it started (e.g. the tesseract binary)"""
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def run_in_subprocess(path: str, file_name: str, file_type: str, timeout: float = TIMEOUT,
+                      known_pages: Optional[Collection[str]] = None) -> ExtractionResult:
+    """
+    Extract a file in a fresh worker process.
+
+    The worker sets its own RLIMIT_AS/RLIMIT_CPU before touching the file,
+    and caps the text it writes back; the wall-clock timeout is enforced
+    here, killing the worker's whole process group. Known page hashes are
+    passed to the worker on stdin.
+    """
+    command = [
+        sys.executable, '-m', 'chatbot.extraction_worker',
+        path, file_name, str(MEMORY_LIMIT_MB), str(int(timeout) + 1), str(MAX_OUTPUT_CHARS),
+    ]
+    stdin = None
+    if known_pages is not None:
+        command.append('--pages')
+        stdin = json.dumps(list(known_pages)).encode('utf-8')
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'chatgpt_project.settings')
+
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL if stdin is None else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        cwd=settings.BASE_DIR,
+        env=env,
+        start_new_session=hasattr(os, 'killpg'),
+    )
+    try:
+        stdout, _ = process.communicate(input=stdin, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill(process)
+        process.communicate()
+        return ExtractionResult('timeout', file_type, error=f'Extraction took longer than {timeout}s')
+
+    if process.returncode < 0:
+        signal_number = -process.returncode
+        if signal_number in CPU_LIMIT_SIGNALS:
+            return ExtractionResult('timeout', file_type, error='Extraction exceeded its CPU time limit')
+        if signal_number in KILL_SIGNALS:
+            return ExtractionResult('oom', file_type, error='Extraction was killed, most likely for using too much memory')
+        # A native parser crashed on the input
+        return ExtractionResult('corrupt', file_type, error=f'Extractor crashed (signal {signal_number})')
+
+    try:
+        return ExtractionResult.from_dict(json.loads(stdout.decode('utf-8')))
+    except (ValueError, KeyError):
+        return ExtractionResult('error', file_type, error=f'Extraction worker failed (exit code {process.returncode})')
+
+
+def extract_document(uploaded_file: File, path: Optional[str] = None,
+                     known_pages: Optional[Collection[str]] = None) -> ExtractionResult:
+    """
+    Extract text from an upload, isolating risky parsers from the web worker.
+
+    Args:
+        uploaded_file: The upload (or any named Django File)
+        path: Where the file already is on disk, if it is, to avoid a copy
+        known_pages: Page hashes whose text is already stored; when given
+            the result is paged and those pages are not extracted again
+    """
+    extension = os.path.splitext(uploaded_file.name.lower())[1]
+    extractor = DocumentProcessor.get_extractor(extension)
+    if extractor is None or not extractor.is_available():
+        return ExtractionResult('unsupported', 'unsupported', error=f'Unsupported file type: {extension}')
+
+    if not SANDBOX_ENABLED or not extractor.options.get('sandbox'):
+        return ExtractionResult.from_dict(run_extractor(uploaded_file, known_pages=known_pages))
+
+    # Looked up here rather than in the worker, so a cached file costs no subprocess
+    result_cache = extractor.options.get('result_cache')
+    cache, cache_key = None, None
+    if result_cache is not None and known_pages is None:
+        cache = result_cache()
+        cache_key, cached = cache.get_cached_text(uploaded_file)
+        if cached is not None:
+            return ExtractionResult('ok', extractor.name, text=cached)
+
+    with _local_path(uploaded_file, path) as local_path:
+        result = run_in_subprocess(
+            local_path, os.path.basename(uploaded_file.name), extractor.name, known_pages=known_pages
+        )
+    if cache_key and result.ok and not result.truncated:
+        cache.cache_text(cache_key, result.text)
+    return result
@@ -0,0 +1,320 @@
+"""
+Full-text search over conversation turns, documents, spreadsheet sheets and user memories, backed by SQLite FTS5 tables
+"""
+import html
+import re
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.db import connection
+
+from .spreadsheet_extractor import SPREADSHEET_FILE_TYPES, iter_sheet_chunks
+
+FTS_TABLE = 'chatbot_message_fts'
+DOCUMENT_FTS_TABLE = 'chatbot_document_fts'
+SHEET_FTS_TABLE = 'chatbot_document_sheet_fts'
+MEMORY_FTS_TABLE = 'chatbot_memory_fts'
+
+# Only the start of very large documents is indexed, to bound the index size
+DOCUMENT_INDEX_MAX_CHARS = getattr(settings, 'DOCUMENT_INDEX_MAX_CHARS', 200000)
+
+# Each turn gets a deterministic rowid so it can be replaced in place and a
+# whole conversation can be removed with a rowid range delete. Spreadsheet
+# chunks are numbered the same way within their document.
+TURN_BITS = 20
+MAX_TURNS = 1 << TURN_BITS
+
+SNIPPET_TOKENS = 16
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+# FTS5 marks matches with these; they become the tags above once the snippet text is escaped
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+MAX_RECALL_TERMS = 32
+
+
+def is_supported() -> bool:
+    """FTS5 is only available on SQLite"""
+    return connection.vendor == 'sqlite'
+
+
+def _rowid(conversation_id: int, turn_index: int) -> int:
+    return (conversation_id << TURN_BITS) + turn_index
+
+
+def _owner_token(user_id: int) -> str:
+    return f'u{user_id}'
+
+
+def index_turn(conversation, turn_index: int, message: Optional[dict] = None) -> None:
+    """Insert or replace the index entry for one turn of a conversation"""
+    if not is_supported() or turn_index >= MAX_TURNS:
+        return
+    if message is None:
+        message = conversation.full_conversation[turn_index]
+
+    rowid = _rowid(conversation.id, turn_index)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, owner, user_message, bot_response, conversation_id, turn_index, timestamp) '
+            f'VALUES (%s, %s, %s, %s, %s, %s, %s)',
+            [
+                rowid,
+                _owner_token(conversation.user_id),
+                message.get('user_message') or '',
+                message.get('bot_response') or '',
+                conversation.id,
+                turn_index,
+                message.get('timestamp') or '',
+            ]
+        )
+
+
+def index_conversation(conversation, messages: Optional[list] = None) -> int:
+    """Reindex every turn of a conversation and return the number of turns indexed"""
+    if not is_supported():
+        return 0
+    remove_conversation(conversation.id)
+    messages = conversation.full_conversation if messages is None else messages
+    for turn_index, message in enumerate((messages or [])[:MAX_TURNS]):
+        index_turn(conversation, turn_index, message)
+    return len(messages or [])
+
+
+def remove_conversation(conversation_id: int) -> None:
+    """Drop all index entries of a conversation"""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid BETWEEN %s AND %s',
+            [_rowid(conversation_id, 0), _rowid(conversation_id, MAX_TURNS - 1)]
+        )
+
+
+def index_document(document, text: Optional[str] = None) -> None:
+    """
+    Insert or replace the index entries of a document.
+
+    The whole text gets one entry (its rowid is the document id); the sheets
+    of a spreadsheet are also indexed in chunks, so a search can point at the
+    sheet that matched.
+    """
+    if not is_supported():
+        return
+    text = document.extracted_text if text is None else text
+    body = (text or '')[:DOCUMENT_INDEX_MAX_CHARS]
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {DOCUMENT_FTS_TABLE} WHERE rowid = %s', [document.id])
+        cursor.execute(
+            f'INSERT INTO {DOCUMENT_FTS_TABLE} (rowid, owner, title, body) VALUES (%s, %s, %s, %s)',
+            [document.id, _owner_token(document.user_id), document.title, body]
+        )
+        _remove_sheets(cursor, document.id)
+        if document.file_type in SPREADSHEET_FILE_TYPES:
+            chunks = iter_sheet_chunks(body)
+            cursor.executemany(
+                f'INSERT INTO {SHEET_FTS_TABLE} (rowid, owner, body, document_id, sheet, chunk_index) '
+                f'VALUES (%s, %s, %s, %s, %s, %s)',
+                [
+                    (_rowid(document.id, position), _owner_token(document.user_id), chunk, document.id, sheet, index)
+                    for position, (sheet, index, chunk) in zip(range(MAX_TURNS), chunks)
+                ]
+            )
+
+
+def _remove_sheets(cursor, document_id: int) -> None:
+    cursor.execute(
+        f'DELETE FROM {SHEET_FTS_TABLE} WHERE rowid BETWEEN %s AND %s',
+        [_rowid(document_id, 0), _rowid(document_id, MAX_TURNS - 1)]
+    )
+
+
+def remove_document(document_id: int) -> None:
+    """Drop the index entries of a document"""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {DOCUMENT_FTS_TABLE} WHERE rowid = %s', [document_id])
+        _remove_sheets(cursor, document_id)
+
+
+def index_memory(memory) -> None:
+    """Insert or replace the index entry of a user memory (its rowid is the memory id)"""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {MEMORY_FTS_TABLE} WHERE rowid = %s', [memory.id])
+        cursor.execute(
+            f'INSERT INTO {MEMORY_FTS_TABLE} (rowid, owner, text) VALUES (%s, %s, %s)',
+            [memory.id, _owner_token(memory.user_id), memory.text]
+        )
+
+
+def remove_memory(memory_id: int) -> None:
+    """Drop the index entry of a user memory"""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {MEMORY_FTS_TABLE} WHERE rowid = %s', [memory_id])
+
+
+def recall_memory_ids(user_id: int, query: str, limit: int) -> Optional[List[int]]:
+    """
+    Ids of the user's memories most relevant to the query, best first.
+
+    Unlike search, any word may match (OR), and bm25 ranks memories that
+    share more, and rarer, words with the query higher. Returns None when
+    FTS is not available.
+    """
+    terms = TERM_RE.findall(query or '')
+    if not is_supported():
+        return None
+    if not terms:
+        return []
+    quoted = [f'"{term}"' for term in dict.fromkeys(term.lower() for term in terms)][:MAX_RECALL_TERMS]
+    match = f'owner:{_owner_token(user_id)} AND text: ({" OR ".join(quoted)})'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {MEMORY_FTS_TABLE} WHERE {MEMORY_FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({MEMORY_FTS_TABLE}, 0.0, 1.0) LIMIT %s',
+            [match, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _quote_terms(query: str) -> Optional[str]:
+    """
+    Quote every word so user input cannot inject FTS5 syntax; the last
+    word is matched as a prefix so results appear while typing.
+    """
+    terms = TERM_RE.findall(query or '')
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*']
+    return ' '.join(quoted)
+
+
+def build_match_query(user_id: int, query: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 MATCH expression scoped to one user"""
+    terms = _quote_terms(query)
+    if not terms:
+        return None
+    return f'owner:{_owner_token(user_id)} AND {{user_message bot_response}}: ({terms})'
+
+
+def _match_ids(table: str, id_column: str, columns: Iterable[str], query: str, limit: int) -> Optional[List[int]]:
+    terms = _quote_terms(query)
+    if not is_supported() or not terms:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT DISTINCT {id_column} FROM {table} WHERE {table} MATCH %s LIMIT %s',
+            [f'{{{" ".join(columns)}}}: ({terms})', limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def match_conversation_ids(query: str, limit: int = 1000) -> Optional[List[int]]:
+    """Ids of conversations of any user with a turn matching the query, or None if FTS cannot be used"""
+    return _match_ids(FTS_TABLE, 'conversation_id', ('user_message', 'bot_response'), query, limit)
+
+
+def match_document_ids(query: str, limit: int = 1000) -> Optional[List[int]]:
+    """Ids of documents of any user whose title or text matches the query, or None if FTS cannot be used"""
+    return _match_ids(DOCUMENT_FTS_TABLE, 'rowid', ('title', 'body'), query, limit)
+
+
+def _highlight(snippet: str) -> str:
+    """An FTS5 snippet as HTML: the stored text escaped, the matches wrapped in <mark>"""
+    return html.escape(snippet or '').replace(SNIPPET_START, HIGHLIGHT_START).replace(SNIPPET_END, HIGHLIGHT_END)
+
+
+def search(user, query: str, page: int = 1, page_size: int = 20) -> dict:
+    """
+    Search a user's conversation turns, best matches first.
+
+    Snippets are HTML: the matched text is escaped, so only the <mark>
+    tags around the matches are markup.
+
+    Returns:
+        Dict with ``results`` (conversation_id, turn_index, timestamp,
+        matched_in, snippet, rank), ``total`` and paging fields
+    """
+    match = build_match_query(user.id, query)
+    if not match:
+        return {'results': [], 'total': 0, 'page': page, 'page_size': page_size}
+
+    offset = (page - 1) * page_size
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        total = cursor.fetchone()[0]
+
+        snippet_args = [SNIPPET_START, SNIPPET_END, '...', SNIPPET_TOKENS]
+        cursor.execute(
+            f'SELECT conversation_id, turn_index, timestamp, '
+            f'snippet({FTS_TABLE}, 1, %s, %s, %s, %s), '
+            f'snippet({FTS_TABLE}, 2, %s, %s, %s, %s), '
+            f'bm25({FTS_TABLE}, 0.0, 1.0, 0.75) AS rank '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY rank LIMIT %s OFFSET %s',
+            snippet_args + snippet_args + [match, page_size, offset]
+        )
+        rows = cursor.fetchall()
+
+    results = []
+    for conversation_id, turn_index, timestamp, user_snippet, bot_snippet, rank in rows:
+        # Show the side of the turn that actually matched, preferring the user's words
+        matched_in = 'user' if SNIPPET_START in user_snippet or SNIPPET_START not in bot_snippet else 'bot'
+        results.append({
+            'conversation_id': conversation_id,
+            'turn_index': turn_index,
+            'timestamp': timestamp,
+            'matched_in': matched_in,
+            'snippet': _highlight(user_snippet if matched_in == 'user' else bot_snippet),
+            'rank': round(-rank, 4),
+        })
+    return {'results': results, 'total': total, 'page': page, 'page_size': page_size}
+
+
+def search_sheets(user, query: str, page: int = 1, page_size: int = 20) -> dict:
+    """
+    Search the sheets of a user's spreadsheets, best matches first.
+
+    Returns:
+        Dict with ``results`` (document_id, sheet, chunk_index, snippet,
+        rank), ``total`` and paging fields; snippets are HTML as in ``search``
+    """
+    terms = _quote_terms(query)
+    if not terms:
+        return {'results': [], 'total': 0, 'page': page, 'page_size': page_size}
+    match = f'owner:{_owner_token(user.id)} AND body: ({terms})'
+
+    offset = (page - 1) * page_size
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM {SHEET_FTS_TABLE} WHERE {SHEET_FTS_TABLE} MATCH %s', [match])
+        total = cursor.fetchone()[0]
+
+        cursor.execute(
+            f'SELECT document_id, sheet, chunk_index, snippet({SHEET_FTS_TABLE}, 1, %s, %s, %s, %s), '
+            f'bm25({SHEET_FTS_TABLE}, 0.0, 1.0) AS rank '
+            f'FROM {SHEET_FTS_TABLE} WHERE {SHEET_FTS_TABLE} MATCH %s '
+            f'ORDER BY rank LIMIT %s OFFSET %s',
+            [SNIPPET_START, SNIPPET_END, '...', SNIPPET_TOKENS, match, page_size, offset]
+        )
+        rows = cursor.fetchall()
+
+    results = [
+        {
+            'document_id': document_id,
+            'sheet': sheet,
+            'chunk_index': chunk_index,
+            'snippet': _highlight(snippet),
+            'rank': round(-rank, 4),
+        }
+        for document_id, sheet, chunk_index, snippet, rank in rows
+    ]
+    return {'results': results, 'total': total, 'page': page, 'page_size': page_size}
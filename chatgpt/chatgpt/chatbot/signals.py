@@ -0,0 +1,84 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .api_tokens import revoke_user_tokens
+from .models import Conversation, Document, UserMemory
+from .search_index import index_document, index_memory, remove_conversation, remove_document, remove_memory
+from .summarizer import schedule_summaries
+from .sync import record_change
+
+
+@receiver(post_delete, sender=Conversation)
+def remove_conversation_from_search(sender, instance, **kwargs):
+    """Drop a deleted conversation's turns from the search index (also runs on cascades)"""
+    remove_conversation(instance.id)
+
+
+@receiver(post_save, sender=Conversation)
+def record_conversation_saved(sender, instance, **kwargs):
+    record_change(instance.user_id, 'conversation', instance.id, 'upsert')
+
+
+@receiver(post_delete, sender=Conversation)
+def record_conversation_deleted(sender, instance, **kwargs):
+    if instance.deleted_at is None:
+        # Soft-deleted rows got their tombstone from purge.soft_delete; this is the purger removing them
+        record_change(instance.user_id, 'conversation', instance.id, 'delete')
+
+
+@receiver(post_save, sender=Document)
+def record_document_saved(sender, instance, **kwargs):
+    record_change(instance.user_id, 'document', instance.id, 'upsert')
+
+
+@receiver(post_save, sender=Document)
+def index_new_document(sender, instance, created, **kwargs):
+    """Add a new document to the full-text index (its text does not change afterwards)"""
+    if created:
+        index_document(instance)
+
+
+@receiver(post_delete, sender=Document)
+def remove_document_from_search(sender, instance, **kwargs):
+    remove_document(instance.id)
+
+
+@receiver(post_save, sender=Document)
+def summarize_new_document(sender, instance, created, **kwargs):
+    """Build the map-reduce summaries of a new document in the background"""
+    if created and instance.summary_status == 'pending':
+        schedule_summaries([instance.id])
+
+
+@receiver(post_delete, sender=Document)
+def record_document_deleted(sender, instance, **kwargs):
+    if instance.deleted_at is None:
+        record_change(instance.user_id, 'document', instance.id, 'delete')
+
+
+@receiver(post_save, sender=UserMemory)
+def index_saved_memory(sender, instance, **kwargs):
+    index_memory(instance)
+
+
+@receiver(post_delete, sender=UserMemory)
+def remove_memory_from_search(sender, instance, **kwargs):
+    remove_memory(instance.id)
+
+
+@receiver(pre_save, sender=User)
+def note_password_change(sender, instance, update_fields=None, **kwargs):
+    """Remember whether this save changes the stored password hash"""
+    if instance.pk is None or (update_fields is not None and 'password' not in update_fields):
+        return
+    stored = User.objects.filter(pk=instance.pk).values_list('password', flat=True).first()
+    instance._password_changed = stored is not None and stored != instance.password
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_password_change(sender, instance, **kwargs):
+    """A changed password ends every API token issued before it, as it does for other sessions"""
+    if instance.__dict__.pop('_password_changed', False):
+        transaction.on_commit(lambda: revoke_user_tokens(instance.pk))
@@ -0,0 +1,253 @@
+"""
+Bounded-memory spreadsheet extraction for Excel workbooks and CSV/TSV files
+"""
+import csv
+import os
+from datetime import date, datetime, time
+from typing import Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from .lazy import lazy_import
+
+openpyxl = lazy_import('openpyxl')
+
+DELIMITED_EXTENSIONS = {'.csv': ',', '.tsv': '\t'}
+TEXT_ENCODINGS = ['utf-8-sig', 'cp1252', 'latin-1']
+# Document.file_type of the extractors whose text is rendered by extract_text
+SPREADSHEET_FILE_TYPES = ('excel', 'csv')
+SHEET_HEADER = 'Sheet: '
+
+
+class ColumnProfile:
+    """Running type summary for a single column"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counts = {}
+
+    def observe(self, value):
+        kind = SpreadsheetExtractor.classify_value(value)
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def describe(self) -> str:
+        non_empty = {kind: count for kind, count in self.counts.items() if kind != 'empty'}
+        if not non_empty:
+            return f"{self.name} (empty)"
+        kind = max(non_empty, key=non_empty.get)
+        if len(non_empty) > 1:
+            kind = f"mostly {kind}"
+        return f"{self.name} ({kind}, {sum(non_empty.values())} values)"
+
+
+class SpreadsheetExtractor:
+    """
+    Streams rows out of spreadsheets under fixed row, cell and size caps.
+
+    Workbooks are opened in openpyxl's read-only mode and CSV/TSV files are
+    decoded incrementally, so memory use depends on the caps rather than on
+    the size of the file.
+    """
+
+    def __init__(self, max_rows_per_sheet: Optional[int] = None, max_cells: Optional[int] = None,
+                 max_cell_chars: Optional[int] = None, max_chars: Optional[int] = None,
+                 chunk_rows: Optional[int] = None, include_schema: Optional[bool] = None,
+                 schema_sample_rows: int = 1000):
+        self.max_rows_per_sheet = max_rows_per_sheet or getattr(settings, 'SPREADSHEET_MAX_ROWS_PER_SHEET', 10000)
+        self.max_cells = max_cells or getattr(settings, 'SPREADSHEET_MAX_CELLS', 200000)
+        self.max_cell_chars = max_cell_chars or getattr(settings, 'SPREADSHEET_MAX_CELL_CHARS', 500)
+        self.max_chars = max_chars or getattr(settings, 'SPREADSHEET_MAX_CHARS', 5 * 1024 * 1024)
+        self.chunk_rows = chunk_rows or getattr(settings, 'SPREADSHEET_CHUNK_ROWS', 200)
+        if include_schema is None:
+            include_schema = getattr(settings, 'SPREADSHEET_SCHEMA_SUMMARY', True)
+        self.include_schema = include_schema
+        self.schema_sample_rows = schema_sample_rows
+
+    @staticmethod
+    def is_delimited(file_name: str) -> bool:
+        """Check if a file is CSV or TSV"""
+        return os.path.splitext(file_name.lower())[1] in DELIMITED_EXTENSIONS
+
+    @staticmethod
+    def classify_value(value) -> str:
+        """Classify a cell value as number, date, boolean, text or empty"""
+        if value is None or value == '':
+            return 'empty'
+        if isinstance(value, bool):
+            return 'boolean'
+        if isinstance(value, (int, float)):
+            return 'number'
+        if isinstance(value, (datetime, date, time)):
+            return 'date'
+        text = str(value).strip()
+        if text.lower() in ['true', 'false']:
+            return 'boolean'
+        try:
+            float(text.replace(',', ''))
+            return 'number'
+        except ValueError:
+            return 'text'
+
+    def _format_cell(self, value) -> str:
+        if value is None:
+            return ''
+        text = str(value).replace('\t', ' ').replace('\n', ' ')
+        if len(text) > self.max_cell_chars:
+            text = text[:self.max_cell_chars] + '...'
+        return text
+
+    def _iter_workbook(self, uploaded_file) -> Iterator[Tuple[str, Iterator[tuple]]]:
+        workbook = openpyxl.load_workbook(uploaded_file, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                yield sheet.title, sheet.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+    def _iter_delimited(self, uploaded_file) -> Iterator[Tuple[str, Iterator[tuple]]]:
+        extension = os.path.splitext(uploaded_file.name.lower())[1]
+        delimiter = DELIMITED_EXTENSIONS[extension]
+
+        # Pick the first encoding that can decode the head of the file; the
+        # rest is decoded lazily as rows are read.
+        uploaded_file.seek(0)
+        head = uploaded_file.read(64 * 1024)
+        encoding = 'latin-1'
+        for candidate in TEXT_ENCODINGS:
+            try:
+                head.decode(candidate)
+                encoding = candidate
+                break
+            except UnicodeDecodeError:
+                continue
+
+        uploaded_file.seek(0)
+        lines = (line.decode(encoding, errors='replace') for line in uploaded_file)
+        yield os.path.basename(uploaded_file.name), csv.reader(lines, delimiter=delimiter)
+
+    def iter_sheets(self, uploaded_file) -> Iterator[Tuple[str, Iterator[tuple]]]:
+        """Yield (sheet_name, row_iterator) pairs for a workbook or delimited file"""
+        if self.is_delimited(uploaded_file.name):
+            yield from self._iter_delimited(uploaded_file)
+            return
+        if not openpyxl:
+            raise RuntimeError("openpyxl library not installed. Cannot process Excel files.")
+        uploaded_file.seek(0)
+        yield from self._iter_workbook(uploaded_file)
+
+    def iter_chunks(self, uploaded_file) -> Iterator[dict]:
+        """
+        Yield per-sheet chunks of at most ``chunk_rows`` rows.
+
+        Each chunk is a dict with ``sheet``, ``kind`` ('rows', 'schema' or
+        'notice'), ``start_row``, ``end_row`` and ``text``. Extraction stops
+        at the configured row, cell and character caps. The chunks only
+        bound how many rows are buffered at once: ``extract_text`` joins them
+        back into the document text, and ``iter_sheet_chunks`` splits that
+        text again for the search index.
+        """
+        cells_seen = 0
+        chars_seen = 0
+        exhausted = False
+
+        for sheet_name, rows in self.iter_sheets(uploaded_file):
+            profiles: List[ColumnProfile] = []
+            buffer = []
+            start_row = None
+            end_row = 0
+            row_number = 0
+            stop_reason = None
+
+            for row in rows:
+                row_number += 1
+                if row_number > self.max_rows_per_sheet:
+                    stop_reason = f"truncated after {self.max_rows_per_sheet} rows"
+                    break
+                if cells_seen + len(row) > self.max_cells:
+                    stop_reason = f"truncated after {self.max_cells} cells"
+                    exhausted = True
+                    break
+                cells_seen += len(row)
+
+                if self.include_schema:
+                    if row_number == 1:
+                        profiles = [ColumnProfile(self._format_cell(value) or f"column {i + 1}")
+                                    for i, value in enumerate(row)]
+                    elif row_number <= self.schema_sample_rows + 1:
+                        for profile, value in zip(profiles, row):
+                            profile.observe(value)
+
+                row_text = "\t".join(self._format_cell(value) for value in row)
+                if not row_text.strip():
+                    continue
+                if chars_seen + len(row_text) > self.max_chars:
+                    stop_reason = f"truncated after {self.max_chars} characters"
+                    exhausted = True
+                    break
+                chars_seen += len(row_text) + 1
+
+                if start_row is None:
+                    start_row = row_number
+                end_row = row_number
+                buffer.append(row_text)
+                if len(buffer) >= self.chunk_rows:
+                    yield {'sheet': sheet_name, 'kind': 'rows', 'start_row': start_row,
+                           'end_row': end_row, 'text': "\n".join(buffer)}
+                    buffer = []
+                    start_row = None
+
+            if buffer:
+                yield {'sheet': sheet_name, 'kind': 'rows', 'start_row': start_row,
+                       'end_row': end_row, 'text': "\n".join(buffer)}
+
+            if profiles:
+                yield {'sheet': sheet_name, 'kind': 'schema', 'start_row': 1, 'end_row': 1,
+                       'text': "Columns: " + ", ".join(profile.describe() for profile in profiles)}
+
+            if stop_reason:
+                yield {'sheet': sheet_name, 'kind': 'notice', 'start_row': end_row,
+                       'end_row': end_row, 'text': f"[{stop_reason}]"}
+                if exhausted:
+                    return
+
+    def extract_text(self, uploaded_file) -> str:
+        """Extract a tab-separated text rendering of the spreadsheet, schema first per sheet"""
+        sheets = []
+        current = None
+
+        for chunk in self.iter_chunks(uploaded_file):
+            if current is None or current['name'] != chunk['sheet']:
+                current = {'name': chunk['sheet'], 'schema': None, 'parts': []}
+                sheets.append(current)
+            if chunk['kind'] == 'schema':
+                current['schema'] = chunk['text']
+            else:
+                current['parts'].append(chunk['text'])
+
+        text = ""
+        for sheet in sheets:
+            text += f"{SHEET_HEADER}{sheet['name']}\n"
+            if sheet['schema']:
+                text += sheet['schema'] + "\n"
+            for part in sheet['parts']:
+                text += part + "\n"
+            text += "\n"
+        return text.strip()
+
+
+def iter_sheet_chunks(text: str, chunk_rows: Optional[int] = None) -> Iterator[Tuple[str, int, str]]:
+    """
+    Split text rendered by ``SpreadsheetExtractor.extract_text`` back into sheets.
+
+    Yields (sheet_name, chunk_index, text) with at most ``chunk_rows`` lines
+    per chunk. Rows never contain blank lines, so a blank line followed by the
+    sheet header only occurs where a new sheet starts. Working from the stored
+    text means extraction, which may run in a sandbox process, does not have
+    to return its chunks separately.
+    """
+    chunk_rows = chunk_rows or getattr(settings, 'SPREADSHEET_CHUNK_ROWS', 200)
+    for block in ('\n\n' + (text or '')).split('\n\n' + SHEET_HEADER)[1:]:
+        sheet_name, _, body = block.partition('\n')
+        lines = body.split('\n') if body else []
+        for chunk_index, start in enumerate(range(0, len(lines), chunk_rows)):
+            yield sheet_name, chunk_index, '\n'.join(lines[start:start + chunk_rows])
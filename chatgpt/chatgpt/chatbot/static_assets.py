@@ -0,0 +1,172 @@
+"""
+Static asset pipeline: fingerprinted, precompressed files in STATIC_ROOT served with immutable caching
+"""
+import gzip
+import mimetypes
+import os
+from functools import lru_cache
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_http_methods
+
+from .lazy import lazy_import
+
+brotli = lazy_import('brotli')
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico'}
+MIN_COMPRESS_SIZE = 512
+# A compressed copy that saves less than this share of the original is not worth a second file
+MIN_SAVING = 0.05
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+UNHASHED_MAX_AGE = getattr(settings, 'STATIC_UNHASHED_MAX_AGE', 60)
+
+# Encodings in order of preference, with the suffix of their precompressed copy
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def _compress_gzip(data: bytes) -> bytes:
+    # mtime=0 keeps the output identical across builds
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _compress_brotli(data: bytes) -> bytes:
+    return brotli.compress(data, quality=11)
+
+
+def compressors() -> List[Tuple[str, Callable[[bytes], bytes]]]:
+    """(suffix, function) for every available encoding; brotli is optional"""
+    available = [('.gz', _compress_gzip)]
+    if brotli:
+        available.insert(0, ('.br', _compress_brotli))
+    return available
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that also writes ``.gz`` (and ``.br`` when brotli is
+    installed) next to every compressible file during collectstatic, so
+    nothing is compressed per request.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run=dry_run, **options):
+            if not isinstance(processed, Exception):
+                names.add(name)
+                if hashed_name:
+                    names.add(hashed_name)
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+        for name in sorted(names):
+            self.compress(name)
+
+    def compress(self, name: str) -> List[str]:
+        """Write precompressed copies of one file; returns the names written"""
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return []
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            data = source.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return []
+
+        written = []
+        for suffix, compress in compressors():
+            compressed = compress(data)
+            if len(compressed) > len(data) * (1 - MIN_SAVING):
+                continue
+            with open(path + suffix, 'wb') as target:
+                target.write(compressed)
+            written.append(name + suffix)
+        return written
+
+
+@lru_cache(maxsize=None)
+def hashed_names() -> frozenset:
+    """Fingerprinted file names from the collectstatic manifest (read once per process)"""
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+def asset_version() -> str:
+    """Changes whenever collectstatic produces different assets; used to key cached fragments"""
+    return getattr(staticfiles_storage, 'manifest_hash', '') or ''
+
+
+def accepted_encodings(header: str) -> Iterator[str]:
+    """Encodings the client accepts (q=0 excluded)"""
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        name, _, value = params.strip().partition('=')
+        try:
+            if name.strip() == 'q' and float(value) == 0:
+                continue
+        except ValueError:
+            continue
+        if coding.strip():
+            yield coding.strip().lower()
+
+
+def _resolve(path: str) -> Optional[str]:
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except (ValueError, TypeError):
+        return None
+    if os.path.isfile(full_path):
+        return full_path
+    if settings.DEBUG:
+        # Before collectstatic has run, serve straight from the app directories
+        return finders.find(path)
+    return None
+
+
+@require_http_methods(["GET", "HEAD"])
+def serve_static(request, path):
+    """
+    Serve a collected static file, choosing a precompressed copy when the client accepts it.
+
+    Fingerprinted names never change content, so they are cached as
+    immutable for a year; other names get a short max-age.
+    """
+    full_path = _resolve(path)
+    if full_path is None or path.endswith(tuple(suffix for _, suffix in ENCODINGS)):
+        raise Http404(f'"{path}" does not exist')
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    serve_path, encoding = full_path, None
+    accepted = set(accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+    for name, suffix in ENCODINGS:
+        if name in accepted and os.path.isfile(full_path + suffix):
+            serve_path, encoding = full_path + suffix, name
+            break
+
+    stat = os.stat(serve_path)
+    etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+    if path in hashed_names():
+        cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        cache_control = f'public, max-age={UNHASHED_MAX_AGE}'
+
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag or (
+            'HTTP_IF_NONE_MATCH' not in request.META and if_modified_since
+            and int(stat.st_mtime) <= if_modified_since):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(serve_path, 'rb'), content_type=content_type or 'application/octet-stream')
+        response['Content-Length'] = stat.st_size
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control
+    response['Vary'] = 'Accept-Encoding'
+    return response
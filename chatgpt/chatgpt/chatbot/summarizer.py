@@ -0,0 +1,252 @@
+"""
+Ingest-time map-reduce summarisation of large documents
+"""
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .model_router import SUMMARY, get_router
+from .models import Document, DocumentSummary
+from .sync import record_change
+from .usage import record_usage
+
+ENABLED = getattr(settings, 'DOCUMENT_SUMMARY_ENABLED', True)
+MIN_CHARS = getattr(settings, 'DOCUMENT_SUMMARY_MIN_CHARS', 4000)
+CHUNK_CHARS = getattr(settings, 'DOCUMENT_SUMMARY_CHUNK_CHARS', 12000)
+SECTION_CHUNKS = getattr(settings, 'DOCUMENT_SUMMARY_SECTION_CHUNKS', 6)
+MAP_WORKERS = getattr(settings, 'DOCUMENT_SUMMARY_MAP_WORKERS', 4)
+BACKGROUND_WORKERS = getattr(settings, 'DOCUMENT_SUMMARY_BACKGROUND_WORKERS', 2)
+LEASE = timedelta(seconds=getattr(settings, 'DOCUMENT_SUMMARY_LEASE_SECONDS', 1800))
+REDUCE_INPUT_CHARS = 16000
+CHUNK_SUMMARY_WORDS = 150
+SECTION_SUMMARY_WORDS = 250
+DOCUMENT_SUMMARY_WORDS = 400
+
+_background = None
+
+
+def split_chunks(text: str, size: int = CHUNK_CHARS) -> List[Tuple[int, int]]:
+    """
+    Split text into (start, end) ranges of at most ``size`` characters.
+
+    Cuts are made at the last paragraph break in a range, then the last
+    line break, then the last space, so chunks rarely end mid-sentence.
+    """
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            for separator in ('\n\n', '\n', ' '):
+                cut = text.rfind(separator, start + size // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+def _summarize(prompt: str, user_id: Optional[int]) -> str:
+    routed = get_router().generate(prompt, SUMMARY)
+    record_usage(user_id, None, routed.model, prompt, routed.text, routed.response)
+    text = routed.text.strip()
+    if not text:
+        raise ValueError('The model returned an empty summary')
+    return text
+
+
+def _map_prompt(title: str, part: int, parts: int, chunk: str) -> str:
+    return (
+        f'Summarise part {part} of {parts} of the document "{title}". Keep the key facts, figures, names, '
+        f'decisions and conclusions. Use at most {CHUNK_SUMMARY_WORDS} words.\n\n{chunk}'
+    )
+
+
+def _reduce_prompt(title: str, scope: str, summaries: Iterable[str], words: int) -> str:
+    joined = '\n\n'.join(f'[{index}] {summary}' for index, summary in enumerate(summaries, start=1))
+    return (
+        f'The following are summaries of consecutive parts of {scope} of the document "{title}", in order. '
+        f'Merge them into one coherent summary of at most {words} words, keeping the most important facts.\n\n{joined}'
+    )
+
+
+def _reduce(title: str, scope: str, summaries: List[str], words: int, user_id: Optional[int]) -> str:
+    """Merge summaries, first in groups if together they are too long for one prompt"""
+    while len(summaries) > 1 and sum(len(summary) for summary in summaries) > REDUCE_INPUT_CHARS:
+        groups = [summaries[index:index + SECTION_CHUNKS] for index in range(0, len(summaries), SECTION_CHUNKS)]
+        summaries = [_summarize(_reduce_prompt(title, scope, group, words), user_id) for group in groups]
+    if len(summaries) == 1:
+        return summaries[0]
+    return _summarize(_reduce_prompt(title, scope, summaries, words), user_id)
+
+
+def build_summaries(title: str, text: str, user_id: Optional[int] = None) -> List[DocumentSummary]:
+    """
+    Summarise text into chunk, section and document nodes (not saved).
+
+    Map: every chunk is summarised independently, in parallel. Reduce:
+    each run of ``SECTION_CHUNKS`` chunk summaries becomes a section
+    summary, and the section summaries become the document summary.
+    Tokens are counted against ``user_id``.
+    """
+    chunks = split_chunks(text)
+    with ThreadPoolExecutor(max_workers=MAP_WORKERS) as executor:
+        chunk_summaries = list(executor.map(
+            lambda item: _summarize(
+                _map_prompt(title, item[0] + 1, len(chunks), text[item[1][0]:item[1][1]]), user_id
+            ),
+            enumerate(chunks)
+        ))
+
+    nodes = []
+    section_summaries = []
+    for section, first in enumerate(range(0, len(chunks), SECTION_CHUNKS)):
+        members = range(first, min(first + SECTION_CHUNKS, len(chunks)))
+        for position in members:
+            nodes.append(DocumentSummary(
+                level='chunk', position=position, section=section,
+                start_offset=chunks[position][0], end_offset=chunks[position][1],
+                summary=chunk_summaries[position],
+            ))
+        summary = _reduce(title, f'section {section + 1}', [chunk_summaries[position] for position in members],
+                          SECTION_SUMMARY_WORDS, user_id)
+        section_summaries.append(summary)
+        nodes.append(DocumentSummary(
+            level='section', position=section, section=section,
+            start_offset=chunks[members[0]][0], end_offset=chunks[members[-1]][1],
+            summary=summary,
+        ))
+
+    nodes.append(DocumentSummary(
+        level='document', position=0, start_offset=0, end_offset=len(text),
+        summary=_reduce(title, 'the whole text', section_summaries, DOCUMENT_SUMMARY_WORDS, user_id),
+    ))
+    return nodes
+
+
+def claimable(force: bool = False) -> Q:
+    """
+    Documents a worker may claim: pending or failed ones (any with
+    ``force``), and running ones whose claim is older than the lease,
+    i.e. whose worker died or was restarted.
+    """
+    statuses = ['pending', 'failed'] + (['running', 'ready', 'skipped'] if force else [])
+    expired = Q(summary_claimed_at__isnull=True) | Q(summary_claimed_at__lt=timezone.now() - LEASE)
+    stale = Q(summary_status='running') & expired
+    return Q(summary_status__in=statuses) | stale
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def summarize_document(document_id: int, force: bool = False) -> str:
+    """
+    Build and store the summary hierarchy of one document.
+
+    The document is claimed with a conditional update, so concurrent
+    workers never summarise the same document twice. The result is only
+    stored if the claim still holds and the text is the one that was
+    summarised; if a new version or a re-extraction replaced it meanwhile,
+    the document is scheduled again instead.
+
+    Returns:
+        The resulting summary_status
+    """
+    claimed_at = timezone.now()
+    claimed = Document.objects.filter(claimable(force), id=document_id).update(
+        summary_status='running', summary_claimed_at=claimed_at
+    )
+    if not claimed:
+        return Document.objects.filter(id=document_id).values_list('summary_status', flat=True).first() or 'missing'
+
+    document = Document.objects.only('id', 'user_id', 'title', 'extraction_status', 'extracted_text').get(id=document_id)
+    text = document.extracted_text or ''
+    text_hash = _text_hash(text)
+    if document.extraction_status != 'ok' or len(text) < MIN_CHARS:
+        status = 'skipped'
+        nodes = []
+    else:
+        try:
+            nodes = build_summaries(document.title, text, document.user_id)
+            status = 'ready'
+        except Exception:
+            nodes = []
+            status = 'failed'
+
+    with transaction.atomic():
+        current = (
+            Document.objects.select_for_update()
+            .filter(id=document_id, summary_status='running', summary_claimed_at=claimed_at)
+            .only('id', 'extracted_text')
+            .first()
+        )
+        if current is None or _text_hash(current.extracted_text or '') != text_hash:
+            # Superseded: the text changed (and was marked pending), or another worker took over
+            if current is not None:
+                Document.objects.filter(id=document_id).update(summary_status='pending', summary_claimed_at=None)
+            if current is not None or Document.objects.filter(id=document_id, summary_status='pending').exists():
+                schedule_summaries([document_id])
+            return 'superseded'
+        if status != 'failed':
+            DocumentSummary.objects.filter(document_id=document_id).delete()
+            for node in nodes:
+                node.document_id = document_id
+            DocumentSummary.objects.bulk_create(nodes)
+        Document.objects.filter(id=document_id).update(summary_status=status, summary_claimed_at=None)
+        if status == 'ready':
+            record_change(document.user_id, 'document', document_id)
+    return status
+
+
+def _run_in_background(document_ids: List[int]) -> None:
+    close_old_connections()
+    try:
+        for document_id in document_ids:
+            summarize_document(document_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_summaries(document_ids: Iterable[int]) -> None:
+    """
+    Summarise documents in a background thread once the current transaction commits.
+
+    Documents left pending, or running by a worker that died, are picked up
+    by ``manage.py summarize_documents`` (running ones once their lease expires).
+    """
+    global _background
+    document_ids = list(document_ids)
+    if not ENABLED or not document_ids:
+        return
+    if _background is None:
+        _background = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='summarizer')
+    transaction.on_commit(lambda: _background.submit(_run_in_background, document_ids))
+
+
+def get_summary_context(document: Document, max_chars: int = 4000) -> Optional[str]:
+    """Document summary followed by as many section summaries as fit in ``max_chars``"""
+    nodes = sorted(
+        DocumentSummary.objects.filter(document=document, level__in=['document', 'section'])
+        .values_list('level', 'position', 'summary'),
+        key=lambda node: (node[0] != 'document', node[1])
+    )
+    if not nodes:
+        return None
+
+    parts = []
+    used = 0
+    for level, position, summary in nodes:
+        part = f'Summary: {summary}' if level == 'document' else f'Section {position + 1}: {summary}'
+        if parts and used + len(part) > max_chars:
+            break
+        parts.append(part)
+        used += len(part)
+    return '\n'.join(parts)
@@ -0,0 +1,157 @@
+"""
+Incremental sync: a per-user change feed with tombstones for deletes
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import PREVIEW_LENGTH, ChangeLog, Conversation, Document
+
+MAX_CHANGES = 500
+
+
+def record_change(user_id: int, kind: str, object_id: int, action: str = 'upsert') -> None:
+    """
+    Append a change to the user's feed once the surrounding transaction commits.
+
+    Deferring to on_commit keeps rolled-back writes out of the feed and lets
+    cascading deletes of the user itself skip the insert.
+    """
+    def write():
+        if User.objects.filter(id=user_id).exists():
+            ChangeLog.objects.create(user_id=user_id, kind=kind, object_id=object_id, action=action)
+
+    transaction.on_commit(write)
+
+
+def record_bulk_changes(user_id: int, kind: str, object_ids, action: str = 'upsert') -> None:
+    """Append one change per object, for writes that bypass model signals (bulk_create)"""
+    object_ids = list(object_ids)
+
+    def write():
+        ChangeLog.objects.bulk_create([
+            ChangeLog(user_id=user_id, kind=kind, object_id=object_id, action=action)
+            for object_id in object_ids
+        ])
+
+    if object_ids:
+        transaction.on_commit(write)
+
+
+def get_current_cursor(user) -> int:
+    """Latest version in the user's feed (0 if there is none yet)"""
+    return ChangeLog.objects.filter(user=user).aggregate(latest=Max('id'))['latest'] or 0
+
+
+def needs_reset(since: int) -> bool:
+    """A cursor older than the pruned part of the log cannot be replayed"""
+    oldest = ChangeLog.objects.aggregate(oldest=Min('id'))['oldest']
+    return oldest is not None and since < oldest - 1
+
+
+def _conversation_data(ids, user):
+    rows = Conversation.objects.filter(id__in=ids, user=user).values(
+        'id', 'title', 'updated_at', 'created_at', 'message_count'
+    )
+    return {
+        row['id']: {
+            'id': row['id'],
+            'title': row['title'],
+            'last_updated': row['updated_at'].isoformat(),
+            'created_at': row['created_at'].isoformat(),
+            'message_count': row['message_count'],
+        }
+        for row in rows
+    }
+
+
+def _document_data(ids, user):
+    # The stored preview is enough here; the full text is never inflated
+    documents = Document.objects.filter(id__in=ids, user=user).only(
+        'id', 'title', 'file_type', 'file_size', 'upload_date', 'last_accessed', 'extraction_status', 'text_preview'
+    )
+    return {
+        document.id: {
+            'id': document.id,
+            'title': document.title,
+            'file_type': document.file_type,
+            'file_size_mb': document.get_file_size_mb(),
+            'upload_date': document.upload_date.isoformat(),
+            'last_accessed': document.last_accessed.isoformat(),
+            'extraction_status': document.extraction_status,
+            'extracted_text_preview': document.text_preview + (
+                '...' if len(document.text_preview) >= PREVIEW_LENGTH else ''
+            ),
+        }
+        for document in documents
+    }
+
+
+def get_changes(user, since: int, limit: int = MAX_CHANGES) -> dict:
+    """
+    Collect changes after ``since``, collapsed to the latest action per object.
+
+    Returns:
+        Dict with ``changes``, the new ``cursor`` and ``has_more``
+    """
+    entries = list(
+        ChangeLog.objects.filter(user=user, id__gt=since)
+        .order_by('id')
+        .values('id', 'kind', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}
+    for entry in entries:
+        latest[(entry['kind'], entry['object_id'])] = entry
+
+    upserts = {'conversation': [], 'document': []}
+    for (kind, object_id), entry in latest.items():
+        if entry['action'] == 'upsert':
+            upserts[kind].append(object_id)
+
+    data = {
+        'conversation': _conversation_data(upserts['conversation'], user),
+        'document': _document_data(upserts['document'], user),
+    }
+
+    changes = []
+    for (kind, object_id), entry in sorted(latest.items(), key=lambda item: item[1]['id']):
+        payload = data[kind].get(object_id)
+        action = entry['action']
+        if action == 'upsert' and payload is None:
+            # Gone by now; its delete tombstone will follow
+            action = 'delete'
+        changes.append({
+            'version': entry['id'],
+            'kind': kind,
+            'id': object_id,
+            'action': action,
+            'data': payload if action == 'upsert' else None,
+        })
+
+    cursor = entries[-1]['id'] if entries else since
+    return {'changes': changes, 'cursor': cursor, 'has_more': has_more}
+
+
+def prune_changes(days: int) -> int:
+    """
+    Delete feed entries older than ``days`` days.
+
+    The newest entry is always kept so that the lowest retained version
+    marks exactly how far back cursors can still be replayed.
+    """
+    newest = ChangeLog.objects.aggregate(newest=Max('id'))['newest']
+    if newest is None:
+        return 0
+    cutoff = timezone.now() - timedelta(days=days)
+    boundary = ChangeLog.objects.filter(created_at__lt=cutoff).aggregate(boundary=Max('id'))['boundary']
+    if boundary is None:
+        return 0
+    # Delete by id rather than timestamp so the retained versions stay contiguous
+    deleted, _ = ChangeLog.objects.filter(id__lte=boundary).exclude(id=newest).delete()
+    return deleted
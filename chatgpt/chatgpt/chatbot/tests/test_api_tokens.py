@@ -0,0 +1,147 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from chatbot import api_tokens, purge
+from chatbot.api_tokens import APITokenMiddleware, Denylist, TokenError, issue_tokens, verify_token
+from chatbot.models import UserDeletion
+from chatbot.purge import USER_GRACE, purge_once, soft_delete_user
+
+
+class APITokenTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        # A private denylist whose background reload thread never starts
+        self.denylist = Denylist()
+        self.denylist._flusher = mock.Mock()
+        patcher = mock.patch.object(api_tokens, 'denylist', self.denylist)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, path, body, token=None):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        return self.client.post(path, data=json.dumps(body), content_type='application/json', **headers)
+
+    def get_memories(self, token):
+        return self.client.get('/api/memories/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_password_login_issues_a_working_access_token(self):
+        response = self.post('/api/auth/token/', {'username': 'alice', 'password': 'pw'})
+        self.assertEqual(response.status_code, 200)
+
+        tokens = response.json()
+        self.assertEqual(self.get_memories(tokens['access_token']).status_code, 200)
+
+    def test_wrong_password_is_rejected(self):
+        response = self.post('/api/auth/token/', {'username': 'alice', 'password': 'nope'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_bad_bearer_token_is_rejected(self):
+        response = self.get_memories('not-a-token')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+
+    def test_refresh_token_is_not_an_access_token(self):
+        tokens = issue_tokens(self.user)
+        self.assertEqual(self.get_memories(tokens['refresh_token']).status_code, 401)
+
+    def test_refresh_token_can_be_used_once(self):
+        tokens = issue_tokens(self.user)
+
+        first = self.post('/api/auth/token/refresh/', {'refresh_token': tokens['refresh_token']})
+        second = self.post('/api/auth/token/refresh/', {'refresh_token': tokens['refresh_token']})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.get_memories(first.json()['access_token']).status_code, 200)
+        self.assertEqual(second.status_code, 401)
+
+    def test_refresh_fails_for_an_inactive_user(self):
+        tokens = issue_tokens(self.user)
+        User.objects.filter(id=self.user.id).update(is_active=False)
+
+        response = self.post('/api/auth/token/refresh/', {'refresh_token': tokens['refresh_token']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_revoked_token_is_rejected(self):
+        tokens = issue_tokens(self.user)
+        other = issue_tokens(self.user)
+
+        response = self.post('/api/auth/token/revoke/', {'token': tokens['access_token']}, token=other['access_token'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_memories(tokens['access_token']).status_code, 401)
+        self.assertEqual(self.get_memories(other['access_token']).status_code, 200)
+
+    def test_revoking_all_rejects_every_earlier_token(self):
+        tokens = issue_tokens(self.user)
+        other = issue_tokens(self.user)
+
+        self.post('/api/auth/token/revoke/', {'all': True}, token=tokens['access_token'])
+
+        self.assertEqual(self.get_memories(tokens['access_token']).status_code, 401)
+        self.assertEqual(self.get_memories(other['access_token']).status_code, 401)
+        with self.assertRaises(TokenError):
+            verify_token(other['refresh_token'], api_tokens.REFRESH)
+
+    def test_password_change_revokes_tokens(self):
+        tokens = issue_tokens(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('new-pw')
+            self.user.save()
+
+        self.assertEqual(self.get_memories(tokens['access_token']).status_code, 401)
+
+    def test_saving_other_fields_keeps_tokens(self):
+        tokens = issue_tokens(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Alice'
+            self.user.save()
+
+        self.assertEqual(self.get_memories(tokens['access_token']).status_code, 200)
+
+    def test_other_processes_see_revocations_after_reload(self):
+        tokens = issue_tokens(self.user)
+        api_tokens.revoke_token(verify_token(tokens['access_token']))
+
+        other_process = Denylist()
+        other_process._flusher = mock.Mock()
+        with mock.patch.object(api_tokens, 'denylist', other_process):
+            with self.assertRaisesMessage(TokenError, 'Token has been revoked'):
+                verify_token(tokens['access_token'])
+
+    def test_checking_a_token_runs_no_queries(self):
+        tokens = issue_tokens(self.user)
+        verify_token(tokens['access_token'])
+        middleware = APITokenMiddleware(lambda request: HttpResponse(str(request.user.is_authenticated)))
+        request = RequestFactory().get('/api/memories/', HTTP_AUTHORIZATION=f'Bearer {tokens["access_token"]}')
+
+        with self.assertNumQueries(0):
+            response = middleware(request)
+
+        self.assertEqual(response.content, b'True')
+        self.assertEqual(request.user.id, self.user.id)
+
+    def test_tokens_of_a_purged_user_stay_revoked(self):
+        tokens = issue_tokens(self.user)
+        with mock.patch.object(purge, 'purger'):
+            with self.captureOnCommitCallbacks(execute=True):
+                soft_delete_user(self.user)
+        self.assertEqual(self.get_memories(tokens['access_token']).status_code, 401)
+
+        # Past the grace period the purger no longer waits for the tokens to expire
+        UserDeletion.objects.update(requested_at=timezone.now() - USER_GRACE - timedelta(seconds=1))
+        purge_once()
+        self.assertFalse(User.objects.filter(id=self.user.id).exists())
+
+        other_process = Denylist()
+        other_process._flusher = mock.Mock()
+        with mock.patch.object(api_tokens, 'denylist', other_process):
+            self.assertEqual(self.get_memories(tokens['access_token']).status_code, 401)
@@ -0,0 +1,60 @@
+import io
+import tarfile
+import zipfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from chatbot import bulk_upload
+from chatbot.bulk_upload import FileLimitReached, SizeBudget, iter_upload_sources
+
+
+def make_zip(*names):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for name in names:
+            zf.writestr(name, f'contents of {name}')
+    return SimpleUploadedFile('notes.zip', buffer.getvalue())
+
+
+def make_tar(*names):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tf:
+        for name in names:
+            data = f'contents of {name}'.encode('utf-8')
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return SimpleUploadedFile('notes.tar.gz', buffer.getvalue())
+
+
+class FileLimitTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(bulk_upload, '_spool', wraps=bulk_upload._spool)
+        self.spool = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sources(self, *uploads, max_files=2):
+        return list(iter_upload_sources(uploads, SizeBudget(max_files=max_files)))
+
+    def test_zip_members_past_the_limit_are_listed_without_being_read(self):
+        sources = self.sources(make_zip('a.txt', 'b.txt', 'c.txt', 'd.txt'))
+
+        self.assertEqual([name for name, _ in sources], ['a.txt', 'b.txt', 'c.txt', 'd.txt'])
+        self.assertEqual([isinstance(source, FileLimitReached) for _, source in sources], [False, False, True, True])
+        self.assertEqual(self.spool.call_count, 2)
+
+    def test_rest_of_a_tar_is_not_read_past_the_limit(self):
+        sources = self.sources(make_tar('a.txt', 'b.txt', 'c.txt', 'd.txt'))
+
+        self.assertEqual([name for name, _ in sources], ['a.txt', 'b.txt', 'notes.tar.gz'])
+        self.assertIsInstance(sources[-1][1], FileLimitReached)
+        self.assertEqual(self.spool.call_count, 2)
+
+    def test_limit_is_shared_by_plain_files_and_archives(self):
+        sources = self.sources(SimpleUploadedFile('a.txt', b'a'), make_zip('b.txt', 'c.txt'))
+
+        self.assertEqual([isinstance(source, FileLimitReached) for _, source in sources], [False, False, True])
+        self.assertEqual(self.spool.call_count, 1)
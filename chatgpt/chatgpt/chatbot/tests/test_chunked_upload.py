@@ -0,0 +1,51 @@
+import hashlib
+import io
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from chatbot.chunked_upload import ChunkedUploadError, init_upload, write_chunk
+from chatbot.models import UploadSession
+
+
+class ClaimedWhileStreaming(io.BytesIO):
+    """A request body during whose upload a ``complete`` call claims the session"""
+
+    def __init__(self, data, session):
+        super().__init__(data)
+        self.session = session
+
+    def read(self, size=-1):
+        UploadSession.objects.filter(pk=self.session.pk).update(status='completing')
+        return super().read(size)
+
+
+class WriteChunkTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.session = init_upload(self.user, 'notes.txt', 8, chunk_size=4)
+
+    def test_chunk_is_recorded_with_its_checksum(self):
+        checksum = hashlib.sha256(b'abcd').hexdigest()
+
+        self.assertEqual(write_chunk(self.session, 1, io.BytesIO(b'abcd'), checksum), checksum)
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.received_chunks, {'1': checksum})
+
+    def test_chunk_is_rejected_once_the_upload_is_being_completed(self):
+        with self.assertRaises(ChunkedUploadError) as raised:
+            write_chunk(self.session, 0, ClaimedWhileStreaming(b'abcd', self.session), '')
+
+        self.assertEqual(raised.exception.status, 409)
+        self.assertEqual(self.session.status, 'completing')
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.received_chunks, {})
@@ -0,0 +1,95 @@
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from chatbot.models import Conversation, Document
+from chatbot.versions import add_version
+
+
+def make_document(user, title='notes.txt', text='Some notes'):
+    return Document.objects.create(
+        user=user, title=title, file_type='txt', extracted_text=text, file_size=len(text),
+        summary_status='skipped',
+    )
+
+
+class ETagTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.client.force_login(self.user)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get(self, path, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(path, **headers)
+
+    def assertNotModified(self, path):
+        etag = self.get(path)['ETag']
+        self.assertEqual(self.get(path, etag).status_code, 304)
+        return etag
+
+    def assertModifiedSince(self, path, etag):
+        response = self.get(path, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_document_list_is_not_modified_until_a_document_is_added(self):
+        make_document(self.user)
+        etag = self.assertNotModified('/api/documents/')
+
+        make_document(self.user, title='more.txt')
+
+        self.assertModifiedSince('/api/documents/', etag)
+
+    def test_document_list_changes_when_a_document_is_updated(self):
+        document = make_document(self.user)
+        etag = self.assertNotModified('/api/documents/')
+
+        document.title = 'renamed.txt'
+        document.save()
+
+        self.assertModifiedSince('/api/documents/', etag)
+
+    def test_document_list_changes_on_a_new_version(self):
+        document = make_document(self.user)
+        etag = self.assertNotModified('/api/documents/')
+
+        add_version(document, SimpleUploadedFile('notes.txt', b'Newer notes', content_type='text/plain'))
+
+        self.assertModifiedSince('/api/documents/', etag)
+
+    def test_document_list_changes_when_a_document_is_deleted(self):
+        document = make_document(self.user)
+        make_document(self.user, title='more.txt')
+        etag = self.assertNotModified('/api/documents/')
+
+        Document.objects.filter(id=document.id).update(deleted_at=document.upload_date)
+
+        self.assertModifiedSince('/api/documents/', etag)
+
+    def test_conversation_list_changes_when_a_conversation_is_updated(self):
+        conversation = Conversation.objects.create(user=self.user, title='Hello', full_conversation=[])
+        etag = self.assertNotModified('/api/conversations/')
+
+        conversation.title = 'Renamed'
+        conversation.save()
+
+        self.assertModifiedSince('/api/conversations/', etag)
+
+    def test_etag_is_per_user(self):
+        make_document(self.user)
+        etag = self.get('/api/documents/')['ETag']
+
+        other = User.objects.create_user('bob', password='pw')
+        make_document(other)
+        self.client.force_login(other)
+
+        self.assertEqual(self.get('/api/documents/', etag).status_code, 200)
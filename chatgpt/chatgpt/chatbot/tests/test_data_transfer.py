@@ -0,0 +1,83 @@
+import io
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from chatbot.data_transfer import FORMAT_VERSION, import_ndjson, iter_export_records, iter_ndjson
+from chatbot.models import Conversation, Document
+
+HEADER = {'type': 'header', 'version': FORMAT_VERSION}
+MESSAGES = [{'user_message': 'Hi', 'bot_response': 'Hello', 'context_summary': None}]
+
+
+def ndjson(*records, compress=False):
+    return io.BytesIO(b''.join(iter_ndjson(records, compress=compress)))
+
+
+class ImportExportTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.other = User.objects.create_user('bob', password='pw')
+
+    def test_export_round_trips_into_another_account(self):
+        conversation = Conversation.objects.create(user=self.user, title='Trip', full_conversation=MESSAGES)
+        Document.objects.create(
+            user=self.user, title='notes.txt', file='documents/notes.txt', file_type='txt',
+            extracted_text='Some notes', file_size=10, summary_status='skipped',
+        )
+        old = datetime(2020, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc)
+        Conversation.objects.filter(id=conversation.id).update(created_at=old, updated_at=old)
+
+        export = ndjson(*iter_export_records(self.user), compress=True)
+        counts = import_ndjson(self.other, export)
+
+        self.assertEqual(counts, {'conversations': 1, 'documents': 1, 'skipped': 0})
+        imported = Conversation.objects.get(user=self.other)
+        self.assertEqual(imported.title, 'Trip')
+        self.assertEqual(imported.get_messages(), MESSAGES)
+        self.assertEqual(imported.created_at, old)
+        self.assertEqual(imported.updated_at, old)
+        document = Document.objects.get(user=self.other)
+        self.assertEqual(str(document.extracted_text), 'Some notes')
+        # The storage path in the export is not trusted
+        self.assertEqual(document.file.name, '')
+
+    def test_malformed_records_are_skipped(self):
+        lines = [
+            json.dumps(HEADER),
+            'not json',
+            json.dumps(['a', 'list']),
+            json.dumps({'type': 'conversation', 'title': 42}),
+            json.dumps({'type': 'conversation', 'full_conversation': 'Hi'}),
+            json.dumps({'type': 'conversation', 'full_conversation': [{'user_message': 1}]}),
+            json.dumps({'type': 'document', 'file_size': 'big'}),
+            json.dumps({'type': 'document', 'extracted_text': {'text': 'x'}}),
+            json.dumps({'type': 'mystery'}),
+            json.dumps({'type': 'conversation', 'title': 'Good', 'full_conversation': MESSAGES}),
+        ]
+
+        counts = import_ndjson(self.user, io.BytesIO('\n'.join(lines).encode('utf-8')))
+
+        self.assertEqual(counts, {'conversations': 1, 'documents': 0, 'skipped': 8})
+        self.assertEqual(list(Conversation.objects.values_list('title', flat=True)), ['Good'])
+
+    def test_unsupported_version_is_rejected(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('export.ndjson', json.dumps({'type': 'header', 'version': 99}).encode('utf-8'))
+
+        response = self.client.post('/api/import/', {'file': upload})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_import_endpoint_reports_counts(self):
+        self.client.force_login(self.user)
+        body = ndjson(HEADER, {'type': 'conversation', 'title': 'Hi', 'full_conversation': MESSAGES}, [1]).getvalue()
+
+        response = self.client.post('/api/import/', {'file': SimpleUploadedFile('export.ndjson', body)})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['imported'], {'conversations': 1, 'documents': 0, 'skipped': 1})
@@ -0,0 +1,103 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.http import JsonResponse
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from chatbot import idempotency
+from chatbot.idempotency import KEY_TTL, REPLAY_HEADER, idempotent, request_fingerprint
+from chatbot.models import IdempotencyKey
+
+
+class IdempotencyTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.factory = RequestFactory()
+        self.calls = 0
+
+        def create_view(request):
+            self.calls += 1
+            return JsonResponse({'status': 'success', 'call': self.calls}, status=201)
+
+        self.view = idempotent(create_view)
+
+    def post(self, body, key='key-1'):
+        request = self.factory.post(
+            '/api/things/', data=json.dumps(body), content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+        request.user = self.user
+        return request
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.view(self.post({'name': 'a'}))
+        second = self.view(self.post({'name': 'a'}))
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second[REPLAY_HEADER], 'true')
+        self.assertFalse(first.has_header(REPLAY_HEADER))
+
+    def test_key_reused_for_a_different_request_is_rejected(self):
+        self.view(self.post({'name': 'a'}))
+        response = self.view(self.post({'name': 'b'}))
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.calls, 1)
+
+    def test_retry_while_the_original_is_running_gets_409(self):
+        request = self.post({'name': 'a'})
+        now = timezone.now()
+        IdempotencyKey.objects.create(
+            user=self.user, key='key-1', request_hash=request_fingerprint(request),
+            owner='other', locked_at=now, expires_at=now + KEY_TTL,
+        )
+
+        with mock.patch.object(idempotency.wait_for_completion, '__defaults__', (0.0,)):
+            response = self.view(request)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.calls, 0)
+
+    def test_retry_waits_only_a_few_seconds(self):
+        request = self.post({'name': 'a'})
+        now = timezone.now()
+        IdempotencyKey.objects.create(
+            user=self.user, key='key-1', request_hash=request_fingerprint(request),
+            owner='other', locked_at=now, expires_at=now + KEY_TTL,
+        )
+        clock = iter(range(10 ** 6))
+
+        with mock.patch.object(idempotency.time, 'monotonic', lambda: next(clock) * idempotency.POLL_INTERVAL), \
+                mock.patch.object(idempotency.time, 'sleep') as sleep:
+            response = self.view(request)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertLessEqual(idempotency.WAIT_SECONDS, 5)
+        self.assertLessEqual(sleep.call_count, idempotency.WAIT_SECONDS / idempotency.POLL_INTERVAL)
+
+    def test_server_errors_are_not_stored(self):
+        def failing_view(request):
+            self.calls += 1
+            return JsonResponse({'error': 'boom'}, status=500)
+
+        view = idempotent(failing_view)
+        view(self.post({'name': 'a'}))
+        view(self.post({'name': 'a'}))
+
+        self.assertEqual(self.calls, 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_requests_without_a_key_are_unaffected(self):
+        request = self.factory.post('/api/things/', data='{}', content_type='application/json')
+        request.user = self.user
+        self.view(request)
+        self.view(request)
+
+        self.assertEqual(self.calls, 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
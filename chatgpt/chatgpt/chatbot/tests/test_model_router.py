@@ -0,0 +1,136 @@
+import time
+
+from django.test import SimpleTestCase
+
+from chatbot.fake_models import FakeModel
+from chatbot.model_router import CHAT, DOCUMENT, SUMMARY, DeadlineExceeded, LatencyTracker, ModelRouter
+
+TIERS = {
+    'fast': {'model': 'fake-fast', 'fallback': None},
+    'standard': {'model': 'fake-standard', 'fallback': 'fast'},
+    'long': {'model': 'fake-long', 'fallback': 'standard'},
+}
+
+
+class ScriptedModel(FakeModel):
+    """A fake model whose calls take the given delays in turn (the last one repeats)"""
+
+    def __init__(self, model_name, delays, failure_rate=0.0):
+        super().__init__(model_name, jitter=0.0, tail_rate=0.0, failure_rate=failure_rate, seed=0)
+        self.delays = list(delays)
+        self.calls = 0
+
+    def sample_delay(self):
+        self.calls += 1
+        return self.delays.pop(0) if len(self.delays) > 1 else self.delays[0]
+
+
+class ModelRouterTests(SimpleTestCase):
+
+    def make_router(self, models, **kwargs):
+        kwargs.setdefault('tracker', LatencyTracker())
+        router = ModelRouter(TIERS, lambda name, backend=None: models[name], **kwargs)
+        self.addCleanup(router.executor.shutdown, wait=True)
+        return router
+
+    def test_tier_follows_kind_and_prompt_size(self):
+        router = self.make_router({})
+        self.assertEqual(router.choose_tier(SUMMARY, 'x' * 50000), 'fast')
+        self.assertEqual(router.choose_tier(DOCUMENT, 'summarize my notes'), 'standard')
+        self.assertEqual(router.choose_tier(DOCUMENT, 'x' * 25000), 'long')
+        self.assertEqual(router.choose_tier(CHAT, 'short'), 'fast')
+        self.assertEqual(router.choose_tier(CHAT, 'x' * 5000), 'standard')
+        self.assertEqual(router.choose_tier(CHAT, 'x' * 25000), 'long')
+
+    def test_fallback_chain_ends_with_cheapest_tier(self):
+        router = self.make_router({})
+        self.assertEqual(router.fallback_chain('long'), ['long', 'standard', 'fast'])
+        self.assertEqual(router.fallback_chain('fast'), ['fast'])
+
+    def test_hedge_delay_is_p95_once_there_are_enough_samples(self):
+        tracker = LatencyTracker()
+        for _ in range(10):
+            tracker.record('fast', 0.1)
+        self.assertEqual(tracker.hedge_delay('fast', default=3.0, min_samples=20), 3.0)
+        for index in range(90):
+            tracker.record('fast', 0.1 if index < 85 else 2.0)
+        self.assertEqual(tracker.hedge_delay('fast', default=3.0, min_samples=20), 2.0)
+        self.assertEqual(tracker.percentile('fast', 0.5), 0.1)
+
+    def test_slow_first_attempt_is_hedged(self):
+        model = ScriptedModel('fake-fast', [1.0, 0.01])
+        router = self.make_router({'fake-fast': model}, hedge_delay=0.05, deadline=5.0)
+
+        started = time.monotonic()
+        routed = router.generate('hello', CHAT)
+
+        self.assertTrue(routed.hedged)
+        self.assertEqual(routed.tier, 'fast')
+        self.assertEqual(model.calls, 2)
+        self.assertLess(time.monotonic() - started, 0.8)
+
+    def test_fast_answer_is_not_hedged(self):
+        model = ScriptedModel('fake-fast', [0.01])
+        router = self.make_router({'fake-fast': model}, hedge_delay=0.5, deadline=5.0)
+
+        routed = router.generate('hello', CHAT)
+
+        self.assertFalse(routed.hedged)
+        self.assertEqual(model.calls, 1)
+
+    def test_failing_tier_falls_back(self):
+        models = {
+            'fake-standard': ScriptedModel('fake-standard', [0.0], failure_rate=1.0),
+            'fake-fast': ScriptedModel('fake-fast', [0.0]),
+        }
+        router = self.make_router(models, hedging=False, deadline=5.0)
+
+        routed = router.generate('x' * 5000, CHAT)
+
+        self.assertEqual(routed.tier, 'fast')
+        self.assertEqual(routed.fallbacks, 1)
+        self.assertIn('[fake-fast]', routed.text)
+
+    def test_last_error_is_raised_when_every_tier_fails(self):
+        models = {name: ScriptedModel(name, [0.0], failure_rate=1.0) for name in ('fake-standard', 'fake-fast')}
+        router = self.make_router(models, hedging=False, deadline=5.0)
+
+        with self.assertRaisesMessage(Exception, 'fake-fast failed'):
+            router.generate('x' * 5000, CHAT)
+
+    def test_deadline_expires_without_waiting_for_the_model(self):
+        model = ScriptedModel('fake-fast', [1.0])
+        router = self.make_router({'fake-fast': model}, hedging=False, deadline=0.1)
+
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            router.generate('hello', CHAT)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_stream_falls_back_before_the_first_token(self):
+        models = {
+            'fake-standard': ScriptedModel('fake-standard', [0.0], failure_rate=1.0),
+            'fake-fast': ScriptedModel('fake-fast', [0.0]),
+        }
+        router = self.make_router(models, deadline=5.0)
+
+        stream = router.stream('x' * 5000, CHAT)
+        tokens = []
+        try:
+            while True:
+                tokens.append(next(stream))
+        except StopIteration as stop:
+            routed = stop.value
+
+        self.assertEqual(routed.tier, 'fast')
+        self.assertEqual(routed.fallbacks, 1)
+        self.assertEqual(''.join(tokens), routed.text)
+
+    def test_stalled_stream_is_cut_off_at_the_deadline(self):
+        model = ScriptedModel('fake-fast', [2.0])
+        router = self.make_router({'fake-fast': model}, deadline=0.2)
+
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            list(router.stream('hello', CHAT))
+        self.assertLess(time.monotonic() - started, 1.0)
@@ -0,0 +1,56 @@
+import io
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from chatbot import sandbox
+from chatbot.sandbox import ExtractionResult, extract_document
+
+OCR_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'ocr': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-ocr'},
+}
+
+
+def make_image(color='white'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 20), color).save(buffer, format='PNG')
+    return SimpleUploadedFile('scan.png', buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(CACHES=OCR_CACHE)
+class OCRCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['ocr'].clear()
+        patcher = mock.patch.object(sandbox, 'SANDBOX_ENABLED', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_same_image_is_not_sent_to_a_worker_twice(self):
+        with mock.patch.object(sandbox, 'run_in_subprocess', return_value=ExtractionResult('ok', 'image', 'Hello')) as run:
+            first = extract_document(make_image())
+            second = extract_document(make_image())
+
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual((first.text, second.text), ('Hello', 'Hello'))
+        self.assertTrue(second.ok)
+
+    def test_different_image_is_extracted(self):
+        with mock.patch.object(sandbox, 'run_in_subprocess', return_value=ExtractionResult('ok', 'image', 'Hello')) as run:
+            extract_document(make_image('white'))
+            extract_document(make_image('black'))
+
+        self.assertEqual(run.call_count, 2)
+
+    def test_failures_are_not_cached(self):
+        failure = ExtractionResult('timeout', 'image', error='Extraction took longer than 60s')
+        with mock.patch.object(sandbox, 'run_in_subprocess', return_value=failure) as run:
+            extract_document(make_image())
+            result = extract_document(make_image())
+
+        self.assertEqual(run.call_count, 2)
+        self.assertEqual(result.status, 'timeout')
@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from chatbot import purge
+from chatbot.chunked_upload import get_part_path, init_upload
+from chatbot.models import ChangeLog, Conversation, Document, UserDeletion
+from chatbot.purge import USER_GRACE, purge_once, soft_delete, soft_delete_user
+
+
+def expire_deletions():
+    """Move pending account deletions past the wait for their tokens to expire"""
+    UserDeletion.objects.update(requested_at=timezone.now() - USER_GRACE - timedelta(seconds=1))
+
+
+class SoftDeleteTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        # Purges run explicitly here, not on the background thread
+        patcher = mock.patch.object(purge, 'purger')
+        self.purger = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_conversation(self, title='Hello'):
+        return Conversation.objects.create(user=self.user, title=title, full_conversation=[])
+
+    def make_document(self, title='notes.txt'):
+        return Document.objects.create(
+            user=self.user, title=title, file_type='txt', extracted_text='Some notes', file_size=10,
+            summary_status='skipped',
+        )
+
+    def test_deleted_rows_are_hidden_until_purged(self):
+        conversation = self.make_conversation()
+        kept = self.make_conversation('Kept')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted = soft_delete(Conversation.objects.filter(id=conversation.id))
+
+        self.assertEqual(deleted, 1)
+        self.purger.request.assert_called_once_with()
+        self.assertEqual(list(Conversation.objects.values_list('id', flat=True)), [kept.id])
+        self.assertTrue(Conversation.all_objects.filter(id=conversation.id).exists())
+
+        purge_once()
+
+        self.assertFalse(Conversation.all_objects.filter(id=conversation.id).exists())
+        self.assertTrue(Conversation.objects.filter(id=kept.id).exists())
+
+    def test_deleting_twice_is_a_no_op(self):
+        document = self.make_document()
+        soft_delete(Document.objects.filter(id=document.id))
+
+        self.assertEqual(soft_delete(Document.all_objects.filter(id=document.id)), 0)
+
+    def test_deleted_documents_are_not_listed(self):
+        document = self.make_document()
+        self.make_document('more.txt')
+        self.client.force_login(self.user)
+
+        soft_delete(Document.objects.filter(id=document.id))
+
+        titles = [item['title'] for item in self.client.get('/api/documents/').json()['documents']]
+        self.assertEqual(titles, ['more.txt'])
+
+    def test_one_delete_change_per_soft_delete(self):
+        document = self.make_document()
+        document_id = document.id
+        ChangeLog.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            soft_delete(Document.objects.filter(id=document_id))
+        with self.captureOnCommitCallbacks(execute=True):
+            purge_once()
+
+        self.assertEqual(
+            list(ChangeLog.objects.filter(object_id=document_id).values_list('kind', 'action')),
+            [('document', 'delete')],
+        )
+        self.assertFalse(Document.all_objects.filter(id=document_id).exists())
+
+    def test_deleted_account_is_purged_with_its_data(self):
+        self.make_conversation()
+        self.make_document()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            soft_delete_user(self.user)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(Conversation.objects.filter(user=self.user).exists())
+        self.assertFalse(Document.objects.filter(user=self.user).exists())
+
+        # Rows go in the first pass; the user waits until their tokens expire
+        purge_once()
+        purge_once()
+        self.assertTrue(User.objects.filter(id=self.user.id).exists())
+        self.assertFalse(Conversation.all_objects.exists())
+
+        expire_deletions()
+        purge_once()
+
+        self.assertFalse(User.objects.filter(id=self.user.id).exists())
+        self.assertFalse(UserDeletion.objects.exists())
+        self.assertFalse(Conversation.all_objects.exists())
+        self.assertFalse(Document.all_objects.exists())
+
+    def test_unfinished_uploads_are_removed_with_the_account(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root):
+            session = init_upload(self.user, 'big.pdf', 1024)
+            part_path = get_part_path(session)
+            self.assertTrue(os.path.exists(part_path))
+
+            soft_delete_user(self.user)
+            expire_deletions()
+            purge_once()
+
+            self.assertFalse(User.objects.filter(id=self.user.id).exists())
+            self.assertFalse(os.path.exists(part_path))
@@ -0,0 +1,94 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from chatbot import sandbox
+from chatbot.document_processor import ExtractionError
+from chatbot.sandbox import ExtractionResult, extract_document, run_extractor, run_in_subprocess
+
+
+def failing_extractor(error):
+    extractor = mock.Mock(options={})
+    extractor.name = 'pdf'
+    extractor.load.return_value.side_effect = error
+    return extractor
+
+
+class RunExtractorTests(SimpleTestCase):
+
+    def test_text_is_extracted(self):
+        result = run_extractor(SimpleUploadedFile('notes.txt', b'Some notes'))
+        self.assertEqual(result, {'status': 'ok', 'file_type': 'text', 'text': 'Some notes', 'truncated': False})
+
+    def test_long_output_is_truncated(self):
+        result = run_extractor(SimpleUploadedFile('notes.txt', b'x' * 100), max_chars=10)
+
+        self.assertTrue(result['truncated'])
+        self.assertTrue(result['text'].startswith('x' * 10 + '\n[Output truncated'))
+
+    def test_unknown_extension_is_unsupported(self):
+        self.assertEqual(run_extractor(SimpleUploadedFile('notes.xyz', b'?'))['status'], 'unsupported')
+
+    def test_failures_are_classified(self):
+        cases = [
+            (ExtractionError('Error reading PDF: bad xref'), 'corrupt'),
+            (ValueError('unexpected'), 'corrupt'),
+            (MemoryError(), 'oom'),
+        ]
+        for error, status in cases:
+            with self.subTest(status=status), \
+                    mock.patch.object(sandbox.DocumentProcessor, 'get_extractor', return_value=failing_extractor(error)):
+                self.assertEqual(run_extractor(SimpleUploadedFile('report.pdf', b'%PDF'))['status'], status)
+
+
+class SubprocessTests(SimpleTestCase):
+
+    def write_file(self, data):
+        handle, path = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(handle, 'wb') as temp_file:
+            temp_file.write(data)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_worker_returns_the_text(self):
+        result = run_in_subprocess(self.write_file(b'Some notes'), 'notes.txt', 'text')
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.text, 'Some notes')
+
+    def test_worker_is_killed_at_the_timeout(self):
+        result = run_in_subprocess(self.write_file(b'Some notes'), 'notes.txt', 'text', timeout=0.01)
+        self.assertEqual(result.status, 'timeout')
+
+
+class ExtractDocumentTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(sandbox, 'SANDBOX_ENABLED', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_plain_text_is_extracted_in_process(self):
+        with mock.patch.object(sandbox, 'run_in_subprocess') as run:
+            result = extract_document(SimpleUploadedFile('notes.txt', b'Some notes'))
+
+        run.assert_not_called()
+        self.assertEqual(result.text, 'Some notes')
+
+    def test_risky_formats_go_to_a_worker(self):
+        extractor = mock.Mock(options={'sandbox': True})
+        extractor.name = 'pdf'
+        returned = ExtractionResult('corrupt', 'pdf', error='Error reading PDF: bad xref')
+        with mock.patch.object(sandbox.DocumentProcessor, 'get_extractor', return_value=extractor), \
+                mock.patch.object(sandbox, 'run_in_subprocess', return_value=returned) as run:
+            result = extract_document(SimpleUploadedFile('report.pdf', b'%PDF'))
+
+        self.assertIs(result, returned)
+        self.assertEqual(run.call_args.args[1:3], ('report.pdf', 'pdf'))
+        extractor.load.assert_not_called()
+
+    def test_unknown_extension_is_unsupported(self):
+        self.assertEqual(extract_document(SimpleUploadedFile('notes.xyz', b'?')).status, 'unsupported')
@@ -0,0 +1,115 @@
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from chatbot.models import Conversation, Document
+from chatbot.search_index import index_conversation, remove_conversation, remove_document
+from chatbot.spreadsheet_extractor import SpreadsheetExtractor
+
+
+def make_conversation(user, title, *turns):
+    messages = [{'user_message': user_message, 'bot_response': bot_response} for user_message, bot_response in turns]
+    conversation = Conversation.objects.create(user=user, title=title, full_conversation=messages)
+    index_conversation(conversation)
+    return conversation
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.client.force_login(self.user)
+
+    def search(self, query, **params):
+        response = self.client.get('/api/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_finds_matching_turns_with_highlighted_snippets(self):
+        trip = make_conversation(
+            self.user, 'Trip', ('Plan a trip to Lisbon', 'Sure'), ('What about food?', 'Try pastel de nata in Lisbon'),
+        )
+        make_conversation(self.user, 'Other', ('Hello', 'Hi'))
+
+        found = self.search('lisbon')
+
+        self.assertEqual(found['total'], 2)
+        self.assertEqual({result['conversation_id'] for result in found['results']}, {trip.id})
+        self.assertEqual({result['conversation_title'] for result in found['results']}, {'Trip'})
+        by_turn = {result['turn_index']: result for result in found['results']}
+        self.assertEqual(by_turn[0]['matched_in'], 'user')
+        self.assertEqual(by_turn[1]['matched_in'], 'bot')
+        self.assertIn('<mark>Lisbon</mark>', by_turn[0]['snippet'])
+
+    def test_last_word_matches_as_a_prefix(self):
+        make_conversation(self.user, 'Trip', ('Plan a trip to Lisbon', 'Sure'))
+        self.assertEqual(self.search('plan lis')['total'], 1)
+
+    def test_snippets_escape_stored_html(self):
+        make_conversation(self.user, 'XSS', ('<img src=x onerror=alert(1)> payload', 'ok'))
+
+        snippet = self.search('payload')['results'][0]['snippet']
+
+        self.assertNotIn('<img', snippet)
+        self.assertIn('&lt;img src=x onerror=alert(1)&gt;', snippet)
+        self.assertIn('<mark>payload</mark>', snippet)
+
+    def test_other_users_turns_are_not_found(self):
+        other = User.objects.create_user('bob', password='pw')
+        make_conversation(other, 'Secret', ('Lisbon plans', 'ok'))
+
+        self.assertEqual(self.search('lisbon')['total'], 0)
+
+    def test_query_syntax_is_not_injected(self):
+        make_conversation(self.user, 'Trip', ('Plan a trip to Lisbon', 'Sure'))
+        other = User.objects.create_user('bob', password='pw')
+        make_conversation(other, 'Secret', ('Lisbon plans', 'ok'))
+
+        self.assertEqual(self.search('lisbon OR owner:u%d' % other.id)['total'], 0)
+        self.assertEqual(self.search('"lisbon')['total'], 1)
+
+    def test_removed_conversations_are_not_found(self):
+        trip = make_conversation(self.user, 'Trip', ('Plan a trip to Lisbon', 'Sure'))
+        remove_conversation(trip.id)
+
+        self.assertEqual(self.search('lisbon')['total'], 0)
+
+    def test_paging(self):
+        for index in range(5):
+            make_conversation(self.user, f'Trip {index}', ('Lisbon again', 'ok'))
+
+        found = self.search('lisbon', page=2, page_size=2)
+
+        self.assertEqual(found['total'], 5)
+        self.assertEqual(len(found['results']), 2)
+        self.assertEqual(found['page'], 2)
+
+    def test_empty_query_is_rejected(self):
+        self.assertEqual(self.client.get('/api/search/', {'q': ' '}).status_code, 400)
+
+    @override_settings(SPREADSHEET_CHUNK_ROWS=2)
+    def test_spreadsheet_sheets_are_searched_in_chunks(self):
+        rows = ['city,country', 'Porto,Portugal', 'Lyon,France', 'Lisbon,Portugal']
+        upload = SimpleUploadedFile('cities.csv', '\n'.join(rows).encode('utf-8'))
+        document = Document.objects.create(
+            user=self.user, title='cities.csv', file_type='csv', file_size=64, summary_status='skipped',
+            extracted_text=SpreadsheetExtractor().extract_text(upload),
+        )
+
+        found = self.search('lisbon', scope='spreadsheets')
+
+        self.assertEqual(found['total'], 1)
+        result = found['results'][0]
+        self.assertEqual((result['document_id'], result['document_title']), (document.id, 'cities.csv'))
+        self.assertEqual(result['sheet'], 'cities.csv')
+        # Schema line and header row, two rows, then the last row
+        self.assertEqual(result['chunk_index'], 2)
+        self.assertIn('<mark>Lisbon</mark>', result['snippet'])
+        # Conversation search is unaffected
+        self.assertEqual(self.search('lisbon')['total'], 0)
+
+        remove_document(document.id)
+        self.assertEqual(self.search('lisbon', scope='spreadsheets')['total'], 0)
+
+    def test_unknown_scope_is_rejected(self):
+        self.assertEqual(self.client.get('/api/search/', {'q': 'x', 'scope': 'files'}).status_code, 400)
@@ -0,0 +1,90 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from chatbot import summarizer
+from chatbot.models import Document, DocumentSummary
+from chatbot.summarizer import LEASE, claimable, get_summary_context, split_chunks, summarize_document
+
+# Three chunks of CHUNK_CHARS, which make up a single section
+LONG_TEXT = '\n\n'.join(f'Paragraph {index}. ' + 'word ' * 400 for index in range(15))
+
+
+def fake_summary(prompt, user_id):
+    return 'merged' if prompt.startswith('The following') else 'part'
+
+
+class SummarizerTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        patcher = mock.patch.object(summarizer, '_summarize', side_effect=fake_summary)
+        self.summarize = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_document(self, text=LONG_TEXT, summary_status='pending', **fields):
+        return Document.objects.create(
+            user=self.user, title='report.txt', file_type='text', extracted_text=text, file_size=len(text),
+            summary_status=summary_status, **fields,
+        )
+
+    def test_chunks_cover_the_text_and_end_at_paragraphs(self):
+        chunks = split_chunks(LONG_TEXT)
+
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], len(LONG_TEXT))
+        self.assertTrue(all(end == next_start for (_, end), (next_start, _) in zip(chunks, chunks[1:])))
+        self.assertTrue(all(LONG_TEXT[start:end].endswith('\n\n') for start, end in chunks[:-1]))
+
+    def test_large_document_gets_a_summary_hierarchy(self):
+        document = self.make_document()
+
+        self.assertEqual(summarize_document(document.id), 'ready')
+
+        levels = list(DocumentSummary.objects.filter(document=document).values_list('level', flat=True))
+        chunk_count = len(split_chunks(LONG_TEXT))
+        self.assertEqual(levels.count('chunk'), chunk_count)
+        self.assertEqual(levels.count('section'), 1)
+        self.assertEqual(levels.count('document'), 1)
+        # Map calls, then one merge for the section; a single section is the document summary
+        self.assertEqual(self.summarize.call_count, chunk_count + 1)
+        self.assertEqual(get_summary_context(document).splitlines()[0], 'Summary: merged')
+        document.refresh_from_db()
+        self.assertEqual(document.summary_status, 'ready')
+        self.assertIsNone(document.summary_claimed_at)
+
+    def test_short_document_is_skipped(self):
+        document = self.make_document(text='Short notes')
+
+        self.assertEqual(summarize_document(document.id), 'skipped')
+        self.summarize.assert_not_called()
+
+    def test_summary_of_replaced_text_is_not_stored(self):
+        document = self.make_document()
+
+        def replace_text_meanwhile(prompt, user_id):
+            if prompt.startswith('The following'):
+                Document.objects.filter(id=document.id).update(extracted_text=LONG_TEXT + ' revised')
+            return fake_summary(prompt, user_id)
+
+        self.summarize.side_effect = replace_text_meanwhile
+        with mock.patch.object(summarizer, 'schedule_summaries') as schedule:
+            self.assertEqual(summarize_document(document.id), 'superseded')
+
+        schedule.assert_called_once_with([document.id])
+        self.assertFalse(DocumentSummary.objects.filter(document=document).exists())
+        document.refresh_from_db()
+        self.assertEqual(document.summary_status, 'pending')
+
+    def test_running_documents_are_reclaimed_once_their_lease_expires(self):
+        fresh = self.make_document(summary_status='running', summary_claimed_at=timezone.now())
+        stuck = self.make_document(
+            summary_status='running', summary_claimed_at=timezone.now() - LEASE - timedelta(minutes=1)
+        )
+
+        self.assertEqual(list(Document.objects.filter(claimable()).values_list('id', flat=True)), [stuck.id])
+        self.assertEqual(summarize_document(fresh.id), 'running')
+        self.assertEqual(summarize_document(stuck.id), 'ready')
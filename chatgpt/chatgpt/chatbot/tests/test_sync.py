@@ -0,0 +1,80 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from chatbot.models import PREVIEW_LENGTH, ChangeLog, Conversation, Document
+from chatbot.sync import get_changes, get_current_cursor
+
+
+class SyncTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.client.force_login(self.user)
+
+    def create_conversation(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Conversation.objects.create(user=self.user, title=title, full_conversation=[])
+
+    def sync(self, since):
+        response = self.client.get('/api/sync/', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_changes_since_the_cursor(self):
+        self.create_conversation('Old')
+        cursor = get_current_cursor(self.user)
+        new = self.create_conversation('New')
+
+        synced = self.sync(cursor)
+
+        self.assertFalse(synced['reset'])
+        self.assertEqual([(change['id'], change['action']) for change in synced['changes']], [(new.id, 'upsert')])
+        self.assertEqual(synced['changes'][0]['data']['title'], 'New')
+        self.assertEqual(synced['cursor'], get_current_cursor(self.user))
+
+    def test_upsert_then_delete_collapses_to_a_tombstone(self):
+        cursor = get_current_cursor(self.user)
+        conversation = self.create_conversation('Gone')
+        with self.captureOnCommitCallbacks(execute=True):
+            conversation.delete()
+
+        changes = self.sync(cursor)['changes']
+
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0]['action'], 'delete')
+        self.assertIsNone(changes[0]['data'])
+
+    def test_missing_or_pruned_cursor_resets(self):
+        self.create_conversation('One')
+        self.create_conversation('Two')
+
+        self.assertTrue(self.sync('')['reset'])
+        ChangeLog.objects.filter(id=ChangeLog.objects.order_by('id').first().id).delete()
+        self.assertTrue(self.sync(0)['reset'])
+
+    def test_wait_is_ignored_rather_than_holding_the_worker(self):
+        cursor = get_current_cursor(self.user)
+
+        with self.assertNumQueries(4):
+            # Session, user, the pruned-cursor check and the feed itself
+            response = self.client.get('/api/sync/', {'since': cursor, 'wait': 30})
+
+        self.assertEqual(response.json()['changes'], [])
+
+    def test_document_preview_comes_from_the_stored_column(self):
+        cursor = get_current_cursor(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            document = Document.objects.create(
+                user=self.user, title='notes.txt', file_type='txt', extracted_text='x' * 1000,
+                file_size=1000, summary_status='skipped',
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            changes = get_changes(self.user, cursor)['changes']
+
+        preview = changes[0]['data']['extracted_text_preview']
+        self.assertEqual(changes[0]['id'], document.id)
+        self.assertEqual(preview, 'x' * PREVIEW_LENGTH + '...')
+        self.assertFalse(any('extracted_text' in query['sql'] for query in queries.captured_queries))
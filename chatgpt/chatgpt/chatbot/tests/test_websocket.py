@@ -0,0 +1,87 @@
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from chatbot import websocket
+from chatbot.websocket import CLOSE_UNAUTHORIZED, ChatConnection
+
+
+class FakeSocket:
+    """Both ends of an ASGI WebSocket: frames for the server to receive, and what it sent"""
+
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.sent = []
+        self.closed = asyncio.Event()
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send(self, message):
+        self.sent.append(message)
+        if message['type'] == 'websocket.close':
+            self.closed.set()
+
+    def close_code(self):
+        return next(message['code'] for message in self.sent if message['type'] == 'websocket.close')
+
+
+class ChatConnectionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.client.force_login(self.user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        self.scope = {'type': 'websocket', 'path': websocket.WEBSOCKET_PATH, 'headers': [(b'cookie', cookie.encode())]}
+        patcher = mock.patch.object(websocket, 'EVENT_POLL_INTERVAL', 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def connect(self):
+        socket = FakeSocket()
+        await socket.incoming.put({'type': 'websocket.connect'})
+        connection = ChatConnection(self.scope, socket.receive, socket.send)
+        task = asyncio.create_task(connection.run())
+        while not socket.sent:
+            await asyncio.sleep(0)
+        self.assertEqual(socket.sent[0]['type'], 'websocket.accept')
+        return socket, connection, task
+
+    async def test_deactivated_user_is_disconnected_on_the_next_tick(self):
+        socket, _, task = await self.connect()
+
+        await sync_to_async(User.objects.filter(id=self.user.id).update)(is_active=False)
+        await asyncio.wait_for(socket.closed.wait(), 5)
+        await task
+
+        self.assertEqual(socket.close_code(), CLOSE_UNAUTHORIZED)
+
+    async def test_chat_after_logout_is_refused(self):
+        socket, connection, task = await self.connect()
+
+        # Stop the event ticks so the chat frame is what notices the logout
+        with mock.patch.object(websocket, 'EVENT_POLL_INTERVAL', 60):
+            await sync_to_async(self.client.logout)()
+            await socket.incoming.put({'type': 'websocket.receive', 'text': json.dumps({'type': 'chat', 'message': 'Hi'})})
+            await asyncio.wait_for(socket.closed.wait(), 5)
+            await task
+
+        self.assertEqual(socket.close_code(), CLOSE_UNAUTHORIZED)
+        self.assertFalse(any(message.get('text') for message in socket.sent))
+
+    async def test_conversation_lock_is_dropped_with_its_last_turn(self):
+        connection = ChatConnection(self.scope, None, None)
+
+        first = connection._acquire_conversation_lock(7)
+        second = connection._acquire_conversation_lock(7)
+        self.assertIs(first, second)
+
+        connection._release_conversation_lock(7)
+        self.assertIn(7, connection.conversation_locks)
+        connection._release_conversation_lock(7)
+        self.assertEqual(connection.conversation_locks, {})
@@ -0,0 +1,72 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from chatbot import write_behind
+from chatbot.access_tracking import AccessTracker
+from chatbot.models import Document
+from chatbot.write_behind import BackgroundFlusher
+
+
+class BackgroundFlusherTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(write_behind.atexit, 'register')
+        self.register = patcher.start()
+        self.addCleanup(patcher.stop)
+        # Keep the thread from running: only the exit hook is under test
+        patcher = mock.patch.object(write_behind.threading, 'Thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_exit_flush_is_registered_once_the_thread_starts(self):
+        flusher = BackgroundFlusher(mock.Mock(), 30.0, 'test-flusher')
+        self.register.assert_not_called()
+
+        flusher.ensure_started()
+        flusher.ensure_started()
+
+        self.register.assert_called_once_with(flusher._flush_quietly)
+
+    def test_periodic_jobs_do_not_run_at_exit(self):
+        flusher = BackgroundFlusher(mock.Mock(), 30.0, 'test-reloader', flush_at_exit=False)
+        flusher.ensure_started()
+
+        self.register.assert_not_called()
+
+
+class AccessTrackerTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user('alice', password='pw')
+        self.document = Document.objects.create(
+            user=user, title='notes.txt', file_type='txt', extracted_text='Some notes', file_size=10,
+            summary_status='skipped', last_accessed=timezone.now() - timedelta(days=1),
+        )
+        self.tracker = AccessTracker()
+        self.tracker._flusher = mock.Mock()
+
+    def test_reads_are_written_in_one_batch(self):
+        accessed = self.tracker.touch(self.document.id)
+        self.tracker.touch(self.document.id)
+        self.assertEqual(self.tracker.pending(), 1)
+
+        with self.assertNumQueries(3):
+            # One UPDATE inside its savepoint
+            self.assertEqual(self.tracker.flush(), 1)
+
+        self.document.refresh_from_db()
+        self.assertGreaterEqual(self.document.last_accessed, accessed)
+        self.assertEqual(self.tracker.pending(), 0)
+
+    def test_flush_does_not_rewrite_other_fields(self):
+        self.tracker.touch(self.document.id)
+        Document.objects.filter(id=self.document.id).update(title='renamed.txt')
+
+        self.tracker.flush()
+
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.title, 'renamed.txt')
@@ -7,14 +7,33 @@ urlpatterns = [
     path('signup/', views.signup_view, name='signup'),
     path('logout/', views.logout_view, name='logout'),
     path('chat/', views.chat, name='chat'),
+    path('api/auth/token/', views.issue_api_token, name='issue_api_token'),
+    path('api/auth/token/refresh/', views.refresh_api_token, name='refresh_api_token'),
+    path('api/auth/token/revoke/', views.revoke_api_token, name='revoke_api_token'),
     path('api/chat/', views.chat_api, name='chat_api'),
     path('api/history/', views.chat_history, name='chat_history'),
     path('api/conversations/', views.conversations_list, name='conversations_list'),
     path('api/conversations/<int:conversation_id>/', views.get_conversation, name='get_conversation'),
     path('api/conversations/<int:conversation_id>/delete/', views.delete_conversation, name='delete_conversation'),
+    path('api/sync/', views.sync_changes, name='sync_changes'),
+    path('api/usage/', views.token_usage, name='token_usage'),
+    path('api/memories/', views.get_memories, name='get_memories'),
+    path('api/memories/<int:memory_id>/delete/', views.delete_memory, name='delete_memory'),
+    path('api/search/', views.search_conversations, name='search_conversations'),
     path('api/clear/', views.clear_chat, name='clear_chat'),
     path('api/documents/upload/', views.upload_document, name='upload_document'),
+    path('api/documents/upload/bulk/', views.upload_documents_bulk, name='upload_documents_bulk'),
+    path('api/uploads/', views.chunked_upload_init, name='chunked_upload_init'),
+    path('api/uploads/<uuid:upload_id>/', views.chunked_upload_session, name='chunked_upload_session'),
+    path('api/uploads/<uuid:upload_id>/complete/', views.chunked_upload_complete, name='chunked_upload_complete'),
     path('api/documents/', views.get_documents, name='get_documents'),
     path('api/documents/<int:document_id>/', views.get_document, name='get_document'),
     path('api/documents/<int:document_id>/delete/', views.delete_document, name='delete_document'),
+    path('api/documents/<int:document_id>/versions/', views.document_versions, name='document_versions'),
+    path('api/documents/<int:document_id>/versions/upload/', views.upload_document_version,
+         name='upload_document_version'),
+    path('api/documents/<int:document_id>/versions/<int:number>/', views.get_document_version,
+         name='get_document_version'),
+    path('api/export/', views.export_data, name='export_data'),
+    path('api/import/', views.import_data, name='import_data'),
 ]
@@ -0,0 +1,206 @@
+"""
+Token usage accounting: counters buffered in memory and flushed as aggregated rows in the background
+"""
+import math
+import threading
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Conversation, ConversationUsage, TokenUsage
+from .write_behind import BackgroundFlusher
+
+FLUSH_INTERVAL = getattr(settings, 'USAGE_FLUSH_INTERVAL', 10.0)
+FLUSH_MAX_KEYS = getattr(settings, 'USAGE_FLUSH_MAX_KEYS', 1000)
+CHARS_PER_TOKEN = 4
+
+COUNTER_FIELDS = ('requests', 'prompt_tokens', 'response_tokens')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough local token count (about four characters per token for English text)"""
+    return math.ceil(len(text or '') / CHARS_PER_TOKEN)
+
+
+def count_tokens(prompt: str, response_text: str, response=None) -> Tuple[int, int]:
+    """
+    (prompt_tokens, response_tokens) for one model call.
+
+    Uses the usage metadata the backend returned with the response when
+    there is any, and a local estimate otherwise (e.g. for streams); no
+    extra API call is ever made.
+    """
+    metadata = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(metadata, 'prompt_token_count', None)
+    response_tokens = getattr(metadata, 'candidates_token_count', None)
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(prompt)
+    if response_tokens is None:
+        response_tokens = estimate_tokens(response_text)
+    return int(prompt_tokens), int(response_tokens)
+
+
+def _add(counters: Dict, key, prompt_tokens: int, response_tokens: int) -> None:
+    counts = counters.setdefault(key, [0, 0, 0])
+    counts[0] += 1
+    counts[1] += prompt_tokens
+    counts[2] += response_tokens
+
+
+def _increment(model, key: dict, counts) -> None:
+    """Add counts to the row for key, creating it if needed"""
+    increments = {field: F(field) + value for field, value in zip(COUNTER_FIELDS, counts)}
+    increments['updated_at'] = timezone.now()
+    if model.objects.filter(**key).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **dict(zip(COUNTER_FIELDS, counts)))
+    except IntegrityError:
+        # Another process created the row first
+        model.objects.filter(**key).update(**increments)
+
+
+class UsageBuffer:
+    """
+    In-memory usage counters for this process.
+
+    ``add`` only updates a dict under a lock, so the chat path never waits
+    on the database. A background thread flushes the counters every
+    ``FLUSH_INTERVAL`` seconds, or sooner once ``FLUSH_MAX_KEYS`` distinct
+    rows are pending, as one transaction of increments. Counters that fail
+    to flush are merged back and retried; counters still buffered when the
+    process is killed are lost.
+    """
+
+    def __init__(self, interval: float = FLUSH_INTERVAL, max_keys: int = FLUSH_MAX_KEYS):
+        self.max_keys = max_keys
+        self._daily = {}
+        self._conversations = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = BackgroundFlusher(self.flush, interval, 'usage-flusher')
+
+    def add(self, user_id: int, conversation_id: Optional[int], model: str,
+            prompt_tokens: int, response_tokens: int) -> None:
+        with self._lock:
+            _add(self._daily, (user_id, timezone.localdate(), model), prompt_tokens, response_tokens)
+            if conversation_id is not None:
+                _add(self._conversations, conversation_id, prompt_tokens, response_tokens)
+            pending = len(self._daily) + len(self._conversations)
+        self._flusher.ensure_started()
+        if pending >= self.max_keys:
+            self._flusher.wake()
+
+    def pending(self) -> int:
+        """Number of buffered rows"""
+        with self._lock:
+            return len(self._daily) + len(self._conversations)
+
+    def _take(self):
+        with self._lock:
+            daily, conversations = self._daily, self._conversations
+            self._daily, self._conversations = {}, {}
+        return daily, conversations
+
+    def _merge_back(self, daily, conversations) -> None:
+        with self._lock:
+            for target, source in ((self._daily, daily), (self._conversations, conversations)):
+                for key, counts in source.items():
+                    current = target.setdefault(key, [0, 0, 0])
+                    for index, value in enumerate(counts):
+                        current[index] += value
+
+    def flush(self) -> int:
+        """Write buffered counters to the database; returns the number of rows touched"""
+        with self._flush_lock:
+            daily, conversations = self._take()
+            if not daily and not conversations:
+                return 0
+            try:
+                # Rows of users or conversations deleted meanwhile are dropped
+                user_ids = set(User.objects.filter(id__in={key[0] for key in daily}).values_list('id', flat=True))
+                conversation_ids = set(
+                    Conversation.objects.filter(id__in=conversations).values_list('id', flat=True)
+                )
+                with transaction.atomic():
+                    for (user_id, day, model), counts in daily.items():
+                        if user_id in user_ids:
+                            _increment(TokenUsage, {'user_id': user_id, 'day': day, 'model': model}, counts)
+                    for conversation_id, counts in conversations.items():
+                        if conversation_id in conversation_ids:
+                            _increment(ConversationUsage, {'conversation_id': conversation_id}, counts)
+            except Exception:
+                self._merge_back(daily, conversations)
+                raise
+            return len(daily) + len(conversations)
+
+
+buffer = UsageBuffer()
+
+
+def record_usage(user_id: Optional[int], conversation_id: Optional[int], model: str, prompt: str,
+                 response_text: str, response=None) -> None:
+    """Count one model call against a user (and conversation); never touches the database"""
+    if user_id is None or not model:
+        return
+    prompt_tokens, response_tokens = count_tokens(prompt, response_text, response)
+    buffer.add(user_id, conversation_id, model, prompt_tokens, response_tokens)
+
+
+def _totals(queryset) -> dict:
+    totals = queryset.aggregate(**{field: Sum(field) for field in COUNTER_FIELDS})
+    totals = {field: totals[field] or 0 for field in COUNTER_FIELDS}
+    totals['total_tokens'] = totals['prompt_tokens'] + totals['response_tokens']
+    return totals
+
+
+def usage_between(start: date, end: date, user: Optional[User] = None,
+                  group_by: Iterable[str] = ('user', 'model')) -> list:
+    """
+    Flushed usage from start to end (inclusive), aggregated by the given
+    fields (any of ``user``, ``day``, ``model``), largest consumers first.
+    """
+    group_by = list(group_by)
+    columns = {field: 'user__username' if field == 'user' else field for field in group_by}
+    rows = TokenUsage.objects.filter(day__gte=start, day__lte=end)
+    if user is not None:
+        rows = rows.filter(user=user)
+    rows = rows.values(*columns.values()).annotate(**{f'total_{field}': Sum(field) for field in COUNTER_FIELDS})
+    result = []
+    for row in rows:
+        entry = {field: row[column] for field, column in columns.items()}
+        entry.update({field: row[f'total_{field}'] for field in COUNTER_FIELDS})
+        entry['total_tokens'] = entry['prompt_tokens'] + entry['response_tokens']
+        result.append(entry)
+    result.sort(key=lambda entry: (-entry['total_tokens'], [str(entry[field]) for field in group_by]))
+    return result
+
+
+def user_usage(user: User, days: int = 30) -> dict:
+    """A user's usage over the last ``days`` days: totals plus per-day, per-model rows"""
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    rows = TokenUsage.objects.filter(user=user, day__gte=start, day__lte=end)
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'totals': _totals(rows),
+        'by_day': [
+            {
+                'day': row.day.isoformat(), 'model': row.model, 'requests': row.requests,
+                'prompt_tokens': row.prompt_tokens, 'response_tokens': row.response_tokens,
+            }
+            for row in rows.order_by('day', 'model')
+        ],
+    }
+
+
+def conversation_usage(conversation: Conversation) -> dict:
+    """Token totals of one conversation"""
+    return _totals(ConversationUsage.objects.filter(conversation=conversation))
@@ -0,0 +1,132 @@
+"""
+Document versions: a revised file is ingested page by page, reusing the stored text of unchanged pages
+"""
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Document, DocumentPage, DocumentVersion
+from .sandbox import ExtractionResult, extract_document
+from .search_index import index_document
+from .summarizer import schedule_summaries
+
+PAGE_BATCH_SIZE = 500
+
+
+class VersionError(Exception):
+    """A new version that cannot be ingested, with the HTTP status that describes it"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _pages(version: DocumentVersion, pages: Optional[list], texts: Optional[List[str]] = None) -> List[DocumentPage]:
+    return [
+        DocumentPage(
+            version=version, number=number, content_hash=page['hash'],
+            text=texts[number] if texts is not None else page.get('text', ''),
+        )
+        for number, page in enumerate(pages or [])
+    ]
+
+
+def record_initial_versions(entries: Iterable[Tuple[Document, Optional[ExtractionResult]]]) -> None:
+    """
+    Store version 1 of newly created documents with the pages their
+    extraction returned, so that the first re-upload is incremental too.
+    """
+    entries = list(entries)
+    versions = DocumentVersion.objects.bulk_create([
+        DocumentVersion(
+            document=document, number=1, file=document.file.name, file_type=document.file_type,
+            file_size=document.file_size, extraction_status=document.extraction_status,
+            extraction_error=document.extraction_error,
+            page_count=len(result.pages or []) if result else 0,
+            pages_extracted=len(result.pages or []) if result else 0,
+        )
+        for document, result in entries
+    ])
+    pages = []
+    for version, (_, result) in zip(versions, entries):
+        if result is not None and result.ok:
+            pages.extend(_pages(version, result.pages))
+    DocumentPage.objects.bulk_create(pages, batch_size=PAGE_BATCH_SIZE)
+
+
+def known_pages(document: Document) -> Dict[str, str]:
+    """Text of the current version's pages by content hash"""
+    rows = DocumentPage.objects.filter(
+        version__document=document, version__number=document.version
+    ).exclude(content_hash='').values_list('content_hash', 'text')
+    return {content_hash: str(text) for content_hash, text in rows}
+
+
+def _backfill_first_version(document: Document) -> DocumentVersion:
+    """Keep the file and text of a document uploaded before versioning as its version 1"""
+    version = DocumentVersion.objects.create(
+        document=document, number=document.version, file=document.file.name, file_type=document.file_type,
+        file_size=document.file_size, extraction_status=document.extraction_status,
+        extraction_error=document.extraction_error, page_count=1,
+    )
+    # The page boundaries are unknown, so nothing of it can be reused
+    DocumentPage.objects.create(version=version, number=0, content_hash='', text=document.extracted_text)
+    return version
+
+
+def add_version(document: Document, uploaded_file) -> Tuple[DocumentVersion, Document]:
+    """
+    Ingest a revised file as the document's next version.
+
+    Every page is hashed, but only pages whose hash is not among the
+    current version's pages are extracted (and OCRed); the others reuse the
+    stored text. The previous versions keep their files and pages. If
+    extraction fails the version is recorded with its failure class and the
+    document stays on its current version.
+
+    Returns:
+        Tuple of (new version, updated document)
+    """
+    known = known_pages(document)
+    result = extract_document(uploaded_file, known_pages=known.keys())
+    if result.status == 'unsupported':
+        raise VersionError(result.error)
+
+    pages = result.pages if result.ok else []
+    texts = [page['text'] if 'text' in page else known[page['hash']] for page in pages]
+    text = '\n'.join(texts).strip()
+
+    with transaction.atomic():
+        document = Document.objects.select_for_update().get(id=document.id)
+        previous = document.versions.order_by('-number').first() or _backfill_first_version(document)
+        version = DocumentVersion(
+            document=document, number=previous.number + 1, file_type=result.file_type,
+            file_size=uploaded_file.size, extraction_status=result.status, extraction_error=result.error,
+            page_count=len(pages), pages_extracted=sum('text' in page for page in pages),
+        )
+        uploaded_file.seek(0)
+        version.file.save(os.path.basename(uploaded_file.name), uploaded_file, save=False)
+        version.save()
+        DocumentPage.objects.bulk_create(_pages(version, pages, texts), batch_size=PAGE_BATCH_SIZE)
+
+        if result.ok:
+            text_changed = text != document.extracted_text
+            document.file = version.file.name
+            document.file_size = version.file_size
+            document.file_type = version.file_type
+            document.extraction_status = 'ok'
+            document.extraction_error = ''
+            document.version = version.number
+            # Also what moves the document list's ETag (see conditional.documents_list_etag)
+            document.updated_at = timezone.now()
+            if text_changed:
+                document.extracted_text = text
+                document.summary_status = 'pending'
+            document.save()
+            if text_changed:
+                # The save signals only index and summarise new documents
+                index_document(document)
+                schedule_summaries([document.id])
+    return version, document
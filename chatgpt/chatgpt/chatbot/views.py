@@ -1,20 +1,40 @@
 import json
 import uuid
-import google.generativeai as genai
-from django.conf import settings
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import require_http_methods, etag
+from django.views.decorators.cache import cache_control
 from django.urls import reverse
-from django.db import models
+from django.db import models, transaction
 from django.core.files.storage import default_storage
-from .models import ChatRecord, Conversation, Document
+from django.conf import settings
+from .models import ChatRecord, Conversation, Document, DocumentVersion, UploadSession, UserMemory
 from .document_processor import DocumentProcessor
+from .sandbox import extract_document
+from .chat_service import (
+    ChatError, build_prompt, check_backend, finish_turn, generate_response, request_kind, start_turn,
+    summarize_context
+)
+from .conditional import conversations_list_etag, conversation_etag, documents_list_etag
+from .sync import get_changes, get_current_cursor, needs_reset
+from .search_index import is_supported as search_is_supported, search as search_turns, search_sheets
+from .data_transfer import iter_export_records, iter_ndjson, import_ndjson
+from .bulk_upload import process_bulk_upload
+from .chunked_upload import (
+    ChunkedUploadError, init_upload, parse_content_range, write_chunk, complete_upload
+)
+from .access_tracking import touch_document
+from .static_assets import asset_version
+from .usage import conversation_usage, user_usage
+from .idempotency import idempotent
+from .versions import VersionError, add_version, record_initial_versions
+from .purge import soft_delete
+from .api_tokens import TokenError, issue_tokens, refresh_tokens, revoke_token, revoke_user_tokens, verify_token
 
 
 def home(request):
@@ -25,7 +45,11 @@ def home(request):
 @login_required
 def chat(request):
     """Render the main chat page - only for authenticated users"""
-    return render(request, 'chat.html')
+    # The page has no per-user content, so its markup is cached as one fragment per asset build
+    return render(request, 'chat.html', {
+        'shell_cache_seconds': getattr(settings, 'CHAT_SHELL_CACHE_SECONDS', 3600),
+        'asset_version': asset_version(),
+    })
 
 
 def login_view(request):
@@ -101,6 +125,90 @@ def logout_view(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+def issue_api_token(request):
+    """Issue an API token pair for a username and password, or for the logged-in session"""
+    try:
+        data = json.loads(request.body or b'{}')
+        username = data.get('username')
+        password = data.get('password')
+        
+        if username or password:
+            user = authenticate(request, username=username, password=password)
+            if user is None:
+                return JsonResponse({'error': 'Invalid username or password'}, status=401)
+        elif request.user.is_authenticated and getattr(request, 'auth_token', None) is None:
+            user = request.user
+        else:
+            # A token cannot mint another pair, or revoking all of them would not stop it
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        return JsonResponse({**issue_tokens(user), 'status': 'success'})
+        
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def refresh_api_token(request):
+    """Exchange a refresh token for a new token pair"""
+    try:
+        data = json.loads(request.body or b'{}')
+        refresh_token = data.get('refresh_token', '')
+        
+        if not refresh_token:
+            return JsonResponse({'error': 'refresh_token is required'}, status=400)
+        
+        return JsonResponse({**refresh_tokens(refresh_token), 'status': 'success'})
+        
+    except TokenError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def revoke_api_token(request):
+    """Revoke one of the user's tokens, or with "all" every token issued to them so far"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        data = json.loads(request.body or b'{}')
+        
+        if data.get('all'):
+            revoke_user_tokens(request.user.id)
+            return JsonResponse({'status': 'success'})
+        
+        token = data.get('token', '')
+        if not token:
+            return JsonResponse({'error': 'token is required'}, status=400)
+        
+        try:
+            claims = verify_token(token, kind=None)
+        except TokenError:
+            # Already unusable
+            return JsonResponse({'status': 'success'})
+        if claims['uid'] != request.user.id:
+            return JsonResponse({'error': 'Token not found'}, status=404)
+        
+        revoke_token(claims)
+        return JsonResponse({'status': 'success'})
+        
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@idempotent
 def chat_api(request):
     """Handle chat API requests with contextual conversation"""
     try:
@@ -114,80 +222,17 @@ def chat_api(request):
         if not request.user.is_authenticated:
             return JsonResponse({'error': 'User must be authenticated'}, status=401)
         
-        # Configure Gemini API
-        if not settings.GEMINI_API_KEY:
-            return JsonResponse({'error': 'Gemini API key not configured'}, status=500)
+        check_backend()
+        conversation, is_new = start_turn(request.user, user_message, conversation_id)
+        full_prompt, context_text, message_count = build_prompt(request.user, conversation, user_message)
         
-        genai.configure(api_key=settings.GEMINI_API_KEY)
+        # The router picks a model tier and enforces the deadline
+        bot_response = generate_response(
+            full_prompt, request_kind(user_message), request.user.id, conversation.id
+        ).text
+        context_summary = summarize_context(context_text, message_count, request.user.id, conversation.id)
         
-        # Get or create conversation
-        if conversation_id:
-            try:
-                conversation = Conversation.objects.get(id=conversation_id, user=request.user)
-            except Conversation.DoesNotExist:
-                return JsonResponse({'error': 'Conversation not found'}, status=404)
-        else:
-            # Create new conversation
-            title = user_message[:50] + ('...' if len(user_message) > 50 else '')
-            conversation = Conversation.create_new_conversation(
-                user=request.user,
-                title=title,
-                first_user_message=user_message,
-                first_bot_response="",  # Will be filled after AI response
-                context_summary=None
-            )
-        
-        # Get conversation context for AI
-        context_text = ""
-        messages = conversation.get_messages()
-        if len(messages) > 1:  # More than just the current message
-            context_text = "Previous conversation context:\n"
-            for msg in messages[:-1]:  # Exclude the current message
-                context_text += f"User: {msg['user_message']}\n"
-                context_text += f"Assistant: {msg['bot_response']}\n\n"
-        
-        # Check if user wants to analyze uploaded documents
-        document_context = ""
-        if any(keyword in user_message.lower() for keyword in ['document', 'file', 'pdf', 'docx', 'summarize', 'analyze', 'extract']):
-            # Get user's recent documents
-            recent_docs = Document.objects.filter(user=request.user).order_by('-last_accessed')[:3]
-            if recent_docs:
-                document_context = "\n\nAvailable Documents:\n"
-                for doc in recent_docs:
-                    document_context += f"- {doc.title} ({doc.file_type}, {doc.get_file_size_mb()}MB)\n"
-                    document_context += f"Content preview: {doc.extracted_text[:1000]}...\n\n"
-        
-        # Create the full prompt with context
-        full_prompt = f"{context_text}{document_context}Current user message: {user_message}"
-        
-        # Initialize the model
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        # Generate response with context
-        response = model.generate_content(full_prompt)
-        bot_response = response.text if response.text else "I'm sorry, I couldn't generate a response."
-        
-        # Generate context summary for long conversations
-        context_summary = None
-        if len(messages) > 5:  # Generate summary for conversations with more than 5 exchanges
-            summary_prompt = f"Please provide a brief summary of this conversation context: {context_text}"
-            try:
-                summary_response = model.generate_content(summary_prompt)
-                context_summary = summary_response.text if summary_response.text else None
-            except:
-                context_summary = None
-        
-        # Update conversation with the new message exchange
-        if conversation_id:
-            # Add to existing conversation
-            conversation.add_message(user_message, bot_response, context_summary)
-        else:
-            # Update the new conversation with the bot response
-            conversation_data = conversation.full_conversation
-            conversation_data[0]['bot_response'] = bot_response
-            conversation_data[0]['context_summary'] = context_summary
-            conversation.full_conversation = conversation_data
-            conversation.save()
+        finish_turn(conversation, is_new, user_message, bot_response, context_summary)
         
         return JsonResponse({
             'response': bot_response,
@@ -195,6 +240,8 @@ def chat_api(request):
             'status': 'success'
         })
         
+    except ChatError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON data'}, status=400)
     except Exception as e:
@@ -235,6 +282,8 @@ def chat_history(request):
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@cache_control(private=True, no_cache=True)
+@etag(conversations_list_etag)
 def conversations_list(request):
     """Get list of all conversations for the user"""
     try:
@@ -273,6 +322,8 @@ def conversations_list(request):
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@cache_control(private=True, no_cache=True)
+@etag(conversation_etag)
 def get_conversation(request, conversation_id):
     """Get a specific conversation by ID"""
     try:
@@ -300,6 +351,57 @@ def get_conversation(request, conversation_id):
         return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
 
 
+@csrf_exempt
+@require_http_methods(["GET"])
+def search_conversations(request):
+    """Full-text search across the user's conversation history, or the sheets of their spreadsheets"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        if not search_is_supported():
+            return JsonResponse({'error': 'Search is not available on this database backend'}, status=501)
+        
+        query = request.GET.get('q', '').strip()
+        if not query:
+            return JsonResponse({'error': 'Search query cannot be empty'}, status=400)
+        
+        try:
+            page = max(1, int(request.GET.get('page', 1)))
+            page_size = min(100, max(1, int(request.GET.get('page_size', 20))))
+        except ValueError:
+            return JsonResponse({'error': 'page and page_size must be integers'}, status=400)
+        
+        scope = request.GET.get('scope', 'conversations')
+        if scope == 'spreadsheets':
+            found = search_sheets(request.user, query, page=page, page_size=page_size)
+            document_ids = {result['document_id'] for result in found['results']}
+            titles = dict(Document.objects.filter(id__in=document_ids, user=request.user).values_list('id', 'title'))
+            for result in found['results']:
+                result['document_title'] = titles.get(result['document_id'], '')
+            return JsonResponse({**found, 'query': query, 'scope': scope, 'status': 'success'})
+        if scope != 'conversations':
+            return JsonResponse({'error': 'scope must be conversations or spreadsheets'}, status=400)
+        
+        found = search_turns(request.user, query, page=page, page_size=page_size)
+        
+        conversation_ids = {result['conversation_id'] for result in found['results']}
+        titles = dict(
+            Conversation.objects.filter(id__in=conversation_ids, user=request.user).values_list('id', 'title')
+        )
+        for result in found['results']:
+            result['conversation_title'] = titles.get(result['conversation_id'], '')
+        
+        return JsonResponse({
+            **found,
+            'query': query,
+            'status': 'success'
+        })
+        
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
 @csrf_exempt
 @require_http_methods(["DELETE"])
 def delete_conversation(request, conversation_id):
@@ -309,8 +411,9 @@ def delete_conversation(request, conversation_id):
             return JsonResponse({'error': 'User must be authenticated'}, status=401)
         
         try:
-            conversation = Conversation.objects.get(id=conversation_id, user=request.user)
-            conversation.delete()
+            conversation = Conversation.objects.only('id', 'title').get(id=conversation_id, user=request.user)
+            # Hidden at once; the row is purged in the background
+            soft_delete(Conversation.objects.filter(id=conversation.id))
             
             return JsonResponse({
                 'message': f'Deleted conversation "{conversation.title}"',
@@ -323,6 +426,119 @@ def delete_conversation(request, conversation_id):
         return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
 
 
+@csrf_exempt
+@require_http_methods(["GET"])
+def token_usage(request):
+    """Return the user's token usage per day and model, optionally with one conversation's totals"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        try:
+            days = int(request.GET.get('days', 30))
+            conversation_id = request.GET.get('conversation_id')
+            conversation_id = int(conversation_id) if conversation_id else None
+        except ValueError:
+            return JsonResponse({'error': 'days and conversation_id must be integers'}, status=400)
+        if not 1 <= days <= 366:
+            return JsonResponse({'error': 'days must be between 1 and 366'}, status=400)
+        
+        data = user_usage(request.user, days)
+        if conversation_id is not None:
+            conversation = Conversation.objects.filter(id=conversation_id, user=request.user).first()
+            if conversation is None:
+                return JsonResponse({'error': 'Conversation not found'}, status=404)
+            data['conversation'] = {'id': conversation.id, **conversation_usage(conversation)}
+        
+        return JsonResponse({**data, 'status': 'success'})
+        
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def get_memories(request):
+    """List what the assistant remembers about the user, newest first"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        memories = UserMemory.objects.filter(user=request.user).values('id', 'text', 'conversation_id', 'created_at')
+        memories_data = [
+            {
+                'id': memory['id'],
+                'text': memory['text'],
+                'conversation_id': memory['conversation_id'],
+                'created_at': memory['created_at'].isoformat(),
+            }
+            for memory in memories
+        ]
+        
+        return JsonResponse({
+            'memories': memories_data,
+            'status': 'success'
+        })
+        
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["DELETE"])
+def delete_memory(request, memory_id):
+    """Forget one remembered fact"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        deleted, _ = UserMemory.objects.filter(id=memory_id, user=request.user).delete()
+        if not deleted:
+            return JsonResponse({'error': 'Memory not found'}, status=404)
+        
+        return JsonResponse({
+            'message': 'Memory deleted',
+            'status': 'success'
+        })
+        
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def sync_changes(request):
+    """Return conversation and document changes since a cursor; /ws/chat/ pushes them instead"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        since = request.GET.get('since')
+        try:
+            since = int(since) if since not in [None, ''] else None
+        except ValueError:
+            return JsonResponse({'error': 'since must be a number'}, status=400)
+        
+        # Without a usable cursor the client must refetch the lists and start from the current version
+        if since is None or since < 0 or needs_reset(since):
+            return JsonResponse({
+                'changes': [],
+                'cursor': get_current_cursor(request.user),
+                'has_more': False,
+                'reset': True,
+                'status': 'success'
+            })
+        
+        return JsonResponse({
+            **get_changes(request.user, since),
+            'reset': False,
+            'status': 'success'
+        })
+        
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def clear_chat(request):
@@ -349,8 +565,23 @@ def clear_chat(request):
         return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
 
 
+def _check_upload(uploaded_file):
+    """Error response for an upload that is too large or of an unsupported type, else None"""
+    # Check file size (limit to 10MB)
+    if uploaded_file.size > 10 * 1024 * 1024:
+        return JsonResponse({'error': 'File size too large. Maximum 10MB allowed.'}, status=400)
+    
+    # Check if file type is supported
+    if not DocumentProcessor.is_file_type_supported(uploaded_file.name):
+        return JsonResponse({
+            'error': f'Unsupported file type. Supported types: {", ".join(DocumentProcessor.get_supported_file_types())}'
+        }, status=400)
+    return None
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
+@idempotent
 def upload_document(request):
     """Handle document upload and text extraction"""
     try:
@@ -361,48 +592,189 @@ def upload_document(request):
             return JsonResponse({'error': 'No file provided'}, status=400)
         
         uploaded_file = request.FILES['file']
+        invalid = _check_upload(uploaded_file)
+        if invalid:
+            return invalid
         
-        # Check file size (limit to 10MB)
-        if uploaded_file.size > 10 * 1024 * 1024:
-            return JsonResponse({'error': 'File size too large. Maximum 10MB allowed.'}, status=400)
+        # Extract text from document in a resource-limited sandbox, keeping page hashes for later versions
+        result = extract_document(uploaded_file, known_pages=())
         
-        # Check if file type is supported
-        if not DocumentProcessor.is_file_type_supported(uploaded_file.name):
-            return JsonResponse({
-                'error': f'Unsupported file type. Supported types: {", ".join(DocumentProcessor.get_supported_file_types())}'
-            }, status=400)
-        
-        # Extract text from document
-        extracted_text, file_type = DocumentProcessor.extract_text_from_file(uploaded_file)
-        
-        if file_type == 'error':
-            return JsonResponse({'error': f'Error processing file: {extracted_text}'}, status=400)
+        if result.status == 'unsupported':
+            return JsonResponse({'error': result.error}, status=400)
         
-        # Create document record
+        # Create document record; failed extractions are kept with their failure class
         document = Document.objects.create(
             user=request.user,
             title=uploaded_file.name,
             file=uploaded_file,
-            file_type=file_type,
-            extracted_text=extracted_text,
-            file_size=uploaded_file.size
+            file_type=result.file_type,
+            extracted_text=result.text,
+            file_size=uploaded_file.size,
+            extraction_status=result.status,
+            extraction_error=result.error
         )
+        record_initial_versions([(document, result)])
+        
+        if not result.ok:
+            return JsonResponse({
+                'error': f'Error processing file: {result.error}',
+                'extraction_status': result.status,
+                'document_id': document.id
+            }, status=422)
         
         return JsonResponse({
             'document_id': document.id,
             'title': document.title,
-            'file_type': file_type,
+            'file_type': result.file_type,
+            'file_size_mb': document.get_file_size_mb(),
+            'extracted_text_preview': result.text[:500] + ('...' if len(result.text) > 500 else ''),
+            'status': 'success'
+        })
+        
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def upload_documents_bulk(request):
+    """Handle upload of many files or a zip/tar archive, extracting them in parallel"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        uploaded_files = request.FILES.getlist('files') + request.FILES.getlist('file')
+        if not uploaded_files:
+            return JsonResponse({'error': 'No files provided'}, status=400)
+        
+        manifest = process_bulk_upload(request.user, uploaded_files)
+        succeeded = sum(1 for entry in manifest if entry['status'] == 'success')
+        
+        return JsonResponse({
+            'results': manifest,
+            'total': len(manifest),
+            'succeeded': succeeded,
+            'failed': len(manifest) - succeeded,
+            'status': 'success'
+        })
+        
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+def _upload_session_data(session):
+    """Serialize an upload session for the resumable upload API"""
+    return {
+        'upload_id': str(session.id),
+        'file_name': session.file_name,
+        'total_size': session.total_size,
+        'chunk_size': session.chunk_size,
+        'total_chunks': session.get_total_chunks(),
+        'missing_chunks': session.get_missing_chunks(),
+        'upload_status': session.status,
+        'document_id': session.document_id,
+    }
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def chunked_upload_init(request):
+    """Start a resumable chunked upload"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        data = json.loads(request.body)
+        session = init_upload(
+            request.user,
+            file_name=data.get('file_name', ''),
+            total_size=int(data.get('total_size', 0)),
+            chunk_size=int(data.get('chunk_size') or 0) or None,
+            sha256=data.get('sha256', ''),
+        )
+        
+        return JsonResponse({**_upload_session_data(session), 'status': 'success'}, status=201)
+        
+    except ChunkedUploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "PUT"])
+def chunked_upload_session(request, upload_id):
+    """Get upload progress (GET) or upload one chunk identified by Content-Range (PUT)"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        try:
+            session = UploadSession.objects.get(id=upload_id, user=request.user)
+        except UploadSession.DoesNotExist:
+            return JsonResponse({'error': 'Upload not found'}, status=404)
+        
+        if request.method == 'PUT':
+            index = parse_content_range(request.headers.get('Content-Range'), session)
+            chunk_sha256 = write_chunk(session, index, request, request.headers.get('X-Chunk-SHA256', ''))
+            return JsonResponse({
+                **_upload_session_data(session),
+                'chunk': index,
+                'chunk_sha256': chunk_sha256,
+                'status': 'success'
+            })
+        
+        return JsonResponse({**_upload_session_data(session), 'status': 'success'})
+        
+    except ChunkedUploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def chunked_upload_complete(request, upload_id):
+    """Assemble a fully uploaded file, extract its text and create the Document"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        try:
+            session = UploadSession.objects.get(id=upload_id, user=request.user)
+        except UploadSession.DoesNotExist:
+            return JsonResponse({'error': 'Upload not found'}, status=404)
+        
+        document = complete_upload(session)
+        if document.extraction_status != 'ok':
+            return JsonResponse({
+                'error': f'Error processing file: {document.extraction_error}',
+                'extraction_status': document.extraction_status,
+                'document_id': document.id
+            }, status=422)
+        extracted_text = document.extracted_text
+        
+        return JsonResponse({
+            'document_id': document.id,
+            'title': document.title,
+            'file_type': document.file_type,
             'file_size_mb': document.get_file_size_mb(),
             'extracted_text_preview': extracted_text[:500] + ('...' if len(extracted_text) > 500 else ''),
             'status': 'success'
         })
         
+    except ChunkedUploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
     except Exception as e:
         return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
 
 
 @csrf_exempt
 @require_http_methods(["GET"])
+@cache_control(private=True, no_cache=True)
+@etag(documents_list_etag)
 def get_documents(request):
     """Get list of user's uploaded documents"""
     try:
@@ -420,7 +792,9 @@ def get_documents(request):
                 'file_size_mb': doc.get_file_size_mb(),
                 'upload_date': doc.upload_date.isoformat(),
                 'last_accessed': doc.last_accessed.isoformat(),
-                'extracted_text_preview': doc.extracted_text[:200] + ('...' if len(doc.extracted_text) > 200 else '')
+                'extraction_status': doc.extraction_status,
+                'version': doc.version,
+                'extracted_text_preview': doc.get_text_preview(200)
             })
         
         return JsonResponse({
@@ -445,8 +819,8 @@ def get_document(request, document_id):
         except Document.DoesNotExist:
             return JsonResponse({'error': 'Document not found'}, status=404)
         
-        # Update last accessed time
-        document.save()
+        # Recorded in memory and written in a later batch, so the read takes no write lock
+        document.last_accessed = touch_document(document.id)
         
         return JsonResponse({
             'document': {
@@ -455,6 +829,9 @@ def get_document(request, document_id):
                 'file_type': document.file_type,
                 'file_size_mb': document.get_file_size_mb(),
                 'extracted_text': document.extracted_text,
+                'extraction_status': document.extraction_status,
+                'extraction_error': document.extraction_error,
+                'version': document.version,
                 'upload_date': document.upload_date.isoformat(),
                 'last_accessed': document.last_accessed.isoformat()
             },
@@ -465,6 +842,115 @@ def get_document(request, document_id):
         return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
 
 
+def _version_data(version):
+    return {
+        'number': version.number,
+        'file_type': version.file_type,
+        'file_size_mb': round(version.file_size / (1024 * 1024), 2),
+        'extraction_status': version.extraction_status,
+        'page_count': version.page_count,
+        'pages_extracted': version.pages_extracted,
+        'created_at': version.created_at.isoformat(),
+    }
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def document_versions(request, document_id):
+    """List the versions of a document, newest first"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        document = Document.objects.filter(id=document_id, user=request.user).only('id', 'version').first()
+        if document is None:
+            return JsonResponse({'error': 'Document not found'}, status=404)
+        
+        versions = [_version_data(version) for version in document.versions.order_by('-number')]
+        if not versions:
+            # Uploaded before versioning: the document itself is its only version
+            versions = [{'number': document.version, 'page_count': None}]
+        
+        return JsonResponse({
+            'document_id': document.id,
+            'current_version': document.version,
+            'versions': versions,
+            'status': 'success'
+        })
+        
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def get_document_version(request, document_id, number):
+    """Get the extracted text of one version of a document"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        version = DocumentVersion.objects.filter(
+            document_id=document_id, document__user=request.user, number=number
+        ).first()
+        if version is None:
+            return JsonResponse({'error': 'Version not found'}, status=404)
+        
+        return JsonResponse({
+            'document_id': version.document_id,
+            'version': {**_version_data(version), 'extracted_text': version.get_text()},
+            'status': 'success'
+        })
+        
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@idempotent
+def upload_document_version(request, document_id):
+    """Upload a revised file as a new version, re-extracting only the pages that changed"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        if 'file' not in request.FILES:
+            return JsonResponse({'error': 'No file provided'}, status=400)
+        
+        document = Document.objects.filter(id=document_id, user=request.user).first()
+        if document is None:
+            return JsonResponse({'error': 'Document not found'}, status=404)
+        
+        uploaded_file = request.FILES['file']
+        invalid = _check_upload(uploaded_file)
+        if invalid:
+            return invalid
+        
+        version, document = add_version(document, uploaded_file)
+        
+        if version.extraction_status != 'ok':
+            return JsonResponse({
+                'error': f'Error processing file: {version.extraction_error}',
+                'extraction_status': version.extraction_status,
+                'document_id': document.id,
+                'version': version.number
+            }, status=422)
+        
+        return JsonResponse({
+            'document_id': document.id,
+            'version': _version_data(version),
+            'pages_reused': version.page_count - version.pages_extracted,
+            'extracted_text_preview': document.get_text_preview(500),
+            'status': 'success'
+        })
+        
+    except VersionError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
 @csrf_exempt
 @require_http_methods(["DELETE"])
 def delete_document(request, document_id):
@@ -474,8 +960,9 @@ def delete_document(request, document_id):
             return JsonResponse({'error': 'User must be authenticated'}, status=401)
         
         try:
-            document = Document.objects.get(id=document_id, user=request.user)
-            document.delete()
+            document = Document.objects.only('id', 'title').get(id=document_id, user=request.user)
+            # Hidden at once; the row and its files are purged in the background
+            soft_delete(Document.objects.filter(id=document.id))
             
             return JsonResponse({
                 'message': f'Deleted document "{document.title}"',
@@ -486,3 +973,50 @@ def delete_document(request, document_id):
         
     except Exception as e:
         return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def export_data(request):
+    """Stream the user's conversations and documents as NDJSON (optionally gzipped)"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        compress = request.GET.get('gzip', '').lower() in ['1', 'true', 'yes']
+        filename = f"{request.user.username}-export.ndjson" + ('.gz' if compress else '')
+        
+        response = StreamingHttpResponse(
+            iter_ndjson(iter_export_records(request.user), compress=compress),
+            content_type='application/gzip' if compress else 'application/x-ndjson'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+        
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def import_data(request):
+    """Import an NDJSON (or gzipped NDJSON) export into the user's account"""
+    try:
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'User must be authenticated'}, status=401)
+        
+        if 'file' not in request.FILES:
+            return JsonResponse({'error': 'No file provided'}, status=400)
+        
+        with transaction.atomic():
+            counts = import_ndjson(request.user, request.FILES['file'])
+        
+        return JsonResponse({
+            'imported': counts,
+            'status': 'success'
+        })
+        
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
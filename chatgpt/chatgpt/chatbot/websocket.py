@@ -0,0 +1,428 @@
+"""
+WebSocket chat transport: one authenticated connection carrying many conversations
+
+Client messages (JSON text frames):
+
+- ``{"type": "chat", "request_id": "...", "message": "...", "conversation_id": 12}``
+- ``{"type": "cancel", "request_id": "..."}``
+- ``{"type": "ping"}``
+
+Server messages: ``chat.start``, ``chat.token``, ``chat.done``, ``chat.cancelled``,
+``error``, ``pong``, plus pushed ``sync`` batches (the same changes as
+``/api/sync/``) and ``event`` notifications such as ``document.ready``.
+"""
+import asyncio
+import json
+import threading
+import uuid
+from datetime import datetime
+from http.cookies import CookieError, SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from typing import Optional
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import chat_service
+from .sync import get_changes, get_current_cursor
+
+WEBSOCKET_PATH = getattr(settings, 'CHAT_WEBSOCKET_PATH', '/ws/chat/')
+SEND_QUEUE_SIZE = getattr(settings, 'CHAT_WEBSOCKET_SEND_QUEUE_SIZE', 64)
+SLOW_CLIENT_TIMEOUT = getattr(settings, 'CHAT_WEBSOCKET_SLOW_CLIENT_TIMEOUT', 10)
+MAX_CONCURRENT_TURNS = getattr(settings, 'CHAT_WEBSOCKET_MAX_CONCURRENT_TURNS', 4)
+EVENT_POLL_INTERVAL = getattr(settings, 'CHAT_WEBSOCKET_EVENT_INTERVAL', 2.0)
+MAX_MESSAGE_SIZE = 64 * 1024
+
+CLOSE_NORMAL = 1000
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+
+
+class SlowClient(Exception):
+    """The client stopped reading and its send queue stayed full"""
+
+
+def database(func):
+    """
+    Run ORM work in Django's sync thread.
+
+    Stale connections are discarded around each call, as the request cycle
+    would do, since a WebSocket connection can stay open for hours.
+    """
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run)
+
+
+def _header(scope, name: bytes) -> str:
+    values = [value.decode('latin-1') for key, value in scope.get('headers', []) if key == name]
+    return '; '.join(values)
+
+
+def origin_allowed(scope) -> bool:
+    """
+    Reject cross-site connections, since the session cookie is sent with them.
+
+    Connections without an Origin header come from non-browser clients.
+    """
+    origin = _header(scope, b'origin')
+    if not origin:
+        return True
+    if origin in getattr(settings, 'CORS_ALLOWED_ORIGINS', []):
+        return True
+    return urlsplit(origin).netloc == _header(scope, b'host')
+
+
+def _load_user(session_key: str):
+    engine = import_module(settings.SESSION_ENGINE)
+    user = get_user(SimpleNamespace(session=engine.SessionStore(session_key)))
+    return user if user.is_authenticated else None
+
+
+def session_key(scope) -> Optional[str]:
+    """Session key from the cookie of the handshake request"""
+    cookie = SimpleCookie()
+    try:
+        cookie.load(_header(scope, b'cookie'))
+    except CookieError:
+        return None
+    morsel = cookie.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None or not morsel.value:
+        return None
+    return morsel.value
+
+
+async def authenticate(key: Optional[str]):
+    """
+    Resolve the user of a session.
+
+    Returns None once the session has ended (logout, password change) or
+    the user has been deactivated, which is also what deleting one does.
+    """
+    if key is None:
+        return None
+    return await database(_load_user)(key)
+
+
+class ChatConnection:
+    """
+    State of one WebSocket connection.
+
+    All outgoing frames go through a bounded queue drained by a single
+    writer. Producers wait when it is full, so token generation slows down
+    to the pace of the client; a client that does not drain the queue
+    within ``SLOW_CLIENT_TIMEOUT`` seconds is disconnected.
+    """
+
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.session_key = session_key(scope)
+        self.user = None
+        self.outbox = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.turns = {}
+        self.cancel_requested = set()
+        self.conversation_locks = {}
+        self.aborted = asyncio.Event()
+        self.close_code = CLOSE_NORMAL
+        self.client_gone = False
+        self.connected_at = timezone.now()
+
+    async def run(self):
+        message = await self.receive()
+        if message['type'] != 'websocket.connect':
+            return
+
+        if self.scope.get('path') != WEBSOCKET_PATH:
+            await self.send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+            return
+        if not origin_allowed(self.scope):
+            await self.send({'type': 'websocket.close', 'code': CLOSE_POLICY_VIOLATION})
+            return
+
+        self.user = await authenticate(self.session_key)
+        if self.user is None:
+            await self.send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+            return
+        await self.send({'type': 'websocket.accept'})
+
+        reader = asyncio.create_task(self._read_loop())
+        tasks = [
+            reader,
+            asyncio.create_task(self._write_loop()),
+            asyncio.create_task(self._event_loop()),
+            asyncio.create_task(self.aborted.wait()),
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            pending = tasks + list(self.turns.values())
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if not self.client_gone:
+            # Closing from our side (slow client or a failure); the client is still there
+            try:
+                await self.send({'type': 'websocket.close', 'code': self.close_code})
+            except Exception:
+                pass
+
+    async def still_authenticated(self) -> bool:
+        """
+        Re-check the session before each turn and event tick.
+
+        The handshake alone would keep serving a user who has logged out,
+        been deactivated or been deleted for as long as the socket stays open.
+        """
+        user = await authenticate(self.session_key)
+        if user is None or user.id != self.user.id:
+            self.abort(CLOSE_UNAUTHORIZED)
+            return False
+        self.user = user
+        return True
+
+    def abort(self, code: int) -> None:
+        """Close the connection from the server side"""
+        if not self.aborted.is_set():
+            self.close_code = code
+            self.aborted.set()
+
+    async def emit(self, payload: dict) -> None:
+        """Queue a frame for the client, waiting while its queue is full"""
+        try:
+            self.outbox.put_nowait(payload)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self.outbox.put(payload), SLOW_CLIENT_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise SlowClient()
+
+    async def emit_error(self, error: str, request_id: Optional[str] = None, status: int = 400) -> None:
+        payload = {'type': 'error', 'error': error, 'status': status}
+        if request_id is not None:
+            payload['request_id'] = request_id
+        await self.emit(payload)
+
+    async def _write_loop(self):
+        while True:
+            payload = await self.outbox.get()
+            await self.send({'type': 'websocket.send', 'text': json.dumps(payload)})
+
+    async def _read_loop(self):
+        while True:
+            message = await self.receive()
+            if message['type'] == 'websocket.disconnect':
+                self.client_gone = True
+                return
+            if message['type'] != 'websocket.receive':
+                continue
+
+            try:
+                await self._handle_frame(message)
+            except SlowClient:
+                self.abort(CLOSE_TRY_AGAIN_LATER)
+                return
+
+    async def _handle_frame(self, message: dict):
+        text = message.get('text')
+        if text is None:
+            await self.emit_error('Binary frames are not supported')
+            return
+        if len(text) > MAX_MESSAGE_SIZE:
+            await self.emit_error('Message too large', status=413)
+            return
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            await self.emit_error('Invalid JSON data')
+            return
+        if not isinstance(data, dict):
+            await self.emit_error('Invalid JSON data')
+            return
+
+        message_type = data.get('type')
+        if message_type == 'ping':
+            await self.emit({'type': 'pong'})
+        elif message_type == 'chat':
+            await self._start_turn(data)
+        elif message_type == 'cancel':
+            request_id = str(data.get('request_id', ''))
+            task = self.turns.get(request_id)
+            if task is None:
+                await self.emit_error('Unknown request', request_id=request_id, status=404)
+            else:
+                self.cancel_requested.add(request_id)
+                task.cancel()
+        else:
+            await self.emit_error(f'Unknown message type: {message_type}')
+
+    async def _start_turn(self, data: dict):
+        request_id = str(data.get('request_id') or uuid.uuid4().hex)
+        user_message = str(data.get('message') or '').strip()
+        conversation_id = data.get('conversation_id')
+
+        if not user_message:
+            await self.emit_error('Message cannot be empty', request_id=request_id)
+            return
+        if request_id in self.turns:
+            await self.emit_error('Duplicate request_id', request_id=request_id, status=409)
+            return
+        if len(self.turns) >= MAX_CONCURRENT_TURNS:
+            await self.emit_error('Too many concurrent requests', request_id=request_id, status=429)
+            return
+
+        if not await self.still_authenticated():
+            return
+
+        task = asyncio.create_task(self._run_turn(request_id, user_message, conversation_id))
+        self.turns[request_id] = task
+        task.add_done_callback(lambda _: self.turns.pop(request_id, None))
+
+    async def _run_turn(self, request_id: str, user_message: str, conversation_id):
+        conversation = None
+        try:
+            await sync_to_async(chat_service.check_backend, thread_sensitive=False)()
+            conversation, is_new = await database(chat_service.start_turn)(self.user, user_message, conversation_id)
+
+            # Turns of the same conversation are applied one after another
+            lock = self._acquire_conversation_lock(conversation.id)
+            contended = lock.locked()
+            try:
+                async with lock:
+                    if contended:
+                        await database(conversation.refresh_from_db)()
+                    await self.emit({'type': 'chat.start', 'request_id': request_id, 'conversation_id': conversation.id})
+
+                    full_prompt, context_text, message_count = await database(chat_service.build_prompt)(
+                        self.user, conversation, user_message
+                    )
+                    kind = chat_service.request_kind(user_message)
+                    bot_response = await self._stream(request_id, conversation.id, full_prompt, kind)
+                    context_summary = await sync_to_async(chat_service.summarize_context, thread_sensitive=False)(
+                        context_text, message_count, self.user.id, conversation.id
+                    )
+                    await database(chat_service.finish_turn)(
+                        conversation, is_new, user_message, bot_response, context_summary
+                    )
+            finally:
+                self._release_conversation_lock(conversation.id)
+
+            await self.emit({
+                'type': 'chat.done',
+                'request_id': request_id,
+                'conversation_id': conversation.id,
+                'response': bot_response,
+            })
+        except asyncio.CancelledError:
+            if request_id in self.cancel_requested:
+                self.cancel_requested.discard(request_id)
+                await self._emit_quietly({
+                    'type': 'chat.cancelled',
+                    'request_id': request_id,
+                    'conversation_id': conversation.id if conversation else None,
+                })
+                return
+            raise
+        except SlowClient:
+            self.abort(CLOSE_TRY_AGAIN_LATER)
+        except chat_service.ChatError as e:
+            await self._emit_quietly({'type': 'error', 'request_id': request_id, 'error': str(e), 'status': e.status})
+        except Exception as e:
+            await self._emit_quietly({
+                'type': 'error', 'request_id': request_id, 'error': f'An error occurred: {str(e)}', 'status': 500
+            })
+
+    def _acquire_conversation_lock(self, conversation_id: int) -> asyncio.Lock:
+        """Lock of a conversation, counting the turns that hold or wait for it"""
+        entry = self.conversation_locks.setdefault(conversation_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        return entry[0]
+
+    def _release_conversation_lock(self, conversation_id: int) -> None:
+        """Drop the lock with its last turn, so the map only holds conversations in use"""
+        entry = self.conversation_locks[conversation_id]
+        entry[1] -= 1
+        if not entry[1]:
+            del self.conversation_locks[conversation_id]
+
+    async def _emit_quietly(self, payload: dict):
+        try:
+            await self.emit(payload)
+        except SlowClient:
+            self.abort(CLOSE_TRY_AGAIN_LATER)
+
+    async def _stream(self, request_id: str, conversation_id: int, prompt: str, kind: str) -> str:
+        """
+        Run the blocking model stream in a worker thread and forward its tokens.
+
+        The worker waits for each token to be queued before pulling the next
+        one from the model, so a slow client holds back generation instead of
+        letting tokens pile up in memory.
+        """
+        loop = asyncio.get_running_loop()
+        stopped = threading.Event()
+
+        def produce():
+            parts = []
+            for text in chat_service.stream_response(prompt, kind, self.user.id, conversation_id):
+                if stopped.is_set():
+                    break
+                parts.append(text)
+                frame = {'type': 'chat.token', 'request_id': request_id, 'conversation_id': conversation_id, 'text': text}
+                asyncio.run_coroutine_threadsafe(self.emit(frame), loop).result()
+            return ''.join(parts)
+
+        try:
+            response = await loop.run_in_executor(None, produce)
+        finally:
+            stopped.set()
+        return response or chat_service.EMPTY_RESPONSE
+
+    async def _event_loop(self):
+        """Push the user's change feed, so uploads and other devices' edits show up live"""
+        cursor = await database(get_current_cursor)(self.user)
+        while True:
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+            try:
+                if not await self.still_authenticated():
+                    return
+                feed = await database(get_changes)(self.user, cursor)
+            except Exception:
+                # Transient database errors (e.g. a locked SQLite file); retry on the next tick
+                continue
+            if not feed['changes']:
+                continue
+
+            try:
+                await self.emit({'type': 'sync', 'changes': feed['changes'], 'cursor': feed['cursor'], 'has_more': feed['has_more']})
+                for change in feed['changes']:
+                    if self._is_new_document(change):
+                        await self.emit({'type': 'event', 'event': 'document.ready', 'document': change['data']})
+            except SlowClient:
+                self.abort(CLOSE_TRY_AGAIN_LATER)
+                return
+            cursor = feed['cursor']
+
+    def _is_new_document(self, change: dict) -> bool:
+        """Documents are created once extraction has finished, so a new one is ready to use"""
+        if change['kind'] != 'document' or change['action'] != 'upsert':
+            return False
+        return datetime.fromisoformat(change['data']['upload_date']) >= self.connected_at
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI application for WebSocket connections"""
+    await ChatConnection(scope, receive, send).run()
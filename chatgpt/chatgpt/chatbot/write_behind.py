@@ -0,0 +1,59 @@
+"""
+Background flushing for counters and timestamps buffered in memory
+"""
+import atexit
+import threading
+from typing import Callable
+
+from django.db import close_old_connections
+
+
+class BackgroundFlusher:
+    """
+    Calls ``flush`` every ``interval`` seconds on a daemon thread.
+
+    The thread starts on first use, so processes that never buffer
+    anything (management commands, the extraction worker) never start it.
+    ``wake`` asks for an early flush. With ``flush_at_exit``, ``flush``
+    also runs once at interpreter exit, but only in processes that started
+    the thread; periodic jobs with nothing buffered (reloads, purges) pass
+    False. A flush that raises is retried on the next tick, so ``flush``
+    must keep whatever it failed to write.
+    """
+
+    def __init__(self, flush: Callable[[], object], interval: float, name: str, flush_at_exit: bool = True):
+        self.flush = flush
+        self.interval = interval
+        self.name = name
+        self.flush_at_exit = flush_at_exit
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+                    if self.flush_at_exit:
+                        atexit.register(self._flush_quietly)
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _flush_quietly(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self._flush_quietly()
+            finally:
+                close_old_connections()
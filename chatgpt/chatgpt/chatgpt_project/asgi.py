@@ -1,5 +1,8 @@
 """
 ASGI config for chatgpt_project project.
+
+HTTP requests are served by Django; WebSocket connections go to the chat
+transport in chatbot.websocket.
 """
 
 import os
@@ -8,4 +11,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chatgpt_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, since it loads models
+from chatbot.websocket import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Route WebSocket connections to the chat transport and everything else to Django"""
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
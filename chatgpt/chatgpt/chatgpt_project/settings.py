@@ -13,7 +13,8 @@ load_dotenv()
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-change-this-in-production')
+# A blank SECRET_KEY (as in env.example) counts as unset, so tests and local runs can still sign
+SECRET_KEY = os.getenv('SECRET_KEY') or 'django-insecure-change-this-in-production'
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
@@ -39,6 +40,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'chatbot.api_tokens.APITokenMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -100,6 +102,14 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# `collectstatic` fingerprints assets and writes .gz/.br copies; chatbot.static_assets.serve_static serves them
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'chatbot.static_assets.CompressedManifestStaticFilesStorage'},
+}
+STATIC_SERVE_FROM_APP = True
+STATIC_UNHASHED_MAX_AGE = 60  # seconds; fingerprinted files are cached for a year
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -127,6 +137,147 @@ LOGOUT_REDIRECT_URL = '/login/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
-# File upload size limit (10MB)
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
-DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
\ No newline at end of file
+# Uploads larger than this are streamed to a temporary file instead of RAM
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(2.5 * 1024 * 1024)
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+
+# Bulk upload settings
+BULK_UPLOAD_MAX_WORKERS = int(os.getenv('BULK_UPLOAD_MAX_WORKERS', '4'))
+BULK_UPLOAD_MAX_FILES = 500
+BULK_UPLOAD_MAX_TOTAL_SIZE = 200 * 1024 * 1024  # bytes one bulk upload may decompress and store in total
+
+# Resumable chunked upload settings
+CHUNKED_UPLOAD_MAX_SIZE = 512 * 1024 * 1024
+CHUNKED_UPLOAD_TTL_HOURS = 24
+CHUNKED_UPLOAD_MAX_OPEN_SESSIONS = 10  # unfinished chunked uploads per user
+CHUNKED_UPLOAD_MAX_RESERVED_BYTES = 2 * 1024 * 1024 * 1024  # total size of a user's unfinished uploads
+
+# Spreadsheet extraction limits (keep large workbooks under a fixed memory ceiling)
+SPREADSHEET_MAX_ROWS_PER_SHEET = 10000
+SPREADSHEET_MAX_CELLS = 200000
+SPREADSHEET_MAX_CELL_CHARS = 500
+SPREADSHEET_MAX_CHARS = 5 * 1024 * 1024
+SPREADSHEET_CHUNK_ROWS = 200  # rows per buffered chunk while rendering a sheet, and per search index entry
+SPREADSHEET_SCHEMA_SUMMARY = True
+
+# OCR preprocessing (images are normalised before Tesseract; results cached by image hash)
+OCR_TARGET_DPI = 300
+OCR_MAX_SIDE = 2500
+OCR_DESKEW = True
+OCR_BINARIZE = False
+OCR_PSM = 3
+OCR_OEM = 3
+OCR_LANG = 'eng'
+OCR_CACHE_TIMEOUT = 7 * 24 * 3600
+OCR_CACHE_ALIAS = 'ocr'  # must be shared by all processes: OCR runs in a fresh sandbox worker per file
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'ocr': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'ocr',
+        'TIMEOUT': OCR_CACHE_TIMEOUT,
+    },
+}
+
+# Cold storage for idle conversations
+CONVERSATION_ARCHIVE_DIR = BASE_DIR / 'archive'
+CONVERSATION_ARCHIVE_CODEC = os.getenv('CONVERSATION_ARCHIVE_CODEC', 'gzip')  # 'gzip' or 'zstd'
+CONVERSATION_ARCHIVE_SEGMENT_SIZE = 64 * 1024 * 1024
+CONVERSATION_ARCHIVE_IDLE_DAYS = 30
+
+# WebSocket chat transport (served by the ASGI application)
+CHAT_WEBSOCKET_PATH = '/ws/chat/'
+CHAT_WEBSOCKET_SEND_QUEUE_SIZE = 64
+CHAT_WEBSOCKET_SLOW_CLIENT_TIMEOUT = 10
+CHAT_WEBSOCKET_MAX_CONCURRENT_TURNS = 4
+CHAT_WEBSOCKET_EVENT_INTERVAL = 2.0
+
+# Chat model backend (see chatbot.chat_service.MODEL_BACKENDS); extra backends as {name: dotted path}.
+# 'fake' answers locally with injected latency (see FAKE_MODEL_PROFILES).
+CHAT_MODEL_BACKEND = os.getenv('CHAT_MODEL_BACKEND', 'gemini')
+CHAT_MODEL_BACKENDS = {}
+
+# Model routing: tier per request kind and prompt size, deadlines, hedging and fallback
+CHAT_MODEL_TIERS = {
+    'fast': {'model': 'gemini-2.0-flash-lite', 'fallback': None},
+    'standard': {'model': 'gemini-2.0-flash-exp', 'fallback': 'fast'},
+    'long': {'model': 'gemini-1.5-pro', 'fallback': 'standard'},
+}
+CHAT_SHORT_PROMPT_CHARS = 1500
+CHAT_LONG_PROMPT_CHARS = 20000
+CHAT_DEADLINE_SECONDS = 30
+CHAT_HEDGING = True
+CHAT_HEDGE_DELAY = 3.0  # used until a tier has CHAT_HEDGE_MIN_SAMPLES latencies, then its p95
+CHAT_HEDGE_MIN_SAMPLES = 20
+FAKE_MODEL_PROFILES = {}
+
+# Cold-start budget checked by `manage.py benchmark_startup`
+STARTUP_IMPORT_BUDGET_MS = 500
+STARTUP_RSS_BUDGET_MB = 80
+
+# Sandboxed extraction: PDF, Word, Excel and image parsers run in a limited subprocess
+EXTRACTION_SANDBOX = True
+EXTRACTION_TIMEOUT = 60  # wall-clock seconds per file
+EXTRACTION_MEMORY_LIMIT_MB = 1024
+EXTRACTION_MAX_OUTPUT_CHARS = 5 * 1024 * 1024
+
+# Ingest-time map-reduce summaries of large documents (see chatbot.summarizer)
+DOCUMENT_SUMMARY_ENABLED = True
+DOCUMENT_SUMMARY_MIN_CHARS = 4000  # shorter documents fit in a prompt as they are
+DOCUMENT_SUMMARY_CHUNK_CHARS = 12000
+DOCUMENT_SUMMARY_SECTION_CHUNKS = 6  # chunk summaries merged into each section summary
+DOCUMENT_SUMMARY_MAP_WORKERS = 4
+DOCUMENT_SUMMARY_BACKGROUND_WORKERS = 2
+DOCUMENT_SUMMARY_LEASE_SECONDS = 1800  # a summary still running after this long is taken over by another worker
+DOCUMENT_SUMMARY_CONTEXT_CHARS = 4000  # summary text included in a document chat prompt
+
+# Admin changelists: unfiltered lists of tables this large show an estimated count instead of COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 10000
+ADMIN_SEARCH_RESULT_LIMIT = 1000  # full-text matches merged into an admin search
+DOCUMENT_INDEX_MAX_CHARS = 200000  # characters of each document's text kept in the full-text index
+
+# Template fragment caching of the authenticated chat shell
+CHAT_SHELL_CACHE_SECONDS = 3600
+
+# Token usage ledger: counters buffered per process and flushed as per-user, per-day, per-model rows
+USAGE_FLUSH_INTERVAL = 10.0  # seconds
+USAGE_FLUSH_MAX_KEYS = 1000  # flush early once this many rows are buffered
+
+# Document reads record last_accessed in memory; it is written in batches this often
+DOCUMENT_ACCESS_FLUSH_INTERVAL = 30.0  # seconds
+DOCUMENT_ACCESS_FLUSH_MAX_PENDING = 5000  # flush early once this many documents are pending
+
+# Prompt history: recent turns are sent verbatim, older ones through the rolling summary
+CHAT_HISTORY_TURNS = 6
+
+# Long-term memory: facts about each user mined from conversations and recalled into new prompts
+MEMORY_ENABLED = True
+MEMORY_EXTRACT_EVERY_TURNS = 4  # mine a conversation in the background after every N turns
+MEMORY_TOP_K = 5  # most relevant memories recalled per prompt
+MEMORY_TOKEN_BUDGET = 300  # estimated tokens of recalled memories per prompt
+MEMORY_BACKGROUND_WORKERS = 1
+
+# Idempotency-Key header on chat and upload requests (see chatbot.idempotency)
+IDEMPOTENCY_KEY_TTL = 24 * 3600  # seconds a completed response is kept for replay
+IDEMPOTENCY_WAIT_SECONDS = 5  # how long a retry waits for the original request before a 409; each wait holds a worker
+IDEMPOTENCY_LOCK_TIMEOUT = 300  # a key still processing after this long is taken over by a retry
+
+# Bulk reprocessing of stored documents (manage.py reprocess_documents)
+REPROCESS_WORKERS = 4  # files extracted in parallel
+REPROCESS_BATCH_SIZE = 100  # documents per batch and checkpoint
+REPROCESS_MAX_RATE = None  # documents per second, None for unthrottled
+REPROCESS_BATCH_PAUSE = 0.0  # seconds slept between batches
+REPROCESS_NICE = 10  # CPU niceness added to the run and its extraction processes
+
+# Deletes are soft: rows are hidden at once and purged in the background (see chatbot.purge)
+PURGE_BATCH_SIZE = 500  # rows of each kind removed per batch
+PURGE_INTERVAL = 5.0  # seconds between background purge batches
+ORPHAN_FILE_GRACE_SECONDS = 3600  # unreferenced files younger than this are kept by the orphan sweep
+
+# Signed API tokens: api/ requests with a bearer token skip the session and user lookups (see chatbot.api_tokens)
+API_TOKEN_ACCESS_TTL = 15 * 60  # seconds an access token is valid
+API_TOKEN_REFRESH_TTL = 7 * 24 * 3600  # seconds a refresh token is valid
+API_TOKEN_DENYLIST_REFRESH_INTERVAL = 30.0  # seconds before a revocation reaches other processes
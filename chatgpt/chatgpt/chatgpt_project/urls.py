@@ -2,15 +2,21 @@
 URL configuration for chatgpt_project project.
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from chatbot.static_assets import serve_static
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('chatbot.urls')),
 ]
 
+# Collected, precompressed static files; a CDN or reverse proxy in front can cache them indefinitely
+if getattr(settings, 'STATIC_SERVE_FROM_APP', True):
+    urlpatterns += [re_path(rf"^{settings.STATIC_URL.lstrip('/')}(?P<path>.+)$", serve_static)]
+
 # Serve media files during development
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)